@@ -40,9 +40,14 @@ INSTALLED_APPS = [
     'core',
     'user',
     'recipe',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    # First, so that it sees every query and the response render last
+    'core.instrumentation.SQLInstrumentationMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -129,4 +134,128 @@ MEDIA_URL = '/media/'
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
+# Uploaded images are named after their content and may be cached for good.
+# Django serves MEDIA_ROOT itself, with that Cache-Control, when DEBUG or
+# SERVE_MEDIA is set. A front server serving it instead must send the same
+# header (core.views.IMMUTABLE_CACHE_CONTROL), e.g. with nginx:
+#   location /media/ {
+#       alias /vol/web/media/;
+#       add_header Cache-Control "public, max-age=31536000, immutable";
+#   }
+SERVE_MEDIA = os.environ.get('SERVE_MEDIA', '0') == '1'
+
 AUTH_USER_MODEL = 'core.User'
+
+# Keyset pagination defaults, used when a client sends `page_size` or `cursor`
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+# Per-user response cache of list endpoints: 'local' keeps an in-process
+# LRU, 'shared' goes through a Django cache alias so workers share it and
+# 'none' disables it. The local LRU also evicts past MAX_SIZE bytes, and
+# responses over MAX_ENTRY_SIZE bytes are never cached
+RESPONSE_CACHE = {
+    'BACKEND': os.environ.get('RESPONSE_CACHE_BACKEND', 'local'),
+    'MAX_ENTRIES': 1024,
+    'MAX_SIZE': int(
+        os.environ.get('RESPONSE_CACHE_MAX_SIZE', 64 * 1024 * 1024)
+    ),
+    'MAX_ENTRY_SIZE': int(
+        os.environ.get('RESPONSE_CACHE_MAX_ENTRY_SIZE', 1024 * 1024)
+    ),
+}
+
+# Authenticated tokens are cached for TIMEOUT seconds in the cache alias
+# SHARED, so workers share them and see each other's invalidations. LOCAL
+# caches them per process instead: a deleted token or deactivated user then
+# keeps authenticating on the other workers for up to TIMEOUT seconds, so
+# only turn it on for a single process or when that delay is acceptable.
+# With neither set, every request reads its token from the database.
+TOKEN_AUTH_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': int(os.environ.get('TOKEN_AUTH_CACHE_TIMEOUT', 60)),
+    'SHARED': os.environ.get('TOKEN_AUTH_CACHE_SHARED') or None,
+    'LOCAL': os.environ.get('TOKEN_AUTH_CACHE_LOCAL', '0') == '1',
+}
+
+# Serialize recipe list/detail responses straight from values() rows
+# instead of model instances; the JSON is the same either way
+RECIPE_FAST_SERIALIZATION = \
+    os.environ.get('RECIPE_FAST_SERIALIZATION', '0') == '1'
+
+# Resized variants of uploaded recipe images are generated on a pool of
+# RECIPE_IMAGE_WORKERS threads ('thread'), by the job queue ('queue') or
+# during the upload ('sync')
+RECIPE_IMAGE_PROCESSING = os.environ.get('RECIPE_IMAGE_PROCESSING', 'thread')
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_WEBP = os.environ.get('RECIPE_IMAGE_WEBP', '0') == '1'
+
+# Stored images no longer referenced are deleted once they are older
+# than this many seconds; run `manage.py sweep_images` periodically to
+# delete the ones released while still younger
+IMAGE_STORAGE_DELETE_GRACE = 60
+
+# Uploads are streamed to temporary files rather than kept in memory
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Recipe image uploads are rejected above these limits, checked from the
+# image header before anything is decoded
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.environ.get('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.environ.get('RECIPE_IMAGE_MAX_PIXELS', 40000000)
+)
+
+# Database backed job queue run by `manage.py run_jobs`: leases expire
+# after VISIBILITY_TIMEOUT seconds, failed jobs are retried up to
+# MAX_ATTEMPTS times, RETRY_DELAY seconds apart and doubling each time
+JOBS = {
+    'VISIBILITY_TIMEOUT': int(os.environ.get('JOBS_VISIBILITY_TIMEOUT', 300)),
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 10,
+}
+
+# Largest batch accepted by POST /api/recipe/recipes/bulk/
+RECIPE_BULK_MAX_ITEMS = int(os.environ.get('RECIPE_BULK_MAX_ITEMS', 5000))
+
+# Count queries and time SQL, serialization and rendering per request,
+# reported in Server-Timing/X-Query-Count headers and one log line each
+SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', '0') == '1'
+
+# cProfile one in SAMPLE_RATE requests under PATHS, and requests sent with
+# an X-Profile header from `manage.py profile_report --token`; the MAX_FILES
+# newest profiles of each view are kept in DIRECTORY
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING', '0') == '1',
+    'SAMPLE_RATE': int(os.environ.get('PROFILING_SAMPLE_RATE', 1000)),
+    'PATHS': ('/api/recipe/', '/api/user/'),
+    'DIRECTORY': os.environ.get('PROFILING_DIRECTORY', '/tmp/profiles'),
+    'MAX_FILES': int(os.environ.get('PROFILING_MAX_FILES', 100)),
+}
+
+# Count requests, latency, errors, queries and cache hits per view, served
+# at /metrics in Prometheus format. Every worker process writes its values
+# to DIRECTORY at most every FLUSH_INTERVAL seconds, and /metrics sums them
+METRICS = {
+    'ENABLED': os.environ.get('METRICS', '0') == '1',
+    'DIRECTORY': os.environ.get('METRICS_DIRECTORY', '/tmp/metrics'),
+    'FLUSH_INTERVAL': float(os.environ.get('METRICS_FLUSH_INTERVAL', 1)),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.instrumentation': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -1,10 +1,12 @@
-from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import media_urlpatterns, metrics_view
+
 urlpatterns = [
                   path('admin/', admin.site.urls),
                   path('api/user/', include('user.urls')),
-                  path('api/recipe/', include('recipe.urls'))
-              ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+                  path('api/recipe/', include('recipe.urls')),
+                  path('api/jobs/', include('jobs.urls')),
+                  path('metrics', metrics_view, name='metrics'),
+              ] + media_urlpatterns()
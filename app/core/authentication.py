@@ -0,0 +1,145 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """Cache of authenticated tokens with their users
+
+    Entries live for ``timeout`` seconds in the ``shared`` cache alias, so
+    all workers benefit from one database lookup and see each other's
+    invalidations, or, when ``local`` is set instead, in a bounded
+    in-process LRU. Invalidations only reach the LRU of the process making
+    them, so other workers keep accepting a deleted token or deactivated
+    user until the entry expires; that mode is opt-in. With neither, no
+    token is cached. Options not passed are read from the
+    ``TOKEN_AUTH_CACHE`` setting on use.
+    """
+
+    def __init__(self, max_entries=None, timeout=None, shared=None,
+                 local=None):
+        self._max_entries = max_entries
+        self._timeout = timeout
+        self._shared = shared
+        self._local = local
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _option(self, value, name, default):
+        if value is not None:
+            return value
+        return getattr(settings, 'TOKEN_AUTH_CACHE', {}).get(name, default)
+
+    @property
+    def max_entries(self):
+        return self._option(self._max_entries, 'MAX_ENTRIES', 10000)
+
+    @property
+    def timeout(self):
+        return self._option(self._timeout, 'TIMEOUT', 60)
+
+    @property
+    def shared(self):
+        return self._option(self._shared, 'SHARED', None)
+
+    @property
+    def local(self):
+        return self._option(self._local, 'LOCAL', False)
+
+    @property
+    def enabled(self):
+        return self.shared is not None or bool(self.local)
+
+    def get(self, key):
+        """Return the cached Token of key, with its user, or None"""
+        data = self._lookup(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(data)
+
+    def _lookup(self, key):
+        if self.shared is not None:
+            return caches[self.shared].get(self._shared_key(key))
+        if not self.local:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                expires, data = cached
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return data
+                del self._entries[key]
+        return None
+
+    def set(self, key, token):
+        # Pickled so that requests never share a mutable User instance
+        data = pickle.dumps(token)
+        if self.shared is not None:
+            caches[self.shared].set(self._shared_key(key), data, self.timeout)
+        elif self.local:
+            self._store(key, data, time.monotonic())
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.shared is not None and keys:
+            caches[self.shared].delete_many(
+                [self._shared_key(key) for key in keys]
+            )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit and miss counters of this process"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def _store(self, key, data, now):
+        with self._lock:
+            self._entries[key] = (now + self.timeout, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _shared_key(self, key):
+        return f'auth-token:{key}'
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication skipping the Token/User query on cache hits"""
+
+    def authenticate_credentials(self, key):
+        if not token_cache.enabled:
+            return super().authenticate_credentials(key)
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+        return (token.user, token)
+
+
+def invalidate_user_tokens(user_id):
+    """Drop the cached tokens of a user"""
+    token_cache.invalidate(
+        Token.objects.filter(user_id=user_id).values_list('key', flat=True)
+    )
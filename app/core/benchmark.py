@@ -0,0 +1,160 @@
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+
+from core.models import Recipe, Tag, Ingredient, normalize_name
+
+BATCH_SIZE = 5000
+
+# Accounts created by seed_benchmark and driven by bench
+BENCH_EMAIL_DOMAIN = 'bench.localhost'
+DISTRIBUTIONS = ('uniform', 'skewed')
+
+WORDS = (
+    'chicken', 'beef', 'tofu', 'lemon', 'garlic', 'chocolate', 'curry',
+    'salad', 'soup', 'roast', 'spicy', 'creamy', 'baked', 'grilled',
+    'noodle', 'rice', 'tomato', 'mushroom', 'cheese', 'honey', 'ginger',
+    'pasta', 'pie', 'cake', 'stew', 'smoked', 'crispy', 'fresh', 'sweet',
+    'vegan', 'classic', 'quick', 'summer', 'winter', 'apple', 'berry',
+)
+
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction thrown away at the end
+
+    Benchmarks seed their data inside it, so nothing is left behind.
+    """
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def timed(func, repeat=1):
+    """Call func repeat times and return (best seconds, last result)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_email(number):
+    return f'user{number}@{BENCH_EMAIL_DOMAIN}'
+
+
+def recipe_counts(users, recipes, distribution='uniform', seed=0):
+    """Return how many recipes each of users gets, recipes on average
+
+    With the skewed distribution the collection sizes follow Zipf's law,
+    so a few users own most of the recipes, like in real deployments.
+    """
+    if distribution == 'uniform':
+        return [recipes] * users
+
+    total = users * recipes
+    weights = [1 / (i + 1) for i in range(users)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    # Hand out what rounding down left over to the largest collections
+    for i in range(total - sum(counts)):
+        counts[i % users] += 1
+    random.Random(seed).shuffle(counts)
+    return counts
+
+
+def seed_collection(user, recipes, tags=50, ingredients=200,
+                    tags_per_recipe=3, ingredients_per_recipe=5, seed=0):
+    """Bulk insert a synthetic recipe collection for a user
+
+    Returns the created (recipe ids, tag ids, ingredient ids). Tags and
+    ingredients are picked with a skewed distribution so that a few of
+    them are very popular, like in real collections.
+    """
+    rnd = random.Random(seed)
+
+    tag_ids = _bulk_insert(
+        Tag, _named(Tag, user, rnd, 1, tags), user
+    )
+    ingredient_ids = _bulk_insert(
+        Ingredient, _named(Ingredient, user, rnd, 2, ingredients), user
+    )
+    recipe_ids = _bulk_insert(
+        Recipe,
+        (Recipe(
+            user=user,
+            title=_words(rnd, 3, i),
+            time_minutes=rnd.randint(5, 180),
+            price=Decimal(rnd.randint(100, 9999)) / 100,
+        ) for i in range(recipes)),
+        user
+    )
+
+    tag_weights = [1 / (i + 1) for i in range(len(tag_ids))]
+    ingredient_weights = [1 / (i + 1) for i in range(len(ingredient_ids))]
+    tag_rows = []
+    ingredient_rows = []
+    for recipe_id in recipe_ids:
+        for tag_id in _pick(rnd, tag_ids, tag_weights, tags_per_recipe):
+            tag_rows.append(
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            )
+        for ingredient_id in _pick(rnd, ingredient_ids, ingredient_weights,
+                                   ingredients_per_recipe):
+            ingredient_rows.append(Recipe.ingredients.through(
+                recipe_id=recipe_id, ingredient_id=ingredient_id
+            ))
+    _bulk_create(Recipe.tags.through, tag_rows)
+    _bulk_create(Recipe.ingredients.through, ingredient_rows)
+
+    return recipe_ids, tag_ids, ingredient_ids
+
+
+def _bulk_create(model, objs):
+    """Insert objs in chunks without holding them all in one statement"""
+    batch = []
+    for obj in objs:
+        batch.append(obj)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    model.objects.bulk_create(batch)
+
+
+def _bulk_insert(model, objs, user):
+    """Insert objs and return the ids of all the user's rows of model"""
+    _bulk_create(model, objs)
+    return list(
+        model.objects.filter(user=user)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+
+
+def _named(model, user, rnd, words, count):
+    """Build count tags or ingredients; bulk_create skips save()"""
+    objs = []
+    for i in range(count):
+        name = _words(rnd, words, i)
+        objs.append(
+            model(user=user, name=name, normalized_name=normalize_name(name))
+        )
+    return objs
+
+
+def _words(rnd, count, number):
+    """Return a name made of random words, unique thanks to number"""
+    return ' '.join(rnd.choice(WORDS) for _ in range(count)) + f' {number}'
+
+
+def _pick(rnd, population, weights, count):
+    """Pick up to count distinct items using the given weights"""
+    if not population:
+        return set()
+    return set(rnd.choices(population, weights, k=count))
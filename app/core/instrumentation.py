@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    """Queries and phase durations gathered while serving one request"""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.phases = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        """Execute wrapper counting queries and the time they take"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+
+@contextmanager
+def recording(metrics):
+    """Count the queries run in the block on any connection in metrics"""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics))
+        yield
+
+
+def current_metrics():
+    """Return the metrics of the request being served, if it is measured"""
+    return getattr(_local, 'metrics', None)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the phase name of the request"""
+    metrics = current_metrics()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - start)
+
+
+class TimedSerializer:
+    """Proxy of a serializer timing the computation of its data"""
+
+    def __init__(self, serializer):
+        self._serializer = serializer
+
+    def __getattr__(self, name):
+        return getattr(self._serializer, name)
+
+    @property
+    def data(self):
+        with phase('serialize'):
+            return self._serializer.data
+
+
+class ServerTimingMixin:
+    """Report the time DRF views spend serializing in Server-Timing"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if current_metrics() is None:
+            return serializer
+        return TimedSerializer(serializer)
+
+
+class StreamedBody:
+    """Streaming content measured as it is sent, reported once closed"""
+
+    def __init__(self, chunks, metrics, on_close):
+        self.chunks = chunks
+        self.metrics = metrics
+        self.on_close = on_close
+
+    def __iter__(self):
+        start = time.perf_counter()
+        try:
+            with recording(self.metrics):
+                yield from self.chunks
+        finally:
+            self.metrics.add('stream', time.perf_counter() - start)
+
+    def close(self):
+        self.on_close()
+
+
+class SQLInstrumentationMiddleware:
+    """Measure queries, SQL time and the serialize and render phases
+
+    Adds ``Server-Timing`` and ``X-Query-Count`` headers to every response
+    and logs one line per request. Enabled with SQL_INSTRUMENTATION; when
+    it is off Django drops the middleware at startup, so requests don't
+    pay for it at all.
+
+    The headers of a streaming response are sent before its body, so they
+    leave out the queries run while streaming. Its log line is written
+    once the response is closed and includes them, with a stream phase.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SQL_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        _local.metrics = metrics
+        start = time.perf_counter()
+        try:
+            with recording(metrics):
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = time.perf_counter() - start
+
+        response['Server-Timing'] = server_timing(metrics, total)
+        response['X-Query-Count'] = str(metrics.queries)
+        if response.streaming:
+            response.streaming_content = StreamedBody(
+                response.streaming_content, metrics,
+                lambda: self.log(
+                    request, response, metrics, time.perf_counter() - start
+                )
+            )
+        else:
+            self.log(request, response, metrics, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # Listed first, this runs last, right before the response renders
+        metrics = current_metrics()
+        if metrics is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: metrics.add(
+                    'render', time.perf_counter() - start
+                )
+            )
+        return response
+
+    def log(self, request, response, metrics, total):
+        match = request.resolver_match
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else '',
+            'status': response.status_code,
+            'queries': metrics.queries,
+            'sql_ms': round(metrics.sql_time * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+        }
+        for name, seconds in metrics.phases.items():
+            fields[f'{name}_ms'] = round(seconds * 1000, 2)
+        logger.info(
+            ' '.join(f'{key}={value}' for key, value in fields.items()),
+            extra={'request_metrics': fields}
+        )
+
+
+def server_timing(metrics, total):
+    """Format metrics as a Server-Timing header value, in milliseconds"""
+    entries = [
+        f'sql;dur={metrics.sql_time * 1000:.2f};'
+        f'desc="{metrics.queries} queries"'
+    ]
+    for name, seconds in metrics.phases.items():
+        entries.append(f'{name};dur={seconds * 1000:.2f}')
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
@@ -0,0 +1,349 @@
+import http.client
+import io
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from core.benchmark import BENCH_EMAIL_DOMAIN
+from core.models import Recipe, Tag, Ingredient
+
+RECIPES_PATH = '/api/recipe/recipes/'
+TOKEN_PATH = '/api/user/token/'
+OPERATIONS = ('list', 'filtered', 'detail', 'create', 'upload', 'login')
+DEFAULT_WEIGHTS = 'list=40,filtered=20,detail=20,create=10,upload=5,login=5'
+# Ids of each account sampled for detail, filter and upload requests
+SAMPLE_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = 'Replay a weighted API workload against a running server'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='http://localhost:8000',
+            help='Server to load, sharing the database of this settings'
+        )
+        parser.add_argument('--clients', type=int, default=8)
+        parser.add_argument(
+            '--duration', type=float, default=30, help='Seconds to run for'
+        )
+        parser.add_argument(
+            '--weights', default=DEFAULT_WEIGHTS,
+            help=f'Share of each operation, by default {DEFAULT_WEIGHTS}'
+        )
+        parser.add_argument('--password', default='benchmark')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', help='Write the results to this JSON file'
+        )
+        parser.add_argument(
+            '--compare', help='JSON results of a previous run to compare with'
+        )
+
+    def handle(self, *args, **options):
+        weights = parse_weights(options['weights'])
+        accounts = load_accounts()
+        if not accounts:
+            raise CommandError(
+                'No benchmark users, create them with seed_benchmark'
+            )
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as source:
+                baseline = json.load(source)
+
+        clients = [
+            Client(
+                options['url'],
+                accounts[number % len(accounts)],
+                options['password'],
+                random.Random(options['seed'] + number),
+            )
+            for number in range(options['clients'])
+        ]
+        for client in clients:
+            if not client.login():
+                raise CommandError(
+                    f'Could not log in as {client.account["email"]}'
+                )
+
+        self.stdout.write(
+            f'Running {len(clients)} clients against {options["url"]} '
+            f'for {options["duration"]}s...'
+        )
+        started = datetime.now(timezone.utc)
+        deadline = time.monotonic() + options['duration']
+        start = time.monotonic()
+        threads = [
+            threading.Thread(target=client.run, args=(weights, deadline))
+            for client in clients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+
+        samples = defaultdict(list)
+        for client in clients:
+            for name, seconds, ok in client.samples:
+                samples[name].append((seconds, ok))
+        results = {
+            'started': started.isoformat(),
+            'url': options['url'],
+            'clients': len(clients),
+            'duration': round(elapsed, 3),
+            'weights': weights,
+            'endpoints': {
+                name: summarize(samples[name], elapsed)
+                for name in sorted(samples)
+            },
+            'total': summarize(
+                [sample for name in samples for sample in samples[name]],
+                elapsed
+            ),
+        }
+
+        self._report(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as target:
+                json.dump(results, target, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def _report(self, results, baseline):
+        self.stdout.write(
+            f'{"endpoint":<10} {"requests":>8} {"errors":>6} {"req/s":>9} '
+            f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}'
+        )
+        rows = list(results['endpoints'].items())
+        rows.append(('total', results['total']))
+        for name, row in rows:
+            line = (
+                f'{name:<10} {row["requests"]:>8} {row["errors"]:>6} '
+                f'{row["rps"]:>9.1f} {row["p50"]:>8.1f} {row["p95"]:>8.1f} '
+                f'{row["p99"]:>8.1f}'
+            )
+            if baseline is not None:
+                line += compare(row, _baseline_row(baseline, name))
+            self.stdout.write(line)
+
+
+class Client:
+    """One simulated user sending requests back to back"""
+
+    def __init__(self, url, account, password, rnd):
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection \
+            if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+        self.account = account
+        self.password = password
+        self.rnd = rnd
+        self.token = None
+        self.samples = []
+        self.image = _image(rnd)
+
+    def run(self, weights, deadline):
+        names = list(weights)
+        shares = [weights[name] for name in names]
+        try:
+            while time.monotonic() < deadline:
+                name = self.rnd.choices(names, shares)[0]
+                start = time.perf_counter()
+                try:
+                    ok = getattr(self, name)()
+                except (OSError, http.client.HTTPException, ValueError):
+                    # Reconnect on the next request
+                    self.connection.close()
+                    ok = False
+                self.samples.append(
+                    (name, time.perf_counter() - start, ok)
+                )
+        finally:
+            self.connection.close()
+
+    def request(self, method, path, body=None, content_type=None,
+                auth=True):
+        headers = {}
+        if auth:
+            headers['Authorization'] = f'Token {self.token}'
+        if content_type:
+            headers['Content-Type'] = content_type
+        self.connection.request(
+            method, self.prefix + path, body=body, headers=headers
+        )
+        response = self.connection.getresponse()
+        data = response.read()
+        return response.status, data
+
+    def request_json(self, method, path, payload, auth=True):
+        return self.request(
+            method, path, json.dumps(payload).encode(),
+            'application/json', auth
+        )
+
+    def login(self):
+        status, data = self.request_json('POST', TOKEN_PATH, {
+            'email': self.account['email'],
+            'password': self.password,
+        }, auth=False)
+        if status != 200:
+            return False
+        self.token = json.loads(data)['token']
+        return True
+
+    def list(self):
+        status, _ = self.request('GET', RECIPES_PATH)
+        return status == 200
+
+    def filtered(self):
+        tags = self._sample('tags', 2)
+        status, _ = self.request(
+            'GET', f'{RECIPES_PATH}?tags={",".join(map(str, tags))}'
+        )
+        return status == 200
+
+    def detail(self):
+        recipe_id = self._sample('recipes', 1)[0]
+        status, _ = self.request('GET', f'{RECIPES_PATH}{recipe_id}/')
+        return status == 200
+
+    def create(self):
+        status, data = self.request_json('POST', RECIPES_PATH, {
+            'title': f'Benchmark recipe {self.rnd.randrange(10 ** 6)}',
+            'time_minutes': self.rnd.randint(5, 180),
+            'price': f'{self.rnd.randint(100, 9999) / 100:.2f}',
+            'tags': self._sample('tags', 3),
+            'ingredients': self._sample('ingredients', 5),
+        })
+        if status != 201:
+            return False
+        self.account['recipes'].append(json.loads(data)['id'])
+        return True
+
+    def upload(self):
+        recipe_id = self._sample('recipes', 1)[0]
+        boundary = uuid.uuid4().hex
+        body = b''.join((
+            f'--{boundary}\r\n'.encode(),
+            b'Content-Disposition: form-data; name="image"; '
+            b'filename="bench.png"\r\n',
+            b'Content-Type: image/png\r\n\r\n',
+            self.image,
+            f'\r\n--{boundary}--\r\n'.encode(),
+        ))
+        status, _ = self.request(
+            'POST', f'{RECIPES_PATH}{recipe_id}/upload-image/', body,
+            f'multipart/form-data; boundary={boundary}'
+        )
+        return status == 200
+
+    def _sample(self, kind, count):
+        population = self.account[kind]
+        if not population:
+            return []
+        return self.rnd.sample(population, min(count, len(population)))
+
+
+def parse_weights(value):
+    """Parse 'name=weight,...' into a dict of operation weights"""
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise CommandError(f'Unknown operation {name!r} in --weights')
+        try:
+            weights[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Invalid weight {weight!r} for {name}')
+    if not any(weight > 0 for weight in weights.values()):
+        raise CommandError('--weights needs a positive weight')
+    return weights
+
+
+def load_accounts():
+    """Return the benchmark users with samples of their ids"""
+    accounts = []
+    users = get_user_model().objects \
+        .filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}') \
+        .order_by('id')
+    for user in users:
+        accounts.append({
+            'email': user.email,
+            'recipes': _sample_ids(Recipe, user),
+            'tags': _sample_ids(Tag, user),
+            'ingredients': _sample_ids(Ingredient, user),
+        })
+    return [account for account in accounts if account['recipes']]
+
+
+def summarize(samples, elapsed):
+    """Return throughput and latency percentiles in ms of samples"""
+    latencies = sorted(seconds * 1000 for seconds, _ in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, ok in samples if not ok),
+        'rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+        'p50': round(percentile(latencies, 50), 2),
+        'p95': round(percentile(latencies, 95), 2),
+        'p99': round(percentile(latencies, 99), 2),
+    }
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0
+    rank = math.ceil(percent / 100 * len(values))
+    return values[max(rank, 1) - 1]
+
+
+def compare(row, before):
+    """Describe how throughput and p95 latency moved since before"""
+    if before is None:
+        return '  (new)'
+    return (
+        f'  req/s {_change(before["rps"], row["rps"])}'
+        f'  p95 {_change(before["p95"], row["p95"])}'
+    )
+
+
+def _baseline_row(baseline, name):
+    if name == 'total':
+        return baseline.get('total')
+    return baseline.get('endpoints', {}).get(name)
+
+
+def _change(before, after):
+    if not before:
+        return 'n/a'
+    return f'{(after - before) / before * 100:+.1f}%'
+
+
+def _sample_ids(model, user):
+    return list(
+        model.objects.filter(user=user)
+        .order_by('-id')
+        .values_list('id', flat=True)[:SAMPLE_SIZE]
+    )
+
+
+def _image(rnd):
+    image = Image.new('RGB', (64, 64), tuple(
+        rnd.randrange(256) for _ in range(3)
+    ))
+    data = io.BytesIO()
+    image.save(data, format='PNG')
+    return data.getvalue()
@@ -0,0 +1,134 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.benchmark import rolled_back, seed_collection, timed
+from core.models import Recipe, Tag
+from recipe.cache import response_cache
+from recipe.index import filter_index
+from recipe.versions import bump_version
+from recipe.views import RecipeApiViewSet
+
+
+class Command(BaseCommand):
+    help = 'Time filtered recipe list requests, with and without the index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--ingredients', type=int, default=200)
+        parser.add_argument('--filter-size', type=int, default=3)
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            # Requests are built in process, for the test server host
+            with rolled_back(), \
+                    override_settings(ALLOWED_HOSTS=['testserver']):
+                self._run(options)
+        finally:
+            filter_index.invalidate()
+            response_cache.reset()
+
+    def _run(self, options):
+        user = get_user_model().objects.create_user(
+            'benchmark-filter@localhost'
+        )
+        self.stdout.write(f'Seeding {options["recipes"]} recipes...')
+        recipe_ids, tag_ids, ingredient_ids = seed_collection(
+            user,
+            options['recipes'],
+            tags=options['tags'],
+            ingredients=options['ingredients'],
+        )
+        bump_version(user.id)
+
+        size = options['filter_size']
+        view = RecipeApiViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+
+        def request(params):
+            # Every write moves the version, but repeated reads would be
+            # served by the response cache
+            response_cache.reset()
+            request = factory.get('/api/recipe/recipes/', {
+                'page_size': options['page_size'], **params
+            })
+            force_authenticate(request, user)
+            response = view(request)
+            response.render()
+            return len(response.data['results'])
+
+        recipe = Recipe.objects.get(id=recipe_ids[0])
+        tag = Tag.objects.get(id=tag_ids[-1])
+
+        def link_write():
+            recipe.tags.add(tag)
+            recipe.tags.remove(tag)
+
+        def other_write():
+            tag.save()
+
+        def cold():
+            filter_index.invalidate(user.id)
+
+        cases = (
+            ('tags any', {'tags': _ids(tag_ids[:size])}),
+            ('tags all', {'tags': _ids(tag_ids[:size]), 'match': 'all'}),
+            ('tags + ingredients any', {
+                'tags': _ids(tag_ids[:size]),
+                'ingredients': _ids(ingredient_ids[:size]),
+            }),
+            # Popularity is skewed, the last ones are the rarest
+            ('rare tags any', {'tags': _ids(tag_ids[-size:])}),
+            ('rare tags + ingredients any', {
+                'tags': _ids(tag_ids[-size:]),
+                'ingredients': _ids(ingredient_ids[-size:]),
+            }),
+        )
+        for name, params in cases:
+            matches = len(filter_index.recipe_ids(
+                user.id,
+                tag_ids=_parse(params.get('tags')),
+                ingredient_ids=_parse(params.get('ingredients')),
+                match=params.get('match', 'any'),
+            ))
+            self.stdout.write(f'{name}: {matches} matching recipes')
+            with override_settings(RECIPE_INDEX_MAX_IDS=-1):
+                seconds, _ = timed(lambda: request(params), options['repeat'])
+            self._report('sql filter', seconds)
+            seconds, _ = timed(lambda: request(params), options['repeat'])
+            self._report('index, up to date', seconds)
+            for label, prepare in (('index, after a link write', link_write),
+                                   ('index, after another write',
+                                    other_write),
+                                   ('index, rebuilt', cold)):
+                seconds = self._after(prepare, lambda: request(params),
+                                      options['repeat'])
+                self._report(label, seconds)
+
+    def _after(self, prepare, func, repeat):
+        """Return the best time of func, each run following prepare()"""
+        best = None
+        for _ in range(repeat):
+            prepare()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def _report(self, name, seconds):
+        self.stdout.write(f'  {name:<30} {seconds * 1000:10.2f} ms/request')
+
+
+def _ids(ids):
+    return ','.join(map(str, ids))
+
+
+def _parse(ids):
+    return [int(i) for i in ids.split(',')] if ids else None
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.benchmark import rolled_back, seed_collection, timed
+from core.models import Recipe
+from recipe.search import search_recipes, search_index
+from recipe.versions import bump_version
+
+
+class Command(BaseCommand):
+    help = 'Measure ranked recipe search latency on a seeded collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--query', action='append', dest='queries',
+            help='Search terms to time, can be given several times'
+        )
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self._run(options)
+
+    def _run(self, options):
+        user = get_user_model().objects.create_user(
+            'benchmark-search@localhost'
+        )
+        self.stdout.write(
+            f'Seeding {options["recipes"]} recipes on {connection.vendor}...'
+        )
+        seed_collection(user, options['recipes'])
+        bump_version(user.id)
+
+        if connection.vendor != 'postgresql':
+            cold, _ = timed(lambda: search_index.get_entry(user.id))
+            self._report('token index build (cold)', cold, None)
+
+        recipes = Recipe.objects.filter(user=user)
+        queries = options['queries'] or [
+            'chocolate', 'spicy chicken', 'vegan', 'smoked tomato soup',
+        ]
+        for terms in queries:
+            seconds, results = timed(
+                lambda: list(
+                    search_recipes(recipes, user.id, terms)
+                    .values_list('id', flat=True)
+                ),
+                options['repeat']
+            )
+            self._report(terms, seconds, len(results))
+
+    def _report(self, name, seconds, matches):
+        line = f'{name:<32} {seconds * 1000:10.2f} ms'
+        if matches is not None:
+            line += f' {matches:>8} results'
+        self.stdout.write(line)
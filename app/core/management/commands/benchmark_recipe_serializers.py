@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmark import rolled_back, seed_collection, timed
+from core.models import Recipe
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, \
+    RecipeRowSerializer, RecipeDetailRowSerializer
+from recipe.views import prefetch_relations
+
+
+class Command(BaseCommand):
+    help = 'Compare model and values() based recipe serialization speed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self._run(options)
+
+    def _run(self, options):
+        user = get_user_model().objects.create_user(
+            'benchmark-serializers@localhost'
+        )
+        self.stdout.write(
+            f'Seeding {options["recipes"]} recipes on {connection.vendor}...'
+        )
+        seed_collection(user, options['recipes'])
+        recipes = Recipe.objects.filter(user=user).order_by('-id')
+
+        paths = (
+            ('list (model)', lambda: RecipeSerializer(
+                prefetch_relations(recipes), many=True
+            ).data),
+            ('list (values)', lambda: RecipeRowSerializer(
+                recipes.values(*RecipeRowSerializer.row_fields), many=True
+            ).data),
+            ('detail (model)', lambda: RecipeDetailSerializer(
+                prefetch_relations(recipes), many=True
+            ).data),
+            ('detail (values)', lambda: RecipeDetailRowSerializer(
+                recipes.values(*RecipeDetailRowSerializer.row_fields),
+                many=True
+            ).data),
+        )
+        rendered = {}
+        for name, serialize in paths:
+            seconds, data = timed(serialize, options['repeat'])
+            rendered[name] = JSONRenderer().render(data)
+            self._report(name, seconds, len(data))
+
+        for kind in ('list', 'detail'):
+            same = rendered[f'{kind} (model)'] == rendered[f'{kind} (values)']
+            self.stdout.write(
+                f'{kind} JSON identical: {"yes" if same else "NO"}'
+            )
+
+    def _report(self, name, seconds, count):
+        self.stdout.write(
+            f'{name:<32} {seconds * 1000:10.2f} ms '
+            f'{count / seconds:12.0f} objects/sec'
+        )
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from core.authentication import CachedTokenAuthentication, token_cache
+from core.benchmark import rolled_back, timed
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request token authentication overhead'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        # Measure the per-process cache unless a mode is configured
+        cache_options = getattr(settings, 'TOKEN_AUTH_CACHE', {})
+        if not token_cache.enabled:
+            cache_options = dict(cache_options, LOCAL=True)
+        with override_settings(TOKEN_AUTH_CACHE=cache_options), rolled_back():
+            self._run(options)
+
+    def _run(self, options):
+        user = get_user_model().objects.create_user('benchmark-auth@localhost')
+        token = Token.objects.create(user=user)
+        request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+        self.stdout.write(
+            f'Authenticating {options["requests"]} requests '
+            f'on {connection.vendor}...'
+        )
+
+        token_cache.clear()
+        for name, auth in (('TokenAuthentication', TokenAuthentication()),
+                           ('CachedTokenAuthentication',
+                            CachedTokenAuthentication())):
+            def run():
+                for _ in range(options['requests']):
+                    auth.authenticate(request)
+
+            auth.authenticate(request)
+            with CaptureQueriesContext(connection) as queries:
+                auth.authenticate(request)
+            seconds, _ = timed(run, options['repeat'])
+            self._report(name, seconds, options['requests'], len(queries))
+
+    def _report(self, name, seconds, requests, queries):
+        self.stdout.write(
+            f'{name:<28} {seconds / requests * 1e6:10.1f} us/request '
+            f'{queries:>3} queries/request'
+        )
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+from recipe.export import export_recipes, FORMATS, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Stream a user's recipes as NDJSON or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS), default='ndjson'
+        )
+        parser.add_argument(
+            '--output', help='File to write to, stdout when omitted'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}')
+
+        lines = export_recipes(
+            Recipe.objects.filter(user=user),
+            options['format'],
+            options['chunk_size'],
+        )
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,178 @@
+import csv
+import json
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Tag, Ingredient, normalize_name
+from recipe.bulk import bulk_create_recipes, get_or_create_by_name
+from recipe.export import FORMATS, NAME_SEPARATOR
+from recipe.serializers import RecipeImportSerializer
+
+TRANSACTION_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = "Load recipes from NDJSON or CSV into a user's collection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='File to read, stdin when omitted or "-"'
+        )
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS),
+            help='Input format, guessed from the file extension by default'
+        )
+        parser.add_argument(
+            '--transaction-size', type=int, default=TRANSACTION_SIZE,
+            help='Number of recipes committed per transaction'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}')
+        if options['transaction_size'] < 1:
+            raise CommandError('--transaction-size must be positive')
+
+        path = options['path']
+        import_format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'ndjson'
+        )
+        names = {
+            Tag: self._existing_names(Tag, user),
+            Ingredient: self._existing_names(Ingredient, user),
+        }
+
+        start = time.perf_counter()
+        if path == '-':
+            count = self._import(user, sys.stdin, import_format, names,
+                                 options)
+        else:
+            with open(path, newline='') as source:
+                count = self._import(user, source, import_format, names,
+                                     options)
+        seconds = time.perf_counter() - start
+
+        rate = count / seconds if seconds else 0
+        self.stdout.write(
+            f'Imported {count} recipes in {seconds:.2f}s '
+            f'({rate:.0f} rows/sec)'
+        )
+
+    def _import(self, user, source, import_format, names, options):
+        rows = READERS[import_format](source)
+        count = 0
+        while True:
+            batch = [
+                self._validate(number, row)
+                for number, row in islice(rows, options['transaction_size'])
+            ]
+            if not batch:
+                return count
+            with transaction.atomic():
+                for model, field in ((Tag, 'tags'),
+                                     (Ingredient, 'ingredients')):
+                    self._resolve(
+                        model, user,
+                        (name for row in batch for name in row[field]),
+                        names
+                    )
+                items = [self._item(row, names) for row in batch]
+                bulk_create_recipes(user, items)
+            count += len(items)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{count} recipes imported')
+
+    def _validate(self, number, row):
+        """Check a row with the rules of the REST API"""
+        if not isinstance(row, dict):
+            raise CommandError(f'Row {number}: expected an object')
+        serializer = RecipeImportSerializer(data=row)
+        if not serializer.is_valid():
+            raise CommandError(
+                f'Row {number}: {"; ".join(_messages(serializer.errors))}'
+            )
+        data = serializer.validated_data
+        for field in ('tags', 'ingredients'):
+            data[field] = [name for name in data[field] if name.strip()]
+        return data
+
+    def _item(self, row, names):
+        """Convert a validated row into bulk_create_recipes() kwargs"""
+        return {
+            **row,
+            'tags': [
+                names[Tag][normalize_name(name)] for name in row['tags']
+            ],
+            'ingredients': [
+                names[Ingredient][normalize_name(name)]
+                for name in row['ingredients']
+            ],
+        }
+
+    def _resolve(self, model, user, row_names, names):
+        """Create the user's rows missing for names, in one go"""
+        known = names[model]
+        missing = {}
+        for name in row_names:
+            missing.setdefault(normalize_name(name), name)
+        for key in known.keys() & missing.keys():
+            del missing[key]
+        if missing:
+            for pk, name in get_or_create_by_name(
+                    model, user, list(missing.values())):
+                known[normalize_name(name)] = pk
+
+    def _existing_names(self, model, user):
+        return dict(
+            model.objects
+            .filter(user=user)
+            .values_list('normalized_name', 'id')
+        )
+
+
+def _messages(errors, prefix=''):
+    """Yield "field: message" lines of nested serializer errors"""
+    if isinstance(errors, dict):
+        for field, value in errors.items():
+            yield from _messages(value, f'{prefix}{field}: ')
+    elif isinstance(errors, list):
+        for value in errors:
+            yield from _messages(value, prefix)
+    else:
+        yield f'{prefix}{errors}'
+
+
+def read_ndjson(source):
+    """Yield (line number, dict) of every non blank line"""
+    for number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            raise CommandError(f'Row {number}: invalid JSON')
+
+
+def read_csv(source):
+    """Yield (line number, dict), splitting tag and ingredient names"""
+    for number, row in enumerate(csv.DictReader(source), 2):
+        for field in ('tags', 'ingredients'):
+            value = row.get(field)
+            row[field] = value.split(NAME_SEPARATOR) if value else []
+        yield number, row
+
+
+READERS = {
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
@@ -0,0 +1,68 @@
+import io
+import os
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import profiling_settings, make_token
+
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+
+class Command(BaseCommand):
+    help = 'Aggregate sampled request profiles into per-view reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory',
+            help="Where profiles are dumped, PROFILING['DIRECTORY'] by default"
+        )
+        parser.add_argument(
+            '--view', help='Only report views whose name contains this'
+        )
+        parser.add_argument(
+            '--sort', choices=SORT_KEYS, default='cumulative'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=25,
+            help='Number of functions listed per view'
+        )
+        parser.add_argument(
+            '--token', action='store_true',
+            help='Print a signed X-Profile header value and exit'
+        )
+
+    def handle(self, *args, **options):
+        if options['token']:
+            self.stdout.write(make_token())
+            return
+
+        directory = options['directory'] or \
+            profiling_settings()['DIRECTORY']
+        if not os.path.isdir(directory):
+            raise CommandError(f'No profiles in {directory}')
+
+        reported = 0
+        for view in sorted(os.listdir(directory)):
+            if options['view'] and options['view'] not in view:
+                continue
+            view_path = os.path.join(directory, view)
+            dumps = sorted(
+                os.path.join(view_path, name)
+                for name in os.listdir(view_path)
+                if name.endswith('.prof')
+            ) if os.path.isdir(view_path) else []
+            if not dumps:
+                continue
+
+            reported += 1
+            self.stdout.write(f'== {view}: {len(dumps)} requests')
+            report = io.StringIO()
+            pstats.Stats(*dumps, stream=report) \
+                .strip_dirs() \
+                .sort_stats(options['sort']) \
+                .print_stats(options['limit'])
+            self.stdout.write(report.getvalue(), ending='')
+
+        if not reported:
+            raise CommandError(f'No profiles in {directory}')
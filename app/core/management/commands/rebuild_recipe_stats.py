@@ -0,0 +1,31 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute recipe statistics from the recipes, repairing drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email', help='Only rebuild the statistics of this user'
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by('id')
+        if options['email']:
+            users = users.filter(email=options['email'])
+            if not users.exists():
+                raise CommandError(f'No user with email {options["email"]}')
+
+        rebuilt = drifted = 0
+        for user_id in users.values_list('id', flat=True).iterator():
+            rebuilt += 1
+            if rebuild_stats(user_id):
+                drifted += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'User {user_id}: repaired')
+        self.stdout.write(
+            f'Rebuilt statistics of {rebuilt} users, {drifted} had drifted'
+        )
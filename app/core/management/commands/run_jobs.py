@@ -0,0 +1,148 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.queue import claim, run_job, run_in_process, job_settings, \
+    abandon
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=2,
+            help='Number of worker processes, 0 runs jobs in this process'
+        )
+        parser.add_argument(
+            '--visibility-timeout', type=int,
+            help='Seconds a job stays leased before it can be retried'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait when no job is available'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no job is available instead of waiting'
+        )
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 0:
+            raise CommandError('--concurrency must not be negative')
+        if options['visibility_timeout'] is None:
+            options['visibility_timeout'] = \
+                job_settings()['VISIBILITY_TIMEOUT']
+
+        self.verbosity = options['verbosity']
+        self.stopping = False
+        previous = {
+            signum: signal.signal(signum, self._stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            if options['concurrency'] == 0:
+                processed = self._run_inline(options)
+            else:
+                processed = self._run_pool(options)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(f'Processed {processed} jobs')
+
+    def _stop(self, signum, frame):
+        # Finish the running jobs, take no new ones
+        self.stopping = True
+
+    def _run_inline(self, options):
+        processed = 0
+        while not self.stopping:
+            leased = claim(1, options['visibility_timeout'])
+            if not leased:
+                if options['burst']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            self._report(*leased[0], run_job(*leased[0]))
+            processed += 1
+        return processed
+
+    def _run_pool(self, options):
+        pool = self._pool(options)
+        running = {}
+        processed = 0
+        try:
+            while running or not self.stopping:
+                free = options['concurrency'] - len(running)
+                leased = []
+                if free and not self.stopping:
+                    leased = claim(free, options['visibility_timeout'])
+                lost = []
+                for job_id, lease in leased:
+                    try:
+                        future = pool.submit(run_in_process, job_id, lease)
+                    except BrokenProcessPool:
+                        lost.append((job_id, lease))
+                        continue
+                    running[future] = (job_id, lease)
+
+                if not running and not lost:
+                    if options['burst']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done = ()
+                if running:
+                    done, _ = wait(
+                        running, timeout=options['poll_interval'],
+                        return_when=FIRST_COMPLETED
+                    )
+                for future in done:
+                    job_id, lease = running.pop(future)
+                    try:
+                        status = future.result()
+                    except BrokenProcessPool:
+                        lost.append((job_id, lease))
+                        continue
+                    except Exception as exc:
+                        # The job couldn't be handed over; the lease will
+                        # expire
+                        status = f'crashed ({exc})'
+                    self._report(job_id, lease, status)
+                    processed += 1
+
+                if lost:
+                    # A pool process died, which breaks the whole pool:
+                    # every job it still held is lost with it
+                    lost.extend(running.values())
+                    running.clear()
+                    for job_id, lease in lost:
+                        status = abandon(
+                            job_id, lease, 'The worker process died'
+                        )
+                        self._report(job_id, lease, status or 'finished')
+                        processed += 1
+                    pool.shutdown(wait=False)
+                    pool = self._pool(options)
+        finally:
+            pool.shutdown()
+        return processed
+
+    def _pool(self, options):
+        # Pool processes start fresh and set Django up themselves, instead
+        # of inheriting this process's database connections
+        return ProcessPoolExecutor(
+            max_workers=options['concurrency'],
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+
+    def _report(self, job_id, lease, status):
+        if self.verbosity > 1:
+            self.stdout.write(f'Job {job_id}: {status}')
@@ -0,0 +1,92 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.benchmark import BENCH_EMAIL_DOMAIN, DISTRIBUTIONS, \
+    bench_email, recipe_counts, seed_collection
+from recipe.bulk import delete_collections
+from recipe.stats import rebuild_stats
+from recipe.versions import bump_version
+
+
+class Command(BaseCommand):
+    help = 'Create benchmark users with reproducible synthetic collections'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Average number of recipes per user'
+        )
+        parser.add_argument(
+            '--distribution', choices=DISTRIBUTIONS, default='uniform',
+            help='How recipes are spread over users'
+        )
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--ingredients', type=int, default=200)
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=5)
+        parser.add_argument('--password', default='benchmark')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete the benchmark users of a previous run first'
+        )
+
+    def handle(self, *args, **options):
+        existing = get_user_model().objects.filter(
+            email__endswith=f'@{BENCH_EMAIL_DOMAIN}'
+        )
+        if existing.exists():
+            if not options['clear']:
+                raise CommandError(
+                    'Benchmark users already exist, pass --clear to '
+                    'replace them'
+                )
+            self.stdout.write('Deleting the previous benchmark users...')
+            with transaction.atomic():
+                delete_collections(existing.values_list('id', flat=True))
+                existing.delete()
+
+        users = self._create_users(options)
+        counts = recipe_counts(
+            len(users), options['recipes'], options['distribution'],
+            options['seed']
+        )
+        for number, (user, count) in enumerate(zip(users, counts)):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{user.email}: {count} recipes')
+            with transaction.atomic():
+                seed_collection(
+                    user,
+                    count,
+                    tags=options['tags'],
+                    ingredients=options['ingredients'],
+                    tags_per_recipe=options['tags_per_recipe'],
+                    ingredients_per_recipe=options['ingredients_per_recipe'],
+                    seed=options['seed'] + number,
+                )
+                # bulk_create skips the signals keeping these up to date
+                rebuild_stats(user.id)
+                bump_version(user.id)
+
+        self.stdout.write(
+            f'Seeded {len(users)} users with {sum(counts)} recipes, '
+            f'log in as {bench_email(0)} / {options["password"]}'
+        )
+
+    def _create_users(self, options):
+        # Hashing is deliberately slow, every user shares one hash
+        password = make_password(options['password'])
+        manager = get_user_model().objects
+        users = []
+        for number in range(options['users']):
+            user = manager.create_user(bench_email(number), commit=False)
+            user.password = password
+            users.append(user)
+        manager.bulk_create(users)
+        return list(
+            manager.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}')
+            .order_by('id')
+        )
@@ -0,0 +1,91 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe, RecipeImageVariant
+from core.storage import image_storage, is_sharded, release
+from recipe.versions import bump_version
+
+# model, file field, path to the owning user's id, resume option
+MODELS = (
+    (Recipe, 'image', 'user_id', 'recipe_start_id'),
+    (RecipeImageVariant, 'file', 'recipe__user_id', 'variant_start_id'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Move existing recipe images into the sharded directory layout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--recipe-start-id', type=int, default=0,
+            help='Skip recipes with a lower or equal id'
+        )
+        parser.add_argument(
+            '--variant-start-id', type=int, default=0,
+            help='Skip image variants with a lower or equal id'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to pause between batches to limit the load'
+        )
+
+    def handle(self, *args, **options):
+        for model, field, user_path, start_option in MODELS:
+            self._migrate(model, field, user_path, start_option, options)
+
+    def _migrate(self, model, field, user_path, start_option, options):
+        """Copy files of model in batches of rows, in id order
+
+        Each row is switched to its new name with a conditional UPDATE, so
+        rows changed concurrently are left alone and the command can be
+        interrupted and run again at any time: rows already moved are
+        skipped. Progress lines give the option resuming after the batch.
+        """
+        last_id = options[start_option]
+        resume = '--' + start_option.replace('_', '-')
+        moved = missing = 0
+        while True:
+            rows = list(
+                model.objects
+                .filter(id__gt=last_id)
+                .exclude(**{f'{field}__isnull': True})
+                .exclude(**{field: ''})
+                .order_by('id')
+                .values_list('id', field, user_path)
+                [:options['batch_size']]
+            )
+            if not rows:
+                break
+
+            moved_names = []
+            users = set()
+            for pk, name, user_id in rows:
+                if is_sharded(name):
+                    continue
+                if not image_storage.exists(name):
+                    missing += 1
+                    continue
+                with image_storage.open(name) as source:
+                    new_name = image_storage.save(name, source)
+                updated = model.objects \
+                    .filter(id=pk, **{field: name}) \
+                    .update(**{field: new_name})
+                if updated:
+                    moved_names.append(name)
+                    users.add(user_id)
+                else:
+                    release([new_name])
+
+            release(moved_names)
+            for user_id in users:
+                bump_version(user_id, links=False)
+            moved += len(moved_names)
+            last_id = rows[-1][0]
+            self.stdout.write(
+                f'{model.__name__}: up to id {last_id} ({resume} '
+                f'{last_id}), {moved} moved, {missing} missing'
+            )
+            if options['sleep']:
+                time.sleep(options['sleep'])
@@ -0,0 +1,52 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.storage import image_storage, is_sharded, release
+
+DIRECTORY = 'uploads/recipe'
+
+
+class Command(BaseCommand):
+    help = 'Delete stored recipe images that nothing refers to any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--sleep', type=float, default=0,
+            help='Seconds to pause between batches to limit the load'
+        )
+
+    def handle(self, *args, **options):
+        """Release every stored file, in batches
+
+        release() keeps files that are referenced or within the grace
+        period, so this catches up on files it skipped as too recent when
+        their last reference went away, and on files left by requests
+        that failed half way. Run it periodically, e.g. from cron.
+        """
+        checked = deleted = 0
+        batch = []
+        for name in self._stored_names():
+            batch.append(name)
+            if len(batch) >= options['batch_size']:
+                checked += len(batch)
+                deleted += len(release(batch))
+                batch = []
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+        checked += len(batch)
+        deleted += len(release(batch))
+        self.stdout.write(f'{checked} files checked, {deleted} deleted')
+
+    def _stored_names(self):
+        root = image_storage.path('')
+        for directory, _, files in os.walk(image_storage.path(DIRECTORY)):
+            for filename in files:
+                name = os.path.relpath(
+                    os.path.join(directory, filename), root
+                ).replace(os.sep, '/')
+                # Only content addressed files may be shared and released
+                if is_sharded(name):
+                    yield name
@@ -0,0 +1,388 @@
+import atexit
+import fcntl
+import json
+import os
+import re
+import resource
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from core.instrumentation import RequestMetrics
+
+# Files of exited processes are folded into this one
+EXITED_FILE = 'exited.json'
+PROCESS_FILE = re.compile(r'(?P<pid>\d+)-(?P<started>\d+)\.json')
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# name -> (type, help)
+METRICS = {
+    'http_requests_total': (
+        'counter', 'Requests served, by view, method and status code'),
+    'http_request_errors_total': (
+        'counter', 'Requests answered with a 5xx status, by view'),
+    'http_request_duration_seconds': (
+        'histogram', 'Time spent serving requests, by view and method'),
+    'db_queries_total': (
+        'counter', 'Database queries run while serving requests, by view'),
+    'db_query_duration_seconds_total': (
+        'counter', 'Time spent in database queries, by view'),
+    'db_connections_created_total': (
+        'counter', 'Database connections opened, by alias'),
+    'cache_hits_total': ('counter', 'Cache hits, by cache'),
+    'cache_misses_total': ('counter', 'Cache misses, by cache'),
+    'process_cpu_seconds_total': (
+        'counter', 'CPU time used by the process, by process'),
+    'process_max_resident_memory_bytes': (
+        'gauge', 'Peak resident memory of the process, by process'),
+    'process_open_fds': ('gauge', 'Open file descriptors, by process'),
+    'process_start_time_seconds': (
+        'gauge', 'Start time of the process since the epoch, by process'),
+}
+
+
+def metrics_settings():
+    options = {
+        'ENABLED': False,
+        'DIRECTORY': '/tmp/metrics',
+        'FLUSH_INTERVAL': 1,
+    }
+    options.update(getattr(settings, 'METRICS', {}))
+    return options
+
+
+class Registry:
+    """Counters and histograms of this process, shared through files
+
+    Every process writes its values to ``<directory>/<pid>-<start>.json``
+    at most once per flush interval, the start time telling apart
+    processes that got the same pid. collect() sums the files of all
+    processes and folds those of exited ones into a single file, so
+    counters keep the contribution of exited workers without their files
+    piling up. Gauges describe a process and are only reported for live
+    ones.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.flushed = 0
+
+    def _check_fork(self):
+        # A forked worker starts from its parent's values; don't count
+        # them twice
+        if self.pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._check_fork()
+            self.counters[name, _key(labels)] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            self._check_fork()
+            key = (name, _key(labels))
+            if key not in self.histograms:
+                # per bucket counts, then +Inf, sum
+                self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            histogram = self.histograms[key]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(BUCKETS)] += 1
+            histogram[-1] += value
+
+    def flush(self, directory, interval=0):
+        """Write this process's values unless written within interval"""
+        now = time.monotonic()
+        with self._lock:
+            self._check_fork()
+            if self.flushed and now - self.flushed < interval:
+                return
+            self.flushed = now
+            data = {
+                'counters': [
+                    [name, labels, value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, labels, values]
+                    for (name, labels), values in self.histograms.items()
+                ],
+            }
+        data['counters'].extend(_cache_counters())
+        data['gauges'] = _process_gauges(self.started)
+
+        os.makedirs(directory, exist_ok=True)
+        _write(
+            directory, f'{self.pid}-{int(self.started * 1000000)}.json', data
+        )
+
+
+registry = Registry()
+
+
+def collect(directory):
+    """Return the values of all processes, summed per series"""
+    _fold_exited(directory)
+    counters = defaultdict(float)
+    histograms = {}
+    gauges = []
+    for entry in sorted(os.listdir(directory)):
+        match = PROCESS_FILE.fullmatch(entry)
+        if not match and entry != EXITED_FILE:
+            continue
+        data = _load(directory, entry)
+        if data is None:
+            continue
+
+        _add(counters, histograms, data)
+        if match and _alive(match['pid']):
+            pid = match['pid']
+            for name, labels, value in data['gauges']:
+                gauges.append((name, _key(labels + [['pid', pid]]), value))
+    return counters, histograms, gauges
+
+
+def _fold_exited(directory):
+    """Add the files of exited processes to EXITED_FILE, then drop them"""
+    latest = {}
+    exited = []
+    for entry in os.listdir(directory):
+        match = PROCESS_FILE.fullmatch(entry)
+        if not match:
+            continue
+        pid, started = match['pid'], int(match['started'])
+        if not _alive(pid):
+            exited.append(entry)
+        elif pid not in latest:
+            latest[pid] = (started, entry)
+        else:
+            # A reused pid, only the newest file can be the live process
+            older, latest[pid] = sorted((latest[pid], (started, entry)))
+            exited.append(older[1])
+    if not exited:
+        return
+
+    with open(os.path.join(directory, '.fold.lock'), 'w') as lock:
+        # Concurrent scrapes must not fold a file twice
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        counters = defaultdict(float)
+        histograms = {}
+        total = _load(directory, EXITED_FILE)
+        if total is not None:
+            _add(counters, histograms, total)
+        folded = []
+        for entry in exited:
+            data = _load(directory, entry)
+            if data is not None:
+                _add(counters, histograms, data)
+                folded.append(entry)
+        if not folded:
+            return
+        _write(directory, EXITED_FILE, {
+            'counters': [
+                [name, labels, value]
+                for (name, labels), value in counters.items()
+            ],
+            'histograms': [
+                [name, labels, values]
+                for (name, labels), values in histograms.items()
+            ],
+            'gauges': [],
+        })
+        for entry in folded:
+            os.remove(os.path.join(directory, entry))
+
+
+def _add(counters, histograms, data):
+    for name, labels, value in data['counters']:
+        counters[name, _key(labels)] += value
+    for name, labels, values in data['histograms']:
+        key = (name, _key(labels))
+        if key in histograms:
+            histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+        else:
+            histograms[key] = values
+
+
+def _load(directory, entry):
+    try:
+        with open(os.path.join(directory, entry)) as source:
+            return json.load(source)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(directory, entry, data):
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as temp:
+        json.dump(data, temp)
+    os.replace(temp_path, os.path.join(directory, entry))
+
+
+def render(directory):
+    """Render the values of all processes in Prometheus text format"""
+    counters, histograms, gauges = collect(directory)
+    series = defaultdict(list)
+    for (name, labels), value in sorted(counters.items()):
+        series[name].append((name, labels, value))
+    for (name, labels), values in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), values):
+            cumulative += count
+            series[name].append((
+                f'{name}_bucket', labels + (('le', str(bound)),), cumulative
+            ))
+        series[name].append((f'{name}_sum', labels, values[-1]))
+        series[name].append((f'{name}_count', labels, cumulative))
+    for name, labels, value in sorted(gauges):
+        series[name].append((name, labels, value))
+
+    lines = []
+    for name in sorted(series):
+        kind, description = METRICS.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample, labels, value in series[name]:
+            lines.append(f'{sample}{_format_labels(labels)} {value!r}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Count requests, their latency, errors and database queries per view
+
+    Enabled with METRICS['ENABLED']; values are flushed to the metrics
+    directory at most every FLUSH_INTERVAL seconds, so ``/metrics`` may
+    lag behind other workers by that much.
+    """
+
+    def __init__(self, get_response):
+        options = metrics_settings()
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.directory = options['DIRECTORY']
+        self.interval = options['FLUSH_INTERVAL']
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = RequestMetrics()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        registry.inc('http_requests_total', {
+            'view': view,
+            'method': request.method,
+            'status': str(response.status_code),
+        })
+        if response.status_code >= 500:
+            registry.inc('http_request_errors_total', {'view': view})
+        registry.observe(
+            'http_request_duration_seconds',
+            {'view': view, 'method': request.method},
+            duration
+        )
+        registry.inc('db_queries_total', {'view': view}, queries.queries)
+        registry.inc(
+            'db_query_duration_seconds_total', {'view': view},
+            queries.sql_time
+        )
+        registry.flush(self.directory, self.interval)
+        return response
+
+
+def count_connection(sender, connection, **kwargs):
+    registry.inc('db_connections_created_total', {'alias': connection.alias})
+
+
+connection_created.connect(count_connection)
+
+
+@atexit.register
+def flush_at_exit():
+    # Keep the last requests of a worker that stops between flushes
+    options = metrics_settings()
+    if options['ENABLED'] and registry.counters:
+        registry.flush(options['DIRECTORY'])
+
+
+def _key(labels):
+    """Return labels, a dict or pairs, as a sorted tuple of pairs"""
+    if isinstance(labels, dict):
+        labels = labels.items()
+    return tuple(sorted((str(k), str(v)) for k, v in labels))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{n}="{v}"' for n, v in escaped) + '}'
+
+
+def _alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _cache_counters():
+    from core.authentication import token_cache
+    from recipe.cache import response_cache
+
+    counters = []
+    for cache, stats in (
+        ('response', response_cache.stats()),
+        ('token', token_cache.stats()),
+    ):
+        labels = [['cache', cache]]
+        counters.append(['cache_hits_total', labels, stats['hits']])
+        counters.append(['cache_misses_total', labels, stats['misses']])
+    return counters
+
+
+def _process_gauges(started):
+    cpu = os.times()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    gauges = [
+        ['process_cpu_seconds_total', [], cpu.user + cpu.system],
+        # ru_maxrss is in kilobytes on Linux
+        ['process_max_resident_memory_bytes', [], usage.ru_maxrss * 1024],
+        ['process_start_time_seconds', [], started],
+    ]
+    if os.path.isdir('/proc/self/fd'):
+        gauges.append(
+            ['process_open_fds', [], len(os.listdir('/proc/self/fd'))]
+        )
+    return gauges
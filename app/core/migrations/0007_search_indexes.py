@@ -0,0 +1,36 @@
+from django.db import migrations
+
+SEARCH_INDEXES = (
+    ('core_recipe_title_search', 'core_recipe', 'title'),
+    ('core_tag_name_search', 'core_tag', 'name'),
+    ('core_ingredient_name_search', 'core_ingredient', 'name'),
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    """Create GIN indexes matching recipe.search expressions on PostgreSQL"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in SEARCH_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin '
+            f"(to_tsvector('english'::regconfig, COALESCE({column}, '')))"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in SEARCH_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_collectionversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
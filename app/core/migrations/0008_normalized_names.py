@@ -0,0 +1,62 @@
+from django.db import migrations, models
+
+
+def normalize_name(name):
+    return ' '.join(name.split()).casefold()
+
+
+def merge_duplicates(apps, schema_editor):
+    """Fill normalized_name and merge rows that now collide per user
+
+    The oldest row of each (user, normalized name) group is kept and the
+    recipes of the other rows are linked to it before they are deleted.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field in (('Tag', 'tag'), ('Ingredient', 'ingredient')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, f'{field}s').through
+        keepers = {}
+        for obj in model.objects.order_by('id').iterator():
+            key = (obj.user_id, normalize_name(obj.name))
+            keeper_id = keepers.setdefault(key, obj.id)
+            if keeper_id == obj.id:
+                obj.normalized_name = key[1]
+                obj.save(update_fields=['normalized_name'])
+                continue
+
+            linked = set(
+                through.objects
+                .filter(**{f'{field}_id': keeper_id})
+                .values_list('recipe_id', flat=True)
+            )
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{f'{field}_id': keeper_id})
+                for recipe_id in through.objects
+                .filter(**{f'{field}_id': obj.id})
+                .values_list('recipe_id', flat=True)
+                if recipe_id not in linked
+            ])
+            obj.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
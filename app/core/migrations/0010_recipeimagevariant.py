@@ -0,0 +1,30 @@
+# Generated by Django 2.1.15 on 2026-10-17 02:35
+
+import core.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_unique_normalized_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=32)),
+                ('file', models.ImageField(upload_to=core.models.recipe_image_variant_file_path)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='image_variants', to='core.Recipe')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='recipeimagevariant',
+            unique_together={('recipe', 'name')},
+        ),
+    ]
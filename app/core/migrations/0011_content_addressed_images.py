@@ -0,0 +1,25 @@
+# Generated by Django 2.1.15 on 2026-10-17 02:37
+
+import core.models
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipeimagevariant'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_file_path),
+        ),
+        migrations.AlterField(
+            model_name='recipeimagevariant',
+            name='file',
+            field=models.ImageField(storage=core.storage.ContentAddressedStorage(), upload_to=core.models.recipe_image_variant_file_path),
+        ),
+    ]
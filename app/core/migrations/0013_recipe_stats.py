@@ -0,0 +1,95 @@
+# Generated by Django 2.1.15 on 2026-10-17 02:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Min, Sum
+
+
+def build_stats(apps, schema_editor):
+    """Compute the statistics of the recipes that already exist"""
+    Recipe = apps.get_model('core', 'Recipe')
+    RecipeStats = apps.get_model('core', 'RecipeStats')
+    RecipeStats.objects.bulk_create(
+        RecipeStats(user_id=row.pop('user_id'), **row)
+        for row in Recipe.objects
+        .order_by()
+        .values('user_id')
+        .annotate(
+            recipe_count=Count('id'),
+            price_total=Sum('price'),
+            price_min=Min('price'),
+            price_max=Max('price'),
+            time_total=Sum('time_minutes'),
+            time_min=Min('time_minutes'),
+            time_max=Max('time_minutes'),
+        )
+    )
+
+    for model_name, field in (('Tag', 'tag'), ('Ingredient', 'ingredient')):
+        model = apps.get_model('core', model_name)
+        stats = apps.get_model('core', f'{model_name}Stats')
+        stats.objects.bulk_create(
+            stats(
+                user_id=row['user_id'],
+                recipe_count=row['recipe_count'],
+                **{f'{field}_id': row['id']}
+            )
+            for row in model.objects
+            .filter(recipe__isnull=False)
+            .order_by()
+            .values('id', 'user_id')
+            .annotate(recipe_count=Count('recipe'))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientStats',
+            fields=[
+                ('ingredient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.Ingredient')),
+                ('recipe_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recipe_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('recipe_count', models.IntegerField(default=0)),
+                ('price_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('time_total', models.BigIntegerField(default=0)),
+                ('time_min', models.IntegerField(null=True)),
+                ('time_max', models.IntegerField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TagStats',
+            fields=[
+                ('tag', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.Tag')),
+                ('recipe_count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredientstats',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterIndexTogether(
+            name='tagstats',
+            index_together={('user', 'recipe_count')},
+        ),
+        migrations.AlterIndexTogether(
+            name='ingredientstats',
+            index_together={('user', 'recipe_count')},
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
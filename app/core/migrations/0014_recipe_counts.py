@@ -0,0 +1,52 @@
+# Generated by Django 2.1.15 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+def copy_counts(apps, schema_editor):
+    """Move the counts of TagStats and IngredientStats to their rows"""
+    for model_name, field in (('Tag', 'tag'), ('Ingredient', 'ingredient')):
+        model = apps.get_model('core', model_name)
+        stats = apps.get_model('core', f'{model_name}Stats')
+        by_count = {}
+        for pk, count in stats.objects \
+                .exclude(recipe_count=0) \
+                .values_list(f'{field}_id', 'recipe_count'):
+            by_count.setdefault(count, []).append(pk)
+        for count, pks in by_count.items():
+            model.objects.filter(pk__in=pks).update(recipe_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='ingredient',
+            index_together={('user', 'recipe_count')},
+        ),
+        migrations.AlterIndexTogether(
+            name='tag',
+            index_together={('user', 'recipe_count')},
+        ),
+        migrations.RunPython(copy_counts, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='IngredientStats',
+        ),
+        migrations.DeleteModel(
+            name='TagStats',
+        ),
+    ]
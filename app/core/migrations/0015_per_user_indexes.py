@@ -0,0 +1,72 @@
+# Generated by Django 2.1.15 on 2026-10-17 02:52
+
+from django.db import migrations, models
+
+# Through tables come with a unique (recipe_id, related_id) index; these
+# serve lookups from the tag or ingredient side without a table access.
+# They replace the single column index Django gives the related_id
+# foreign key, which the planner would otherwise keep picking.
+THROUGH_INDEXES = (
+    ('core_recipe_tags_tag_recipe', 'tags', 'tag_id'),
+    (
+        'core_recipe_ingredients_ingredient_recipe',
+        'ingredients',
+        'ingredient_id'
+    ),
+)
+
+
+def through_models(apps):
+    Recipe = apps.get_model('core', 'Recipe')
+    for name, field, column in THROUGH_INDEXES:
+        yield name, Recipe._meta.get_field(field).remote_field.through, column
+
+
+def replace_foreign_key_indexes(apps, schema_editor):
+    for name, through, column in through_models(apps):
+        table = through._meta.db_table
+        for old_name in schema_editor._constraint_names(
+                through, [column], index=True, unique=False):
+            schema_editor.execute(schema_editor.sql_delete_index % {
+                'table': schema_editor.quote_name(table),
+                'name': schema_editor.quote_name(old_name),
+            })
+        schema_editor.execute(
+            f'CREATE INDEX {name} ON {table} ({column}, recipe_id)'
+        )
+
+
+def restore_foreign_key_indexes(apps, schema_editor):
+    for name, through, column in through_models(apps):
+        schema_editor.execute(schema_editor.sql_delete_index % {
+            'table': schema_editor.quote_name(through._meta.db_table),
+            'name': schema_editor.quote_name(name),
+        })
+        schema_editor.execute(schema_editor._create_index_sql(
+            through, [through._meta.get_field(column[:-len('_id')])]
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_counts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-name'], name='core_ingredient_user_name_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='core_recipe_user_id_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-name'], name='core_tag_user_name_desc'),
+        ),
+        migrations.RunPython(
+            replace_foreign_key_indexes, restore_foreign_key_indexes
+        ),
+    ]
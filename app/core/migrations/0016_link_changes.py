@@ -0,0 +1,39 @@
+# Generated by Django 2.1.15 on 2026-10-17 03:19
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_links_versions(apps, schema_editor):
+    # Like versions, links versions start from random values
+    apps.get_model('core', 'CollectionVersion').objects \
+        .update(links_version=F('version'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_per_user_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeLinkChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField()),
+                ('version', models.BigIntegerField()),
+                ('changes', models.TextField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='collectionversion',
+            name='links_version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recipelinkchange',
+            unique_together={('user_id', 'version')},
+        ),
+        migrations.RunPython(start_links_versions, migrations.RunPython.noop),
+    ]
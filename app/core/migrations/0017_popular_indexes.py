@@ -0,0 +1,30 @@
+# Generated by Django 2.1.15 on 2026-10-17 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_link_changes'),
+    ]
+
+    operations = [
+        # The new indexes also serve what the old ones did
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', '-id'], name='core_ingredient_user_popular'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', '-id'], name='core_tag_user_popular'),
+        ),
+        migrations.AlterIndexTogether(
+            name='ingredient',
+            index_together=set(),
+        ),
+        migrations.AlterIndexTogether(
+            name='tag',
+            index_together=set(),
+        ),
+    ]
@@ -3,18 +3,63 @@ import uuid
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, \
     PermissionsMixin
 
+from core.storage import image_storage
+
 
 def recipe_image_file_path(instance, filename):
-    """Generate file path for new recipe image"""
+    """Generate file path for new recipe image
+
+    image_storage stores the file under its content digest, in fan-out
+    directories.
+    """
     ext = filename.split('.')[-1]
     filename = f'{uuid.uuid4()}.{ext}'
 
     return os.path.join('uploads/recipe/', filename)
 
 
+def recipe_image_variant_file_path(instance, filename):
+    """Generate file path for a resized copy of a recipe image"""
+    ext = filename.split('.')[-1]
+    filename = f'{uuid.uuid4()}.{ext}'
+
+    return os.path.join('uploads/recipe/variants/', filename)
+
+
+def normalize_name(name):
+    """Return the case and whitespace insensitive form of a name"""
+    return ' '.join(name.split()).casefold()
+
+
+def store_normalized_name(instance, kwargs):
+    """Set normalized_name of instance, saving it whenever name is saved"""
+    instance.normalized_name = normalize_name(instance.name)
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and 'name' in update_fields and \
+            'normalized_name' not in update_fields:
+        kwargs['update_fields'] = [*update_fields, 'normalized_name']
+    return kwargs
+
+
+def preserve_recipe_count(instance, kwargs):
+    """Leave recipe_count out of the UPDATE when instance is saved
+
+    The count is changed with UPDATEs of its own as recipes are linked,
+    so the value loaded with instance may already be stale.
+    """
+    if not instance._state.adding and not kwargs.get('force_insert') and \
+            kwargs.get('update_fields') is None:
+        kwargs['update_fields'] = [
+            field.name for field in instance._meta.concrete_fields
+            if not field.primary_key and field.name != 'recipe_count'
+        ]
+    return kwargs
+
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, commit=True, **extra_fields):
         user = self.model(email=self.normalize_email(email), **extra_fields)
@@ -60,6 +105,26 @@ class Tag(models.Model):
         on_delete=models.CASCADE
     )
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, editable=False)
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        unique_together = ('user', 'normalized_name')
+        indexes = (
+            # Lists are filtered by user and ordered by -name
+            models.Index(
+                fields=('user', '-name'), name='core_tag_user_name_desc'
+            ),
+            # or by popularity, and paged on both fields
+            models.Index(
+                fields=('user', '-recipe_count', '-id'),
+                name='core_tag_user_popular'
+            ),
+        )
+
+    def save(self, *args, **kwargs):
+        kwargs = store_normalized_name(self, kwargs)
+        super().save(*args, **preserve_recipe_count(self, kwargs))
 
     def __str__(self):
         return self.name
@@ -72,6 +137,26 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE
     )
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, editable=False)
+    recipe_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        unique_together = ('user', 'normalized_name')
+        indexes = (
+            # Lists are filtered by user and ordered by -name
+            models.Index(
+                fields=('user', '-name'), name='core_ingredient_user_name_desc'
+            ),
+            # or by popularity, and paged on both fields
+            models.Index(
+                fields=('user', '-recipe_count', '-id'),
+                name='core_ingredient_user_popular'
+            ),
+        )
+
+    def save(self, *args, **kwargs):
+        kwargs = store_normalized_name(self, kwargs)
+        super().save(*args, **preserve_recipe_count(self, kwargs))
 
     def __str__(self):
         return self.name
@@ -95,7 +180,144 @@ class Recipe(models.Model):
 
     tags = models.ManyToManyField('Tag')
 
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=image_storage
+    )
+
+    class Meta:
+        indexes = (
+            # Lists and pages are filtered by user and ordered by -id
+            models.Index(
+                fields=('user', '-id'), name='core_recipe_user_id_desc'
+            ),
+        )
 
     def __str__(self):
         return self.title
+
+
+class RecipeImageVariant(models.Model):
+    """Resized or re-encoded copy of a recipe image"""
+    recipe = models.ForeignKey(
+        'Recipe',
+        on_delete=models.CASCADE,
+        related_name='image_variants'
+    )
+    name = models.CharField(max_length=32)
+    file = models.ImageField(
+        upload_to=recipe_image_variant_file_path,
+        storage=image_storage
+    )
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ('recipe', 'name')
+
+    def __str__(self):
+        return f'{self.recipe_id}/{self.name}'
+
+
+class CollectionVersion(models.Model):
+    """Counter bumped whenever a user's recipe collection changes
+
+    Keyed by the plain user id rather than a foreign key so that bumps
+    fired while a user is being deleted never violate a constraint.
+    ``links_version`` only moves when links between recipes and tags or
+    ingredients change.
+    """
+    user_id = models.IntegerField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+    links_version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}@{self.version}'
+
+
+class RecipeLinkChange(models.Model):
+    """Links changed by one bump of a user's links version
+
+    Lets processes bring their filter index up to date by replaying a few
+    changes instead of reading every link of the user again. Only recent
+    changes are kept.
+    """
+    user_id = models.IntegerField()
+    version = models.BigIntegerField()
+    changes = models.TextField()
+
+    class Meta:
+        unique_together = ('user_id', 'version')
+
+    def __str__(self):
+        return f'{self.user_id}@{self.version}'
+
+
+class RecipeStats(models.Model):
+    """Aggregates of a user's recipes, updated as the recipes change
+
+    A user without a row has no recipes. Totals are kept rather than
+    averages so that recipes can be added and removed with plain
+    arithmetic. Per tag and ingredient counts live in their recipe_count.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='recipe_stats'
+    )
+    recipe_count = models.IntegerField(default=0)
+    price_total = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    price_min = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    price_max = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    time_total = models.BigIntegerField(default=0)
+    time_min = models.IntegerField(null=True)
+    time_max = models.IntegerField(null=True)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.recipe_count} recipes'
+
+
+class Job(models.Model):
+    """Unit of background work stored in the database
+
+    Workers lease a job by moving ``available_at`` past the visibility
+    timeout; a job whose worker died becomes available again once the
+    lease expires.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        on_delete=models.CASCADE
+    )
+    name = models.CharField(max_length=100)
+    payload = models.TextField(default='{}')
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    available_at = models.DateTimeField(default=timezone.now)
+    lease = models.CharField(max_length=32, blank=True)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        index_together = ('status', 'available_at')
+
+    def __str__(self):
+        return f'{self.name}#{self.pk} ({self.status})'
@@ -0,0 +1,118 @@
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Opaque cursor pagination over a stable keyset ordering.
+
+    Pagination is opt-in: responses stay a plain list unless the client
+    sends ``page_size`` or ``cursor``, so existing clients keep working.
+    Pages are fetched with ``WHERE key < position LIMIT n`` and never run
+    a ``COUNT(*)``, so deep pages cost the same as the first one.
+    """
+    ordering = '-id'
+    page_size = getattr(settings, 'API_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 1000)
+
+    def get_page_size(self, request):
+        params = request.query_params
+        if self.page_size_query_param not in params and \
+                self.cursor_query_param not in params:
+            return None
+        return super().get_page_size(request)
+
+
+class NameKeysetPagination(KeysetPagination):
+    """Keyset pagination for recipe attributes listed by name
+
+    Views may pick another ordering per request with ``get_ordering()``.
+    An ordering of several fields, the last one unique, is paged on all of
+    them: the cursor holds every value of the last item and the next page
+    starts with ``WHERE (a, b) < (x, y)``, so heavily tied first fields
+    cost no offsets.
+    """
+    ordering = '-name'
+
+    def get_ordering(self, request, queryset, view):
+        if hasattr(view, 'get_ordering'):
+            return tuple(view.get_ordering())
+        return super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = self.get_ordering(request, queryset, view)
+        if len(ordering) == 1:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = ordering
+        self.cursor = self.decode_cursor(request)
+        # Positions are unique, so cursors never need an offset
+        reverse = self.cursor is not None and self.cursor.reverse
+        position = self.cursor.position if self.cursor else None
+
+        queryset = queryset.order_by(*(
+            _reverse(ordering) if reverse else ordering
+        ))
+        if position is not None:
+            queryset = queryset.filter(self._after(position, reverse))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(
+                results[-1], ordering
+            )
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = following is not None
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next = following is not None
+            self.has_previous = position is not None
+            self.next_position, self.previous_position = following, position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _after(self, position, reverse):
+        """Return the condition of rows past position in the ordering"""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condition = Q()
+        equal = {}
+        for order, value in zip(self.ordering, values):
+            field = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def _get_position_from_instance(self, instance, ordering):
+        if len(ordering) == 1:
+            return super()._get_position_from_instance(instance, ordering)
+        fields = [order.lstrip('-') for order in ordering]
+        if isinstance(instance, dict):
+            return json.dumps([instance[field] for field in fields])
+        return json.dumps([getattr(instance, field) for field in fields])
+
+
+def _reverse(ordering):
+    return tuple(
+        order[1:] if order.startswith('-') else f'-{order}'
+        for order in ordering
+    )
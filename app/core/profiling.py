@@ -0,0 +1,104 @@
+import cProfile
+import os
+import random
+import re
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+SIGNING_SALT = 'core.profiling'
+HEADER_META = 'HTTP_X_PROFILE'
+
+
+def profiling_settings():
+    options = {
+        'ENABLED': False,
+        'SAMPLE_RATE': 0,
+        'PATHS': ('/api/recipe/', '/api/user/'),
+        'DIRECTORY': '/tmp/profiles',
+        'MAX_FILES': 100,
+        'TOKEN_MAX_AGE': 3600,
+    }
+    options.update(getattr(settings, 'PROFILING', {}))
+    return options
+
+
+def make_token():
+    """Return a value for the X-Profile header forcing a profile"""
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign('profile')
+
+
+def valid_token(token, max_age):
+    try:
+        signing.TimestampSigner(salt=SIGNING_SALT) \
+            .unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def view_directory(directory, view_name):
+    """Return the directory holding the profiles of view_name"""
+    return os.path.join(
+        directory, re.sub(r'[^\w.-]', '_', view_name or 'unresolved')
+    )
+
+
+class ProfilingMiddleware:
+    """Profile a sample of API requests with cProfile
+
+    One in SAMPLE_RATE requests under PATHS is profiled, as is any request
+    carrying an ``X-Profile`` header signed by make_token(). Profiles are
+    dumped to ``DIRECTORY/<view name>/`` where only the MAX_FILES newest
+    are kept; ``manage.py profile_report`` aggregates them.
+    """
+
+    def __init__(self, get_response):
+        self.options = profiling_settings()
+        if not self.options['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+
+        match = request.resolver_match
+        path = self.dump(profiler, match.view_name if match else '')
+        response['X-Profile'] = os.path.basename(path)
+        return response
+
+    def should_profile(self, request):
+        if not request.path.startswith(tuple(self.options['PATHS'])):
+            return False
+        token = request.META.get(HEADER_META)
+        if token:
+            return valid_token(token, self.options['TOKEN_MAX_AGE'])
+        rate = self.options['SAMPLE_RATE']
+        return rate > 0 and random.randrange(rate) == 0
+
+    def dump(self, profiler, view_name):
+        """Write the profile of a request and drop the oldest ones"""
+        directory = view_directory(self.options['DIRECTORY'], view_name)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory,
+            f'{time.time():.6f}-{os.getpid()}.prof'
+        )
+        profiler.dump_stats(path)
+
+        dumps = sorted(
+            entry for entry in os.listdir(directory)
+            if entry.endswith('.prof')
+        )
+        for name in dumps[:-self.options['MAX_FILES']]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+        return path
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache, invalidate_user_tokens
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """Stop accepting a deleted token straight away"""
+    token_cache.invalidate([instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+def user_changed(sender, instance, created, **kwargs):
+    """Drop cached tokens so the next request sees the saved user
+
+    Done again on commit, in case a concurrent request cached the old
+    row while the transaction was still open.
+    """
+    if created:
+        return
+    invalidate_user_tokens(instance.pk)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: invalidate_user_tokens(instance.pk))
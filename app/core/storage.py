@@ -0,0 +1,116 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+SHARDED_NAME_RE = re.compile(
+    r'/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.[^/]+$'
+)
+
+
+def sharded_name(directory, digest, extension):
+    """Return the name of a file with digest under two fan-out levels"""
+    return os.path.join(
+        directory, digest[:2], digest[2:4], digest + extension
+    )
+
+
+def is_sharded(name):
+    """Tell whether a stored name already follows the sharded layout"""
+    return SHARDED_NAME_RE.search(name) is not None
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files after the SHA-256 of their content
+
+    Uploads are hashed while they are streamed to a temporary file next to
+    their destination, then renamed to ``<directory>/ab/cd/<digest><ext>``
+    where ``ab`` and ``cd`` are the first hex digits of the digest, so no
+    directory ever holds more than a small share of the files. A file
+    whose content is already stored is not written again, so the same photo
+    uploaded to many recipes takes disk space once and its URL never
+    changes meaning.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content has been hashed
+        return name
+
+    def _save(self, name, content):
+        directory, basename = os.path.split(name)
+        extension = os.path.splitext(basename)[1].lower()
+        full_directory = self.path(directory)
+        os.makedirs(full_directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=full_directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+
+            name = sharded_name(directory, digest.hexdigest(), extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                # Refresh the mtime so release() sees the file as in use
+                os.utime(full_path)
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return name.replace('\\', '/')
+
+
+image_storage = ContentAddressedStorage()
+
+
+def release(names):
+    """Delete the stored images no recipe or image variant refers to
+
+    Files are shared between rows, so a file is only removed once a query
+    finds no reference left. Files written or reused within the last
+    IMAGE_STORAGE_DELETE_GRACE seconds are kept, as a concurrent upload of
+    the same content may be about to reference them; `manage.py
+    sweep_images` deletes them later.
+    """
+    from core.models import Recipe, RecipeImageVariant
+
+    names = {name for name in names if name}
+    if not names:
+        return []
+
+    used = set(
+        Recipe.objects
+        .filter(image__in=names)
+        .values_list('image', flat=True)
+    )
+    used.update(
+        RecipeImageVariant.objects
+        .filter(file__in=names)
+        .values_list('file', flat=True)
+    )
+
+    grace = getattr(settings, 'IMAGE_STORAGE_DELETE_GRACE', 60)
+    deleted = []
+    for name in sorted(names - used):
+        try:
+            age = time.time() - os.path.getmtime(image_storage.path(name))
+        except FileNotFoundError:
+            continue
+        if age >= grace:
+            image_storage.delete(name)
+            deleted.append(name)
+    return deleted
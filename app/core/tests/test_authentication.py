@@ -0,0 +1,138 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory
+
+from core.authentication import CachedTokenAuthentication, TokenCache, \
+    token_cache
+
+
+@override_settings(TOKEN_AUTH_CACHE={'LOCAL': True})
+class CachedTokenAuthenticationTests(TestCase):
+    """Test token authentication backed by the token cache"""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@hosseindev.ir', 'testpass'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.auth = CachedTokenAuthentication()
+
+    def authenticate(self, key=None):
+        request = APIRequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'Token {key or self.token.key}'
+        )
+        return self.auth.authenticate(request)
+
+    def test_cached_token_skips_database(self):
+        """Test a token seen before is authenticated without queries"""
+        self.authenticate()
+
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+
+    @override_settings(TOKEN_AUTH_CACHE={})
+    def test_not_cached_by_default(self):
+        """Test tokens are only cached once a cache mode is configured"""
+        self.authenticate()
+
+        with self.assertNumQueries(1):
+            self.authenticate()
+
+    def test_invalid_token(self):
+        """Test an unknown token is rejected"""
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate('invalid')
+
+    def test_deleted_token_rejected(self):
+        """Test deleting a token invalidates its cache entry"""
+        self.authenticate()
+        self.token.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_deactivated_user_rejected(self):
+        """Test deactivating a user invalidates their tokens"""
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_changed_user_reloaded(self):
+        """Test saving a user makes the next request see the change"""
+        self.authenticate()
+        self.user.name = 'New name'
+        self.user.save()
+
+        user, _ = self.authenticate()
+
+        self.assertEqual(user.name, 'New name')
+
+    def test_cached_user_not_shared(self):
+        """Test requests never get the same User instance"""
+        first, _ = self.authenticate()
+        first.name = 'Mutated'
+
+        second, _ = self.authenticate()
+
+        self.assertIsNot(first, second)
+        self.assertEqual(second.name, '')
+
+
+class TokenCacheTests(TestCase):
+    """Test the bounds of the token cache"""
+
+    def test_least_recently_used_evicted(self):
+        """Test the cache keeps at most max_entries tokens"""
+        cache = TokenCache(max_entries=2, local=True)
+        cache.set('a', 'token a')
+        cache.set('b', 'token b')
+        cache.get('a')
+        cache.set('c', 'token c')
+
+        self.assertEqual(cache.get('a'), 'token a')
+        self.assertIsNone(cache.get('b'))
+
+    @patch('core.authentication.time.monotonic')
+    def test_entries_expire(self, monotonic):
+        """Test entries are dropped after the timeout"""
+        cache = TokenCache(timeout=10, local=True)
+        monotonic.return_value = 100
+        cache.set('a', 'token a')
+
+        monotonic.return_value = 109
+        self.assertEqual(cache.get('a'), 'token a')
+        monotonic.return_value = 111
+        self.assertIsNone(cache.get('a'))
+
+    @override_settings(TOKEN_AUTH_CACHE={'TIMEOUT': 60, 'LOCAL': True})
+    def test_explicit_zero_options_kept(self):
+        """Test zero options are not replaced by the settings"""
+        cache = TokenCache(max_entries=0, timeout=0)
+        cache.set('a', 'token a')
+
+        self.assertEqual(cache.timeout, 0)
+        self.assertIsNone(cache.get('a'))
+
+    def test_shared_invalidation_seen_by_other_workers(self):
+        """Test a token invalidated by one worker is gone for the others"""
+        worker_a = TokenCache(shared='default')
+        worker_b = TokenCache(shared='default')
+        worker_a.set('a', 'token a')
+        self.assertEqual(worker_a.get('a'), 'token a')
+        self.assertEqual(worker_b.get('a'), 'token a')
+
+        worker_b.invalidate(['a'])
+
+        self.assertIsNone(worker_a.get('a'))
+        self.assertIsNone(worker_b.get('a'))
@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.test import LiveServerTestCase
+
+from core.management.commands.bench import OPERATIONS
+
+
+class BenchTests(LiveServerTestCase):
+    """Test replaying the benchmark workload against a live server"""
+
+    def setUp(self):
+        call_command(
+            'seed_benchmark', users=2, recipes=5, tags=3, ingredients=3,
+            stdout=StringIO()
+        )
+
+    def bench(self, **options):
+        out = StringIO()
+        call_command(
+            'bench', url=self.live_server_url, clients=1, duration=0.5,
+            stdout=out, **options
+        )
+        return out.getvalue()
+
+    def test_bench_writes_results(self):
+        """Test every operation is measured and saved as JSON"""
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+
+        self.bench(output=path)
+
+        with open(path) as source:
+            results = json.load(source)
+        self.assertLessEqual(set(results['endpoints']), set(OPERATIONS))
+        total = results['total']
+        self.assertGreater(total['requests'], 0)
+        self.assertEqual(total['errors'], 0)
+        self.assertLessEqual(total['p50'], total['p99'])
+
+        report = self.bench(weights='list=1', compare=path)
+
+        self.assertIn('req/s', report)
+        self.assertRegex(report, r'list .* p95 [+-]')
+
+    def test_unknown_operation(self):
+        """Test unknown operations in --weights are rejected"""
+        with self.assertRaises(CommandError):
+            self.bench(weights='delete=1')
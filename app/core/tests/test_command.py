@@ -1,9 +1,17 @@
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
-from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
 from django.db import OperationalError
 from django.test import TestCase
 
+from core.models import Recipe, Tag, Ingredient, RecipeStats
+from recipe.bulk import get_or_create_by_name
+
 
 class CommandTests(TestCase):
 
@@ -25,3 +33,183 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+    def test_export_recipes(self):
+        """Test exporting a user's recipes as NDJSON to stdout"""
+        user = get_user_model().objects.create_user('user@hosseindev.ir')
+        Recipe.objects.create(
+            user=user, title='Toast', time_minutes=2, price=1.50
+        )
+        out = StringIO()
+
+        call_command('export_recipes', user.email, stdout=out)
+
+        recipe = json.loads(out.getvalue())
+        self.assertEqual(recipe['title'], 'Toast')
+        self.assertEqual(recipe['price'], '1.50')
+
+    def test_export_recipes_unknown_user(self):
+        """Test exporting for an unknown email fails"""
+        with self.assertRaises(CommandError):
+            call_command('export_recipes', 'nobody@hosseindev.ir')
+
+    def _import_file(self, suffix, content, *args):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as source:
+            source.write(content)
+        call_command(
+            'import_recipes', 'user@hosseindev.ir', path, *args,
+            stdout=StringIO()
+        )
+
+    def test_import_recipes_ndjson(self):
+        """Test importing NDJSON reuses and creates tags by name"""
+        user = get_user_model().objects.create_user('user@hosseindev.ir')
+        vegan = Tag.objects.create(user=user, name='Vegan')
+        lines = [
+            {'title': 'Tofu curry', 'time_minutes': 30, 'price': '7.50',
+             'tags': ['vegan', 'Dinner'], 'ingredients': ['Tofu']},
+            {'title': 'Toast', 'time_minutes': 2, 'price': 1,
+             'tags': ['Dinner']},
+        ]
+
+        self._import_file(
+            '.ndjson', ''.join(json.dumps(line) + '\n' for line in lines),
+            '--transaction-size', '1'
+        )
+
+        recipes = Recipe.objects.filter(user=user).order_by('id')
+        self.assertEqual(recipes.count(), 2)
+        self.assertEqual(str(recipes[0].price), '7.50')
+        self.assertIn(vegan, recipes[0].tags.all())
+        self.assertEqual(Tag.objects.filter(user=user).count(), 2)
+        self.assertEqual(recipes[1].tags.get().name, 'Dinner')
+        self.assertEqual(recipes[0].ingredients.get().name, 'Tofu')
+
+    def test_import_recipes_csv(self):
+        """Test importing CSV splits tag and ingredient names"""
+        user = get_user_model().objects.create_user('user@hosseindev.ir')
+        content = (
+            'id,title,time_minutes,price,link,tags,ingredients\n'
+            '9,Rice bowl,15,4.00,,,Rice|Egg\n'
+        )
+
+        self._import_file('.csv', content)
+
+        recipe = Recipe.objects.get(user=user)
+        self.assertEqual(recipe.title, 'Rice bowl')
+        self.assertEqual(recipe.tags.count(), 0)
+        self.assertEqual(
+            set(recipe.ingredients.values_list('name', flat=True)),
+            {'Rice', 'Egg'}
+        )
+        self.assertEqual(Ingredient.objects.filter(user=user).count(), 2)
+
+    def test_import_recipes_invalid_row(self):
+        """Test an invalid row aborts the import"""
+        get_user_model().objects.create_user('user@hosseindev.ir')
+
+        with self.assertRaises(CommandError):
+            self._import_file('.ndjson', '{"title": "No time"}\n')
+
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_import_recipes_validated_like_api(self):
+        """Test rows break the REST field rules with their row number"""
+        get_user_model().objects.create_user('user@hosseindev.ir')
+        valid = {'title': 'Toast', 'time_minutes': 2, 'price': '1.00'}
+        cases = (
+            ({'title': 'x' * 256}, 'title'),
+            ({'price': '1' * 10}, 'price'),
+            ({'time_minutes': -1}, 'time_minutes'),
+        )
+        for change, field in cases:
+            content = json.dumps(valid) + '\n' + \
+                json.dumps({**valid, **change}) + '\n'
+            with self.subTest(field=field):
+                with self.assertRaisesRegex(CommandError,
+                                            f'^Row 2: {field}: '):
+                    self._import_file('.ndjson', content)
+
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_import_recipes_names_resolved_per_batch(self):
+        """Test the new names of a batch are created together"""
+        user = get_user_model().objects.create_user('user@hosseindev.ir')
+        lines = [
+            {'title': f'Recipe {number}', 'time_minutes': 5, 'price': 1,
+             'tags': [f'Tag {number}', 'shared'],
+             'ingredients': [f'Ingredient {number}', ' ']}
+            for number in range(4)
+        ]
+
+        with patch('core.management.commands.import_recipes.'
+                   'get_or_create_by_name',
+                   wraps=get_or_create_by_name) as resolve:
+            self._import_file(
+                '.ndjson', ''.join(json.dumps(line) + '\n' for line in lines)
+            )
+
+        self.assertEqual(resolve.call_count, 2)
+        self.assertEqual(Tag.objects.filter(user=user).count(), 5)
+        self.assertEqual(Ingredient.objects.filter(user=user).count(), 4)
+        recipe = Recipe.objects.get(user=user, title='Recipe 3')
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {'Tag 3', 'shared'}
+        )
+        self.assertEqual(recipe.ingredients.get().name, 'Ingredient 3')
+
+    def test_rebuild_recipe_stats(self):
+        """Test rebuilding recipe statistics reports repaired users"""
+        user = get_user_model().objects.create_user('user@hosseindev.ir')
+        Recipe.objects.create(
+            user=user, title='Toast', time_minutes=2, price=1.50
+        )
+        RecipeStats.objects.update(recipe_count=5)
+        out = StringIO()
+
+        call_command('rebuild_recipe_stats', stdout=out)
+
+        self.assertIn('1 had drifted', out.getvalue())
+        self.assertEqual(
+            RecipeStats.objects.get(user=user).recipe_count, 1
+        )
+
+    def test_seed_benchmark(self):
+        """Test benchmark users are seeded with consistent statistics"""
+        out = StringIO()
+
+        call_command(
+            'seed_benchmark', users=3, recipes=10, distribution='skewed',
+            tags=5, ingredients=5, stdout=out
+        )
+
+        users = get_user_model().objects.filter(
+            email__endswith='@bench.localhost'
+        )
+        self.assertEqual(users.count(), 3)
+        self.assertTrue(users[0].check_password('benchmark'))
+        self.assertEqual(Recipe.objects.count(), 30)
+        self.assertEqual(
+            sum(RecipeStats.objects.values_list('recipe_count', flat=True)),
+            30
+        )
+        self.assertTrue(Tag.objects.filter(recipe_count__gt=0).exists())
+        out = StringIO()
+        call_command('rebuild_recipe_stats', stdout=out)
+        self.assertIn('0 had drifted', out.getvalue())
+
+    def test_seed_benchmark_existing(self):
+        """Test seeding again needs --clear"""
+        call_command('seed_benchmark', users=1, recipes=2, stdout=StringIO())
+
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark', users=1, stdout=StringIO())
+
+        call_command(
+            'seed_benchmark', users=2, recipes=2, clear=True,
+            stdout=StringIO()
+        )
+        self.assertEqual(Recipe.objects.count(), 4)
@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.benchmark import seed_collection
+from core.models import Recipe
+from recipe.views import RecipeApiViewSet, TagViewSet, IngredientViewSet
+
+User = get_user_model()
+
+
+def view_queryset(viewset, user, **params):
+    """Return the queryset viewset lists for user with query params"""
+    request = APIRequestFactory().get('/', params)
+    force_authenticate(request, user)
+    view = viewset(action='list', format_kwarg=None)
+    view.request = Request(request)
+    return view.get_queryset()
+
+
+class QueryPlanTests(TestCase):
+    """Test the hot per-user queries are answered from matching indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [
+            User.objects.create_user(f'user{i}@hosseindev.ir', 'pass')
+            for i in range(4)
+        ]
+        for seed, user in enumerate(users):
+            seed_collection(user, 100, tags=20, ingredients=40, seed=seed)
+        cls.user = users[1]
+        cls.tag_id = cls.user.tag_set.order_by('id').first().id
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Test tables are small enough for scans and sorts to win
+            # anyway; make them unattractive so the plan shows whether an
+            # index can produce the rows in order
+            with connection.cursor() as cursor:
+                for setting in ('seqscan', 'bitmapscan', 'sort'):
+                    cursor.execute(f'SET LOCAL enable_{setting} = off')
+
+    def assertUsesIndex(self, queryset, index):
+        """Assert queryset reads index and needs no sort of its own"""
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+        if connection.vendor == 'postgresql':
+            self.assertNotIn('Sort', plan)
+        elif connection.vendor == 'sqlite':
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_recipe_list(self):
+        """Test recipes are listed from the (user, -id) index"""
+        queryset = view_queryset(RecipeApiViewSet, self.user)
+
+        self.assertUsesIndex(queryset, 'core_recipe_user_id_desc')
+        self.assertUsesIndex(queryset[:50], 'core_recipe_user_id_desc')
+
+    def test_tag_list(self):
+        """Test tags are listed from the (user, -name) index"""
+        queryset = view_queryset(TagViewSet, self.user)
+
+        self.assertUsesIndex(queryset, 'core_tag_user_name_desc')
+
+    def test_ingredient_list(self):
+        """Test ingredients are listed from the (user, -name) index"""
+        queryset = view_queryset(IngredientViewSet, self.user)
+
+        self.assertUsesIndex(queryset, 'core_ingredient_user_name_desc')
+
+    def test_recipes_of_a_tag(self):
+        """Test the recipes linked to a tag are read from its index"""
+        queryset = Recipe.tags.through.objects \
+            .filter(tag_id=self.tag_id) \
+            .values_list('recipe_id', flat=True)
+
+        self.assertUsesIndex(queryset, 'core_recipe_tags_tag_recipe')
+
+    def test_recipes_of_an_ingredient(self):
+        """Test the recipes using an ingredient are read from its index"""
+        ingredient_id = self.user.ingredient_set.order_by('id').first().id
+        queryset = Recipe.ingredients.through.objects \
+            .filter(ingredient_id=ingredient_id) \
+            .values_list('recipe_id', flat=True)
+
+        self.assertUsesIndex(
+            queryset, 'core_recipe_ingredients_ingredient_recipe'
+        )
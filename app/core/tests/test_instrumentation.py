@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.instrumentation import SQLInstrumentationMiddleware
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+@override_settings(SQL_INSTRUMENTATION=True)
+class SQLInstrumentationTests(TestCase):
+    """Test the per-request SQL instrumentation middleware"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@hosseindev.ir', 'pass'
+        )
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(
+            user=self.user, title='Toast', time_minutes=2, price=1
+        )
+
+    def get(self, url):
+        """GET url, returning the response and the lines logged"""
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            res = self.client.get(url)
+        return res, logs
+
+    def test_headers(self):
+        """Test responses report their queries and phases"""
+        with self.assertNumQueries(4) as queries:
+            res, _ = self.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Query-Count'], str(len(queries)))
+        timing = res['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        self.assertIn('desc="4 queries"', timing)
+        for name in ('serialize', 'render', 'total'):
+            self.assertIn(f'{name};dur=', timing)
+
+    def test_log_line(self):
+        """Test one line is logged per request"""
+        _, logs = self.get(RECIPES_URL)
+
+        self.assertEqual(len(logs.records), 1)
+        fields = logs.records[0].request_metrics
+        self.assertEqual(fields['view'], 'recipe:recipe-list')
+        self.assertEqual(fields['status'], 200)
+        self.assertEqual(fields['queries'], 4)
+        self.assertIn('view=recipe:recipe-list', logs.output[0])
+
+    def test_streamed_queries_logged(self):
+        """Test queries run while streaming are logged once it is sent"""
+        with self.assertLogs('core.instrumentation', 'INFO') as logs:
+            res = self.client.get(EXPORT_URL)
+            self.assertEqual(res['X-Query-Count'], '0')
+            with self.assertNumQueries(3) as queries:
+                b''.join(res.streaming_content)
+
+        self.assertEqual(len(logs.records), 1)
+        fields = logs.records[0].request_metrics
+        self.assertEqual(fields['queries'], len(queries))
+        self.assertIn('stream_ms', fields)
+
+    @override_settings(SQL_INSTRUMENTATION=False)
+    def test_disabled(self):
+        """Test the middleware is left out unless enabled"""
+        with self.assertRaises(MiddlewareNotUsed):
+            SQLInstrumentationMiddleware(lambda request: None)
+
+        res = APIClient().get(reverse('user:create'))
+
+        self.assertNotIn('Server-Timing', res)
+        self.assertNotIn('X-Query-Count', res)
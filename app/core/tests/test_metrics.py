@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import metrics
+
+METRICS_URL = reverse('metrics')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class MetricsTests(TestCase):
+    """Test the /metrics endpoint and the middleware feeding it"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(METRICS={
+            'ENABLED': True,
+            'DIRECTORY': self.directory,
+            'FLUSH_INTERVAL': 0,
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        metrics.registry._reset()
+        self.addCleanup(metrics.registry._reset)
+
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user('user@hosseindev.ir', 'p')
+        )
+
+    def scrape(self):
+        res = self.client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        return res.content.decode().splitlines()
+
+    def write_process(self, pid, data, started=1):
+        path = os.path.join(self.directory, f'{pid}-{started}.json')
+        with open(path, 'w') as target:
+            json.dump(data, target)
+
+    def test_requests_counted_per_view(self):
+        """Test requests, queries and latency are reported per view"""
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        lines = self.scrape()
+
+        self.assertIn('# TYPE http_requests_total counter', lines)
+        self.assertIn('# TYPE process_cpu_seconds_total counter', lines)
+        self.assertIn(
+            'http_requests_total{method="GET",status="200",'
+            'view="recipe:recipe-list"} 2.0',
+            lines
+        )
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",'
+            'view="recipe:recipe-list"} 2',
+            lines
+        )
+        self.assertIn(
+            'http_request_duration_seconds_bucket{method="GET",'
+            'view="recipe:recipe-list",le="+Inf"} 2',
+            lines
+        )
+        self.assertTrue(any(
+            line.startswith('db_queries_total{view="recipe:recipe-list"}')
+            for line in lines
+        ))
+
+    def test_errors_counted(self):
+        """Test 5xx responses count as errors"""
+        middleware = metrics.MetricsMiddleware(
+            lambda request: HttpResponse(status=500)
+        )
+        middleware(RequestFactory().get('/nowhere'))
+
+        self.assertIn(
+            'http_request_errors_total{view="<unresolved>"} 1.0',
+            self.scrape()
+        )
+
+    def test_processes_summed(self):
+        """Test counters of other processes, even exited ones, are summed"""
+        buckets = [0] * (len(metrics.BUCKETS) + 1)
+        buckets[0] = 3
+        self.write_process(2 ** 22 + 1, {
+            'counters': [['http_requests_total', [['view', 'v']], 3]],
+            'histograms': [[
+                'http_request_duration_seconds', [['view', 'v']],
+                buckets + [0.01],
+            ]],
+            'gauges': [['process_open_fds', [], 7]],
+        })
+        metrics.registry.inc('http_requests_total', {'view': 'v'}, 2)
+        metrics.registry.observe(
+            'http_request_duration_seconds', {'view': 'v'}, 0.001
+        )
+
+        lines = self.scrape()
+
+        self.assertIn('http_requests_total{view="v"} 5.0', lines)
+        self.assertIn(
+            'http_request_duration_seconds_bucket{view="v",le="0.005"} 4',
+            lines
+        )
+        self.assertIn('http_request_duration_seconds_count{view="v"} 4', lines)
+        # Gauges are only reported for live processes
+        self.assertNotIn(f'process_open_fds{{pid="{2 ** 22 + 1}"}} 7', lines)
+        self.assertTrue(any(
+            line.startswith(f'process_open_fds{{pid="{os.getpid()}"}}')
+            for line in lines
+        ))
+
+    def test_exited_processes_folded(self):
+        """Test files of exited processes and reused pids are merged once"""
+        counters = {
+            'counters': [['http_requests_total', [['view', 'v']], 1]],
+            'histograms': [],
+            'gauges': [],
+        }
+        self.write_process(2 ** 22 + 1, counters)
+        self.write_process(2 ** 22 + 2, counters)
+        # Written by an earlier process with the pid of this one
+        self.write_process(os.getpid(), counters)
+        metrics.registry.inc('http_requests_total', {'view': 'v'})
+
+        for _ in range(2):
+            self.assertIn('http_requests_total{view="v"} 4.0', self.scrape())
+
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            ['.fold.lock',
+             f'{os.getpid()}-{int(metrics.registry.started * 1000000)}.json',
+             metrics.EXITED_FILE]
+        )
+
+    def test_cache_counters(self):
+        """Test cache hits and misses are exported"""
+        lines = self.scrape()
+
+        for cache in ('response', 'token'):
+            self.assertTrue(any(
+                line.startswith(f'cache_hits_total{{cache="{cache}"}}')
+                for line in lines
+            ))
+
+    def test_label_escaping(self):
+        """Test label values are escaped"""
+        metrics.registry.inc('http_requests_total', {'view': 'a"b\\c\nd'})
+
+        self.assertIn(
+            r'http_requests_total{view="a\"b\\c\nd"} 1.0', self.scrape()
+        )
+
+    def test_disabled(self):
+        """Test metrics are neither collected nor served unless enabled"""
+        with override_settings(METRICS={'ENABLED': False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                metrics.MetricsMiddleware(lambda request: None)
+            res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
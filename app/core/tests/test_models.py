@@ -58,6 +58,26 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(tag), tag.name)
 
+    def test_tag_normalized_name(self):
+        """Test tags store a case and whitespace insensitive name"""
+        tag = models.Tag.objects.create(
+            user=sample_user(),
+            name='  Comfort   FOOD ',
+        )
+
+        self.assertEqual(tag.normalized_name, 'comfort food')
+
+    def test_normalized_name_saved_with_update_fields(self):
+        """Test saving only the name also stores its normalized form"""
+        user = sample_user()
+        for model in (models.Tag, models.Ingredient):
+            obj = model.objects.create(user=user, name='Salt')
+            obj.name = 'Sea  SALT'
+            obj.save(update_fields=['name'])
+
+            obj.refresh_from_db()
+            self.assertEqual(obj.normalized_name, 'sea salt')
+
     def test_ingredients_str(self):
         """Test the ingredient string representation"""
 
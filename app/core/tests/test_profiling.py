@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command, CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.profiling import ProfilingMiddleware, make_token
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class ProfilingTests(TestCase):
+    """Test sampled request profiling and its report command"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user('user@hosseindev.ir', 'p')
+        )
+
+    def profiling(self, **options):
+        """Enable profiling into the test directory
+
+        The client loads its middleware on its first request, so this must
+        be called before any.
+        """
+        options = {
+            'ENABLED': True,
+            'SAMPLE_RATE': 1,
+            'DIRECTORY': self.directory,
+            **options,
+        }
+        settings = override_settings(PROFILING=options)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def dumps(self, view):
+        directory = os.path.join(self.directory, view)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.listdir(directory))
+
+    def test_sampled_request_dumped_per_view(self):
+        """Test sampled requests are dumped under their view name"""
+        self.profiling()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(self.dumps('recipe_recipe-list'), [res['X-Profile']])
+
+    def test_paths_outside_api_not_profiled(self):
+        """Test only the configured paths are profiled"""
+        self.profiling(PATHS=('/api/user/',))
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('X-Profile', res)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_signed_header_forces_profile(self):
+        """Test a signed X-Profile header profiles a request"""
+        self.profiling(SAMPLE_RATE=0)
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE='forged')
+        self.assertNotIn('X-Profile', res)
+
+        res = self.client.get(RECIPES_URL, HTTP_X_PROFILE=make_token())
+        self.assertIn('X-Profile', res)
+
+    def test_oldest_dumps_rotated_out(self):
+        """Test only the newest MAX_FILES dumps of a view are kept"""
+        self.profiling(MAX_FILES=2)
+
+        names = [self.client.get(RECIPES_URL)['X-Profile'] for _ in range(3)]
+
+        self.assertEqual(self.dumps('recipe_recipe-list'), names[1:])
+
+    def test_disabled(self):
+        """Test the middleware is left out unless enabled"""
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+
+    def test_profile_report(self):
+        """Test dumps are aggregated into a report per view"""
+        self.profiling()
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+        out = StringIO()
+
+        call_command(
+            'profile_report', directory=self.directory, limit=5, stdout=out
+        )
+
+        report = out.getvalue()
+        self.assertIn('== recipe_recipe-list: 2 requests', report)
+        self.assertIn('cumulative', report)
+
+    def test_profile_report_empty(self):
+        """Test reporting without profiles fails"""
+        with self.assertRaises(CommandError):
+            call_command('profile_report', directory=self.directory)
@@ -0,0 +1,276 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, RequestFactory, override_settings
+
+from core.models import Recipe, RecipeImageVariant
+from core.storage import ContentAddressedStorage, image_storage, release, \
+    is_sharded
+from core.views import serve_media, media_urlpatterns, \
+    IMMUTABLE_CACHE_CONTROL
+
+
+class StorageTestCase(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media = override_settings(
+            MEDIA_ROOT=self.media_root, IMAGE_STORAGE_DELETE_GRACE=0
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class ContentAddressedStorageTests(StorageTestCase):
+    """Test storing files under the digest of their content"""
+
+    def test_name_is_content_digest(self):
+        """Test the stored name is the SHA-256 of the content"""
+        name = ContentAddressedStorage().save(
+            'uploads/recipe/photo.JPG', ContentFile(b'image')
+        )
+
+        digest = hashlib.sha256(b'image').hexdigest()
+        self.assertEqual(
+            name, f'uploads/recipe/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        )
+        self.assertTrue(is_sharded(name))
+
+    def test_identical_content_stored_once(self):
+        """Test uploading the same content twice shares one file"""
+        storage = ContentAddressedStorage()
+        first = storage.save('uploads/recipe/a.jpg', ContentFile(b'same'))
+        second = storage.save('uploads/recipe/b.jpg', ContentFile(b'same'))
+        other = storage.save('uploads/recipe/c.jpg', ContentFile(b'other'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        stored = [
+            name
+            for _, _, names in os.walk(storage.path('uploads/recipe'))
+            for name in names
+        ]
+        self.assertEqual(
+            sorted(stored),
+            sorted([os.path.basename(first), os.path.basename(other)])
+        )
+
+
+class ReleaseTests(StorageTestCase):
+    """Test deleting stored images once nothing refers to them"""
+
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_user('user@hosseindev.ir')
+        self.name = image_storage.save(
+            'uploads/recipe/a.jpg', ContentFile(b'shared')
+        )
+        self.recipes = [
+            Recipe.objects.create(
+                user=user, title=f'Recipe {i}', time_minutes=5, price=1,
+                image=self.name
+            )
+            for i in range(2)
+        ]
+
+    def test_referenced_file_kept(self):
+        """Test a file still used by another recipe is not deleted"""
+        self.recipes[0].image = None
+        self.recipes[0].save()
+
+        self.assertEqual(release([self.name]), [])
+        self.assertTrue(image_storage.exists(self.name))
+
+    def test_unreferenced_file_deleted(self):
+        """Test the file goes away with its last reference"""
+        Recipe.objects.update(image=None)
+
+        self.assertEqual(release([self.name]), [self.name])
+        self.assertFalse(image_storage.exists(self.name))
+
+    @override_settings(IMAGE_STORAGE_DELETE_GRACE=3600)
+    def test_recent_file_kept(self):
+        """Test files written within the grace period are kept"""
+        Recipe.objects.update(image=None)
+
+        self.assertEqual(release([self.name]), [])
+        self.assertTrue(image_storage.exists(self.name))
+
+
+class SweepImagesCommandTests(StorageTestCase):
+    """Test deleting unreferenced images left behind by release()"""
+
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_user('user@hosseindev.ir')
+        self.used = image_storage.save(
+            'uploads/recipe/a.jpg', ContentFile(b'used')
+        )
+        Recipe.objects.create(
+            user=user, title='Curry', time_minutes=5, price=1,
+            image=self.used
+        )
+        self.unused = image_storage.save(
+            'uploads/recipe/b.jpg', ContentFile(b'unused')
+        )
+
+    @override_settings(IMAGE_STORAGE_DELETE_GRACE=3600)
+    def test_recent_release_swept_later(self):
+        """Test a file too recent for release() goes with a later sweep"""
+        release([self.unused])
+        self.assertTrue(image_storage.exists(self.unused))
+
+        out = StringIO()
+        with override_settings(IMAGE_STORAGE_DELETE_GRACE=0):
+            call_command('sweep_images', batch_size=1, stdout=out)
+
+        self.assertFalse(image_storage.exists(self.unused))
+        self.assertTrue(image_storage.exists(self.used))
+        self.assertIn('2 files checked, 1 deleted', out.getvalue())
+
+    def test_recent_files_kept(self):
+        """Test a sweep also spares files within the grace period"""
+        with override_settings(IMAGE_STORAGE_DELETE_GRACE=3600):
+            call_command('sweep_images', stdout=StringIO())
+
+        self.assertTrue(image_storage.exists(self.unused))
+
+
+class ShardRecipeImagesCommandTests(StorageTestCase):
+    """Test moving flat stored images into the sharded layout"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(
+            'user@hosseindev.ir'
+        )
+
+    def flat_file(self, name, content):
+        """Store a file the way uploads were named before sharding"""
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as flat:
+            flat.write(content)
+        return name
+
+    def create_recipe(self, image):
+        return Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=5, price=1,
+            image=image
+        )
+
+    def test_images_moved(self):
+        """Test rows point to sharded copies and old files are removed"""
+        flat = self.flat_file('uploads/recipe/1234.jpg', b'one')
+        recipe = self.create_recipe(flat)
+        variant = RecipeImageVariant.objects.create(
+            recipe=recipe, name='thumbnail', width=1, height=1,
+            file=self.flat_file('uploads/recipe/variants/5678.jpg', b'two')
+        )
+        no_image = self.create_recipe(None)
+
+        call_command('shard_recipe_images', batch_size=1, stdout=StringIO())
+
+        recipe.refresh_from_db()
+        variant.refresh_from_db()
+        no_image.refresh_from_db()
+        self.assertTrue(is_sharded(recipe.image.name))
+        self.assertTrue(is_sharded(variant.file.name))
+        self.assertTrue(variant.file.name.startswith('uploads/recipe/var'))
+        self.assertTrue(image_storage.exists(recipe.image.name))
+        self.assertFalse(image_storage.exists(flat))
+        self.assertFalse(no_image.image)
+
+    def test_rerun_skips_moved_rows(self):
+        """Test running the command again leaves moved rows untouched"""
+        recipe = self.create_recipe(
+            self.flat_file('uploads/recipe/1234.jpg', b'one')
+        )
+        call_command('shard_recipe_images', stdout=StringIO())
+        recipe.refresh_from_db()
+        moved = recipe.image.name
+
+        out = StringIO()
+        call_command('shard_recipe_images', stdout=out)
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, moved)
+        self.assertIn('0 moved', out.getvalue())
+
+    def test_shared_flat_file_kept_until_all_moved(self):
+        """Test a file used by two rows survives until both are moved"""
+        flat = self.flat_file('uploads/recipe/1234.jpg', b'one')
+        first = self.create_recipe(flat)
+        second = self.create_recipe(flat)
+
+        call_command(
+            'shard_recipe_images', batch_size=1, recipe_start_id=first.id,
+            stdout=StringIO()
+        )
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.image.name, flat)
+        self.assertTrue(is_sharded(second.image.name))
+        self.assertTrue(image_storage.exists(flat))
+
+    def test_resume_per_model(self):
+        """Test resuming recipes past an id leaves variants from the start"""
+        recipe = self.create_recipe(
+            self.flat_file('uploads/recipe/1234.jpg', b'one')
+        )
+        variant = RecipeImageVariant.objects.create(
+            recipe=recipe, name='thumbnail', width=1, height=1,
+            file=self.flat_file('uploads/recipe/variants/5678.jpg', b'two')
+        )
+
+        out = StringIO()
+        call_command(
+            'shard_recipe_images', recipe_start_id=recipe.id, stdout=out
+        )
+
+        recipe.refresh_from_db()
+        variant.refresh_from_db()
+        self.assertFalse(is_sharded(recipe.image.name))
+        self.assertTrue(is_sharded(variant.file.name))
+        self.assertIn(
+            f'RecipeImageVariant: up to id {variant.id} '
+            f'(--variant-start-id {variant.id})',
+            out.getvalue()
+        )
+
+
+class ServeMediaTests(StorageTestCase):
+    """Test serving uploaded media"""
+
+    def test_immutable_cache_headers(self):
+        """Test media responses may be cached for a year"""
+        name = image_storage.save('uploads/recipe/a.jpg', ContentFile(b'x'))
+        request = RequestFactory().get(f'/media/{name}')
+
+        res = serve_media(request, name, document_root=self.media_root)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+    @override_settings(DEBUG=False, SERVE_MEDIA=True)
+    def test_served_without_debug_when_enabled(self):
+        """Test SERVE_MEDIA keeps the media route with DEBUG off"""
+        (pattern,) = media_urlpatterns()
+
+        match = pattern.resolve('media/uploads/recipe/a.jpg')
+
+        self.assertEqual(match.func, serve_media)
+        self.assertEqual(match.kwargs['path'], 'uploads/recipe/a.jpg')
+
+    @override_settings(DEBUG=False, SERVE_MEDIA=False)
+    def test_left_to_front_server_by_default(self):
+        """Test media is not routed through Django in production"""
+        self.assertEqual(media_urlpatterns(), [])
@@ -0,0 +1,51 @@
+import re
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.urls import re_path
+from django.views.static import serve
+
+from core import metrics
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """Serve uploaded media with year-long cache headers
+
+    Recipe images are named after their content, so the file behind a URL
+    never changes and clients may keep it for good.
+    """
+    response = serve(request, path, document_root, show_indexes)
+    if response.status_code == 200:
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def media_urlpatterns():
+    """Return the route serving MEDIA_ROOT through serve_media
+
+    Unlike ``static()`` this is also added with DEBUG off when SERVE_MEDIA
+    is set. Otherwise the server in front of Django serves the media and
+    has to send IMMUTABLE_CACHE_CONTROL itself, see SERVE_MEDIA.
+    """
+    if not (settings.DEBUG or settings.SERVE_MEDIA):
+        return []
+    prefix = re.escape(settings.MEDIA_URL.lstrip('/'))
+    return [
+        re_path(rf'^{prefix}(?P<path>.*)$', serve_media,
+                kwargs={'document_root': settings.MEDIA_ROOT}),
+    ]
+
+
+def metrics_view(request):
+    """Expose the counters of all worker processes to Prometheus"""
+    options = metrics.metrics_settings()
+    if not options['ENABLED']:
+        raise Http404
+    # Include this process's latest values whatever the flush interval
+    metrics.registry.flush(options['DIRECTORY'])
+    return HttpResponse(
+        metrics.render(options['DIRECTORY']),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
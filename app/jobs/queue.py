@@ -0,0 +1,175 @@
+import json
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import Job
+
+TASKS = {}
+
+
+def job_settings():
+    options = {
+        'VISIBILITY_TIMEOUT': 300,
+        'MAX_ATTEMPTS': 3,
+        'RETRY_DELAY': 10,
+    }
+    options.update(getattr(settings, 'JOBS', {}))
+    return options
+
+
+def task(name):
+    """Register the decorated function as the job ``name``
+
+    Tasks are called with the job payload as keyword arguments, and what
+    they return must be JSON serializable; it is stored as the result.
+    """
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, user=None, max_attempts=None):
+    """Store a job to be run by a worker once the transaction commits"""
+    if name not in TASKS:
+        raise ValueError(f'Unknown task: {name}')
+    return Job.objects.create(
+        name=name,
+        user=user,
+        payload=json.dumps(payload or {}, cls=DjangoJSONEncoder),
+        max_attempts=max_attempts or job_settings()['MAX_ATTEMPTS'],
+    )
+
+
+def claim(limit, visibility_timeout=None):
+    """Lease up to limit available jobs and return them
+
+    A job is available when it is queued, or running with an expired
+    lease. Each job is taken with a conditional UPDATE, so two workers
+    never run the same attempt even where SELECT ... FOR UPDATE SKIP
+    LOCKED is not supported. Expired jobs out of attempts, whose worker
+    crashed or hung on every try, are failed instead.
+    """
+    if visibility_timeout is None:
+        visibility_timeout = job_settings()['VISIBILITY_TIMEOUT']
+    now = timezone.now()
+    Job.objects \
+        .filter(
+            status=Job.RUNNING,
+            available_at__lte=now,
+            attempts__gte=F('max_attempts')
+        ) \
+        .update(
+            status=Job.FAILED,
+            lease='',
+            error='Lease expired on the last attempt',
+            updated_at=now,
+        )
+    candidates = Job.objects \
+        .filter(
+            status__in=(Job.QUEUED, Job.RUNNING),
+            available_at__lte=now
+        ) \
+        .order_by('available_at', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        # Rows another worker is leasing are skipped rather than waited on
+        with transaction.atomic():
+            return _lease(
+                candidates.select_for_update(skip_locked=True),
+                limit, now, visibility_timeout
+            )
+    # SQLite can't lock rows; a read transaction there would only make
+    # the UPDATEs fail while other workers write
+    return _lease(candidates, limit, now, visibility_timeout)
+
+
+def _lease(candidates, limit, now, visibility_timeout):
+    claimed = []
+    for job_id, attempts in list(
+            candidates.values_list('id', 'attempts')[:limit]):
+        lease = uuid.uuid4().hex
+        taken = Job.objects \
+            .filter(id=job_id, attempts=attempts) \
+            .update(
+                status=Job.RUNNING,
+                attempts=attempts + 1,
+                lease=lease,
+                available_at=now + timedelta(seconds=visibility_timeout),
+                updated_at=now,
+            )
+        if taken:
+            claimed.append((job_id, lease))
+    return claimed
+
+
+def run_job(job_id, lease):
+    """Run one leased job and record its outcome
+
+    Outcomes are only recorded while the lease is still ours: a job that
+    outlived its visibility timeout may have been leased again meanwhile.
+    Returns the job status.
+    """
+    job = Job.objects.get(id=job_id)
+    func = TASKS.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task: {job.name}')
+        result = func(**json.loads(job.payload))
+    except Exception:
+        status, available_at = _retry(job.attempts, job.max_attempts)
+        _finish(job_id, lease, status=status, error=traceback.format_exc(),
+                available_at=available_at)
+        return status
+
+    _finish(job_id, lease, status=Job.DONE, error='',
+            result=json.dumps(result, cls=DjangoJSONEncoder))
+    return Job.DONE
+
+
+def abandon(job_id, lease, error):
+    """Give back a leased job whose worker was lost, returning its status
+
+    The job is retried like a failed one rather than waiting for its
+    lease to expire. Returns None when the lease was no longer ours.
+    """
+    job = Job.objects \
+        .filter(id=job_id, lease=lease, status=Job.RUNNING) \
+        .only('attempts', 'max_attempts') \
+        .first()
+    if job is None:
+        return None
+    status, available_at = _retry(job.attempts, job.max_attempts)
+    if not _finish(job_id, lease, status=status, error=error,
+                   available_at=available_at):
+        return None
+    return status
+
+
+def _retry(attempts, max_attempts):
+    """Return the status and availability of a job after a failed try"""
+    if attempts < max_attempts:
+        delay = job_settings()['RETRY_DELAY'] * 2 ** (attempts - 1)
+        return Job.QUEUED, timezone.now() + timedelta(seconds=delay)
+    return Job.FAILED, timezone.now()
+
+
+def _finish(job_id, lease, **fields):
+    return Job.objects \
+        .filter(id=job_id, lease=lease, status=Job.RUNNING) \
+        .update(lease='', updated_at=timezone.now(), **fields)
+
+
+def run_in_process(job_id, lease):
+    """Entry point of pool processes, which own their connections"""
+    try:
+        return run_job(job_id, lease)
+    finally:
+        connections.close_all()
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Job
+
+JOBS_URL = reverse('jobs:job-list')
+
+
+def job_detail(job_id):
+    return reverse('jobs:job-detail', args=[job_id])
+
+
+class JobsApiTests(TestCase):
+    """Test the job status API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@hosseindev.ir', 'testpass'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_login_required(self):
+        """Test job status requires authentication"""
+        res = APIClient().get(JOBS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_retrieve_job_status(self):
+        """Test retrieving the status and result of a job"""
+        job = Job.objects.create(
+            user=self.user, name='tests.add', status=Job.DONE, result='3'
+        )
+
+        res = self.client.get(job_detail(job.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['status'], Job.DONE)
+        self.assertEqual(res.data['result'], 3)
+        self.assertNotIn('payload', res.data)
+
+    def test_jobs_limited_to_user(self):
+        """Test jobs of other users are not visible"""
+        other = get_user_model().objects.create_user('other@hosseindev.ir')
+        job = Job.objects.create(user=other, name='tests.add')
+        own = Job.objects.create(user=self.user, name='tests.add')
+
+        self.assertEqual(
+            self.client.get(job_detail(job.id)).status_code,
+            status.HTTP_404_NOT_FOUND
+        )
+        res = self.client.get(JOBS_URL)
+        self.assertEqual([item['id'] for item in res.data], [own.id])
@@ -0,0 +1,151 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import Job
+from jobs.queue import task, enqueue, claim, run_job
+
+
+@task('tests.add')
+def add(a, b):
+    return a + b
+
+
+@task('tests.fail')
+def fail():
+    raise RuntimeError('boom')
+
+
+class BreakingPool:
+    """Runs jobs inline, except the first pool which breaks at once
+
+    Stands in for the process pool, whose processes can't reach the test
+    database, to replay a pool process dying.
+    """
+    created = 0
+
+    def __init__(self, **kwargs):
+        BreakingPool.created += 1
+        self.broken = BreakingPool.created == 1
+
+    def submit(self, func, job_id, lease):
+        future = Future()
+        if self.broken:
+            future.set_exception(BrokenProcessPool('worker died'))
+        else:
+            future.set_result(run_job(job_id, lease))
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+@override_settings(JOBS={'RETRY_DELAY': 10, 'MAX_ATTEMPTS': 2})
+class JobQueueTests(TestCase):
+    """Test storing, leasing and running jobs"""
+
+    def test_enqueue_unknown_task(self):
+        """Test jobs can only be stored for registered tasks"""
+        with self.assertRaises(ValueError):
+            enqueue('tests.unknown')
+
+    def test_claim_leases_job_once(self):
+        """Test a leased job is not handed to another worker"""
+        job = enqueue('tests.add', {'a': 1, 'b': 2})
+
+        leased = claim(10)
+
+        self.assertEqual([job_id for job_id, _ in leased], [job.id])
+        self.assertEqual(claim(10), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.attempts, 1)
+
+    def test_run_job_records_result(self):
+        """Test a successful job stores what the task returned"""
+        job = enqueue('tests.add', {'a': 1, 'b': 2})
+        (job_id, lease), = claim(1)
+
+        self.assertEqual(run_job(job_id, lease), Job.DONE)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.result, '3')
+
+    def test_failed_job_retried_then_failed(self):
+        """Test failures are retried later until attempts run out"""
+        job = enqueue('tests.fail')
+
+        self.assertEqual(run_job(*claim(1)[0]), Job.QUEUED)
+        job.refresh_from_db()
+        self.assertIn('RuntimeError: boom', job.error)
+        self.assertGreater(job.available_at, timezone.now())
+        self.assertEqual(claim(1), [])
+
+        Job.objects.update(available_at=timezone.now())
+        self.assertEqual(run_job(*claim(1)[0]), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+
+    def test_expired_lease_released(self):
+        """Test a job whose worker vanished is leased again"""
+        job = enqueue('tests.add', {'a': 1, 'b': 2})
+        (_, stale_lease), = claim(1)
+        Job.objects.update(available_at=timezone.now() - timedelta(1))
+
+        (_, lease), = claim(1)
+        run_job(job.id, stale_lease)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.lease, lease)
+        self.assertEqual(job.attempts, 2)
+
+    def test_run_jobs_command(self):
+        """Test the worker runs every available job and exits"""
+        jobs = [enqueue('tests.add', {'a': i, 'b': i}) for i in range(3)]
+        out = StringIO()
+
+        call_command('run_jobs', concurrency=0, burst=True, stdout=out)
+
+        self.assertIn('Processed 3 jobs', out.getvalue())
+        for i, job in enumerate(jobs):
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.DONE)
+            self.assertEqual(job.result, str(i * 2))
+
+    def test_expired_last_attempt_failed(self):
+        """Test a job that never finished its last attempt is not retried"""
+        job = enqueue('tests.add', {'a': 1, 'b': 2}, max_attempts=1)
+        claim(1)
+        Job.objects.update(available_at=timezone.now() - timedelta(1))
+
+        self.assertEqual(claim(1), [])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('Lease expired', job.error)
+
+    @override_settings(JOBS={'RETRY_DELAY': 0, 'MAX_ATTEMPTS': 2})
+    @patch('core.management.commands.run_jobs.ProcessPoolExecutor',
+           BreakingPool)
+    def test_run_jobs_recovers_broken_pool(self):
+        """Test jobs of a dead pool process are retried in a new pool"""
+        BreakingPool.created = 0
+        job = enqueue('tests.add', {'a': 1, 'b': 2})
+        out = StringIO()
+
+        call_command('run_jobs', concurrency=2, burst=True, stdout=out)
+
+        self.assertEqual(BreakingPool.created, 2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('Processed 2 jobs', out.getvalue())
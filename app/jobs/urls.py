@@ -0,0 +1,12 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from jobs import views
+
+app_name = 'jobs'
+router = DefaultRouter()
+
+router.register('', views.JobViewSet)
+
+urlpatterns = [
+    path('', include(router.urls))
+]
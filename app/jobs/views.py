@@ -0,0 +1,27 @@
+from rest_framework import viewsets, mixins
+from rest_framework.permissions import IsAuthenticated
+
+from core.authentication import CachedTokenAuthentication
+from core.instrumentation import ServerTimingMixin
+from core.models import Job
+from core.pagination import KeysetPagination
+from jobs.serializers import JobSerializer
+
+
+class JobViewSet(
+    ServerTimingMixin,
+    viewsets.GenericViewSet,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin
+):
+    """Report the status of the authenticated user's background jobs"""
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return self.queryset \
+            .filter(user=self.request.user) \
+            .order_by('-id')
@@ -0,0 +1,150 @@
+from collections import Counter
+
+from django.db import connections, transaction, IntegrityError
+
+from core.models import Recipe, Tag, Ingredient, RecipeImageVariant, \
+    RecipeLinkChange, RecipeStats, normalize_name
+from recipe.stats import recipe_values, recipes_changed, relations_changed
+from recipe.versions import bump_version
+
+BATCH_SIZE = 1000
+
+
+def insert_recipes(recipes, batch_size=BATCH_SIZE, using='default'):
+    """Insert Recipe instances and make sure each one gets its id
+
+    Databases that can't return ids from a multi-row INSERT fall back to
+    saving recipes one by one, which counts them in the statistics through
+    signals.
+    """
+    if connections[using].features.can_return_ids_from_bulk_insert:
+        Recipe.objects.using(using).bulk_create(recipes, batch_size)
+        added = {}
+        for recipe in recipes:
+            added.setdefault(recipe.user_id, []).append(recipe_values(recipe))
+        for user_id, values in added.items():
+            recipes_changed(user_id, added=values)
+    else:
+        for recipe in recipes:
+            recipe.save(using=using)
+    return recipes
+
+
+def insert_relations(pairs, batch_size=BATCH_SIZE, using='default'):
+    """Insert (recipe, tag ids, ingredient ids) links as through rows"""
+    tag_rows = []
+    ingredient_rows = []
+    for recipe, tag_ids, ingredient_ids in pairs:
+        for tag_id in dict.fromkeys(tag_ids):
+            tag_rows.append(
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            )
+        for ingredient_id in dict.fromkeys(ingredient_ids):
+            ingredient_rows.append(Recipe.ingredients.through(
+                recipe_id=recipe.id, ingredient_id=ingredient_id
+            ))
+
+    Recipe.tags.through.objects.using(using) \
+        .bulk_create(tag_rows, batch_size)
+    Recipe.ingredients.through.objects.using(using) \
+        .bulk_create(ingredient_rows, batch_size)
+
+
+def bulk_create_recipes(user, items, batch_size=BATCH_SIZE, using='default'):
+    """Create recipes of user with their tags and ingredients in bulk
+
+    ``items`` are dicts of Recipe fields plus ``tags`` and ``ingredients``
+    lists of ids already known to belong to the user. Must run inside a
+    transaction; bulk inserts send no signals, so the user's collection
+    version and recipe statistics are updated once at the end.
+    """
+    recipes = []
+    relations = []
+    for item in items:
+        item = dict(item)
+        tag_ids = item.pop('tags', ())
+        ingredient_ids = item.pop('ingredients', ())
+        recipe = Recipe(user=user, **item)
+        recipes.append(recipe)
+        relations.append((recipe, tag_ids, ingredient_ids))
+
+    insert_recipes(recipes, batch_size, using)
+    insert_relations(relations, batch_size, using)
+    bump_version(user.id)
+
+    tag_counts = Counter()
+    ingredient_counts = Counter()
+    for recipe, tag_ids, ingredient_ids in relations:
+        tag_counts.update(dict.fromkeys(tag_ids, 1))
+        ingredient_counts.update(dict.fromkeys(ingredient_ids, 1))
+    relations_changed(Tag, tag_counts)
+    relations_changed(Ingredient, ingredient_counts)
+    return recipes
+
+
+def delete_collections(user_ids):
+    """Delete every recipe, tag and ingredient of users in bulk
+
+    Deleting rows one by one sends the signals keeping statistics, recipe
+    counts and versions in sync, a few queries per recipe. Once whole
+    collections go there is nothing left to keep in sync, so each table
+    is emptied with one DELETE instead. Stored image files are left to
+    `manage.py sweep_images`.
+    """
+    user_ids = list(user_ids)
+    with transaction.atomic():
+        recipes = Recipe.objects.filter(user_id__in=user_ids)
+        for model in (Recipe.tags.through, Recipe.ingredients.through,
+                      RecipeImageVariant):
+            model.objects.filter(recipe__in=recipes).delete()
+        for model in (Recipe, Tag, Ingredient):
+            # Nothing refers to them any more; skip the signals
+            model.objects.filter(user_id__in=user_ids)._raw_delete('default')
+        RecipeStats.objects.filter(user_id__in=user_ids).delete()
+        RecipeLinkChange.objects.filter(user_id__in=user_ids).delete()
+        for user_id in user_ids:
+            bump_version(user_id)
+
+
+def get_or_create_by_name(model, user, names):
+    """Return (id, name) of the user's model rows for names, in order
+
+    Names are matched on their normalized form, so "Vegan" and " vegan"
+    resolve to the same row. Missing rows are created with one bulk
+    insert; if a concurrent request inserted some of them first, the
+    conflicting rows are simply read back.
+    """
+    keys = [normalize_name(name) for name in names]
+    wanted = {}
+    for key, name in zip(keys, names):
+        wanted.setdefault(key, name.strip())
+
+    found = _rows_by_key(model, user, wanted)
+    missing = [
+        model(user=user, name=wanted[key], normalized_name=key)
+        for key in wanted if key not in found
+    ]
+    if missing:
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(missing)
+        except IntegrityError:
+            for obj in missing:
+                try:
+                    with transaction.atomic():
+                        obj.save()
+                except IntegrityError:
+                    pass
+        found.update(
+            _rows_by_key(model, user, [obj.normalized_name for obj in missing])
+        )
+        bump_version(user.id, links=False)
+
+    return [found[key] for key in keys]
+
+
+def _rows_by_key(model, user, keys):
+    rows = model.objects \
+        .filter(user=user, normalized_name__in=list(keys)) \
+        .values_list('normalized_name', 'id', 'name')
+    return {key: (pk, name) for key, pk, name in rows}
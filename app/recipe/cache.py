@@ -0,0 +1,173 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LocalLRUBackend:
+    """In-process cache evicting the least recently used entries
+
+    Evicts once either ``max_entries`` or the approximate total ``max_size``
+    in bytes is exceeded.
+    """
+
+    def __init__(self, max_entries=1024, max_size=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size=0):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._data[key] = (value, size)
+            self.size += size
+            while len(self._data) > self.max_entries or \
+                    self.size > self.max_size:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+class SharedBackend:
+    """Cache shared between workers through a Django cache alias"""
+
+    def __init__(self, alias='default', timeout=300, **limits):
+        # Entry and size limits are left to the cache behind the alias
+        self.alias = alias
+        self.timeout = timeout
+
+    def get(self, key):
+        return caches[self.alias].get(key)
+
+    def set(self, key, value, size=0):
+        caches[self.alias].set(key, value, self.timeout)
+
+    def clear(self):
+        caches[self.alias].clear()
+
+
+BACKENDS = {
+    'local': LocalLRUBackend,
+    'shared': SharedBackend,
+}
+
+
+class ResponseCache:
+    """Per-user cache of serialized list responses
+
+    Entries are keyed on the user, endpoint and query parameters and
+    stored with the user's collection version. Any write to the user's
+    recipes, tags, ingredients or their relations moves the version, so
+    older entries are ignored and replaced by the next response. Responses
+    over ``MAX_ENTRY_SIZE`` bytes are not cached at all.
+    """
+
+    def __init__(self, backend=None, max_entry_size=None):
+        self._backend = backend
+        self.max_entry_size = max_entry_size
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            options = dict(getattr(settings, 'RESPONSE_CACHE', {}))
+            name = options.pop('BACKEND', 'local')
+            max_entry_size = options.pop('MAX_ENTRY_SIZE', 1024 * 1024)
+            if self.max_entry_size is None:
+                self.max_entry_size = max_entry_size
+            if name in (None, 'none'):
+                return None
+            self._backend = BACKENDS[name](
+                **{key.lower(): value for key, value in options.items()}
+            )
+        return self._backend
+
+    def make_key(self, user_id, request):
+        """Return the cache key of request"""
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        )
+        raw = repr((request.get_host(), request.path, params))
+        digest = hashlib.sha1(raw.encode()).hexdigest()
+        return f'response:{user_id}:{digest}'
+
+    def get(self, key, version):
+        """Return the data cached for key at version, or None"""
+        backend = self.backend
+        entry = backend.get(key) if backend is not None else None
+        value = entry[1] if entry is not None and entry[0] == version \
+            else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, version, value):
+        backend = self.backend
+        if backend is None:
+            return
+        value, size = detach(value)
+        if self.max_entry_size is None or size <= self.max_entry_size:
+            backend.set(key, (version, value), size)
+
+    def stats(self):
+        """Return hit and miss counters of this process"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def detach(data):
+    """Copy serializer output into plain containers that can be pickled
+
+    Returns the copy and its approximate size in bytes; strings shared
+    between entries, like dict keys, are counted every time.
+    """
+    if isinstance(data, dict):
+        copy = OrderedDict()
+        size = sys.getsizeof(copy)
+        for key, value in data.items():
+            copy[key], value_size = detach(value)
+            size += sys.getsizeof(key) + value_size
+        return copy, size
+    if isinstance(data, list):
+        copy = []
+        size = sys.getsizeof(data)
+        for item in data:
+            item, item_size = detach(item)
+            copy.append(item)
+            size += item_size
+        return copy, size
+    return data, sys.getsizeof(data)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,99 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from core.models import Recipe
+
+EXPORT_FIELDS = (
+    'id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients'
+)
+NAME_SEPARATOR = '|'
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_recipes(queryset, chunk_size=CHUNK_SIZE):
+    """Yield recipes of queryset as dicts, in id order
+
+    Rows are read through a server-side cursor where the database
+    supports it, and tag/ingredient names are loaded once per chunk, so
+    memory use does not grow with the number of recipes.
+    """
+    rows = queryset \
+        .prefetch_related(None) \
+        .order_by('id') \
+        .values_list('id', 'title', 'time_minutes', 'price', 'link') \
+        .iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+
+        ids = [row[0] for row in chunk]
+        tags = _names_by_recipe(Recipe.tags.through, 'tag__name', ids)
+        ingredients = _names_by_recipe(
+            Recipe.ingredients.through, 'ingredient__name', ids
+        )
+        for recipe_id, title, time_minutes, price, link in chunk:
+            yield {
+                'id': recipe_id,
+                'title': title,
+                'time_minutes': time_minutes,
+                'price': str(price),
+                'link': link,
+                'tags': tags.get(recipe_id, []),
+                'ingredients': ingredients.get(recipe_id, []),
+            }
+
+
+def _names_by_recipe(through, name_field, recipe_ids):
+    names = defaultdict(list)
+    rows = through.objects \
+        .filter(recipe_id__in=recipe_ids) \
+        .order_by('id') \
+        .values_list('recipe_id', name_field)
+    for recipe_id, name in rows:
+        names[recipe_id].append(name)
+    return names
+
+
+def render_ndjson(recipes):
+    """Yield one JSON document per line"""
+    for recipe in recipes:
+        yield json.dumps(recipe) + '\n'
+
+
+class _Echo:
+    """File-like object handing back whatever csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(recipes):
+    """Yield CSV lines, joining tag and ingredient names with '|'"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for recipe in recipes:
+        yield writer.writerow([
+            NAME_SEPARATOR.join(recipe[field])
+            if field in ('tags', 'ingredients') else recipe[field]
+            for field in EXPORT_FIELDS
+        ])
+
+
+RENDERERS = {
+    'ndjson': render_ndjson,
+    'csv': render_csv,
+}
+
+
+def export_recipes(queryset, export_format, chunk_size=CHUNK_SIZE):
+    """Return a generator of the recipes of queryset in export_format"""
+    return RENDERERS[export_format](iter_recipes(queryset, chunk_size))
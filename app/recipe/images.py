@@ -0,0 +1,149 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from core.models import Recipe, RecipeImageVariant
+from core.storage import image_storage, release
+from jobs.queue import enqueue
+from recipe.versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+# name, bounding box (None keeps the original size), JPEG quality
+VARIANTS = (
+    ('thumbnail', (200, 200), 80),
+    ('medium', (800, 800), 85),
+    ('original', None, 90),
+)
+WEBP_SUFFIX = '_webp'
+EXIF_ORIENTATION = 0x0112
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """Return the shared pool running image processing off requests"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RECIPE_IMAGE_WORKERS', 2),
+                thread_name_prefix='recipe-images'
+            )
+        return _executor
+
+
+def process_image(recipe):
+    """Generate the variants of the image just stored on recipe
+
+    With RECIPE_IMAGE_PROCESSING set to 'thread' the work is handed to a
+    worker pool once the current transaction commits, 'queue' stores a job
+    for `manage.py run_jobs` and returns it, and 'sync' does the work
+    before returning.
+    """
+    image_name = recipe.image.name
+    mode = getattr(settings, 'RECIPE_IMAGE_PROCESSING', 'thread')
+    if mode == 'sync':
+        generate_variants(recipe.id, image_name)
+    elif mode == 'queue':
+        return enqueue(
+            'recipe.generate_image_variants',
+            {'recipe_id': recipe.id, 'image_name': image_name},
+            user=recipe.user
+        )
+    else:
+        transaction.on_commit(
+            lambda: executor().submit(_run, recipe.id, image_name)
+        )
+    return None
+
+
+def _run(recipe_id, image_name):
+    try:
+        generate_variants(recipe_id, image_name)
+    except Exception:
+        logger.exception('Processing image of recipe %s failed', recipe_id)
+    finally:
+        # Worker threads own their connection
+        connection.close()
+
+
+def render_variants(source):
+    """Return (name, extension, width, height, encoded bytes) of variants
+
+    Variants are rendered from the largest down, shrinking one image in
+    place, so a single decoded copy of the upload is held at a time and
+    each downscale starts from the closest size; thumbnail() reduces by
+    an integer factor before resampling. ``source`` is shrunk too.
+    """
+    image = source
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    webp = getattr(settings, 'RECIPE_IMAGE_WEBP', False)
+    rendered = []
+    # VARIANTS go from the smallest up
+    for name, size, quality in reversed(VARIANTS):
+        if size is not None:
+            image.thumbnail(size, Image.LANCZOS)
+        variant = [(name, 'jpg', image.width, image.height, _encode(
+            image, 'JPEG', quality=quality, optimize=True, progressive=True
+        ))]
+        if webp:
+            variant.append((
+                name + WEBP_SUFFIX, 'webp', image.width, image.height,
+                _encode(image, 'WEBP', quality=quality, method=4)
+            ))
+        rendered[:0] = variant
+    return rendered
+
+
+def _encode(image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def generate_variants(recipe_id, image_name):
+    """Store the variants of image_name and record them on the recipe
+
+    Nothing is recorded when the recipe got another image meanwhile.
+    """
+    with image_storage.open(image_name) as source:
+        rendered = render_variants(Image.open(source))
+
+    variants = []
+    for name, extension, width, height, data in rendered:
+        variant = RecipeImageVariant(
+            recipe_id=recipe_id,
+            name=name,
+            width=width,
+            height=height
+        )
+        variant.file.save(f'{name}.{extension}', ContentFile(data), save=False)
+        variants.append(variant)
+
+    with transaction.atomic():
+        recipe = Recipe.objects \
+            .select_for_update() \
+            .filter(id=recipe_id, image=image_name) \
+            .first()
+        if recipe is None:
+            stale = variants
+        else:
+            stale = list(recipe.image_variants.all())
+            recipe.image_variants.all().delete()
+            RecipeImageVariant.objects.bulk_create(variants)
+            bump_version(recipe.user_id, links=False)
+
+    # Files are shared by content, so only unreferenced ones go away
+    release(variant.file.name for variant in stale)
+    return variants if recipe is not None else []
@@ -0,0 +1,253 @@
+import json
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from core.models import Recipe, RecipeLinkChange
+from recipe.versions import get_version, get_versions, \
+    link_changes_kept
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+MATCH_MODES = (MATCH_ANY, MATCH_ALL)
+
+# Link changes recorded by bump_links(), as (field, op, key, recipe ids)
+FIELDS = ('tags', 'ingredients')
+LINK = 'link'  # recipe ids linked to key
+UNLINK = 'unlink'  # recipe ids unlinked from key
+DROP = 'drop'  # key deleted with all its links
+FORGET = 'forget'  # recipes deleted with all their links, key is unused
+
+
+class UserIndex:
+    """Base class for in-process indexes built from one user's recipes
+
+    Entries are built lazily and replaced as soon as the user's version
+    moves on, so every process answers from data at least as new as the
+    last committed write; subclasses may catch an entry up instead of
+    rebuilding it. Only the most recently used users are kept in memory.
+    """
+
+    def __init__(self, max_users=None):
+        self.max_users = max_users or getattr(
+            settings, 'RECIPE_INDEX_MAX_USERS', 1000
+        )
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def invalidate(self, user_id=None):
+        """Drop the entry of one user, or of every user"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def current_version(self, user_id):
+        """Return the version entries of the user are built for"""
+        return get_version(user_id)
+
+    def build_entry(self, user_id):
+        """Return the index data of a user, read from the database"""
+        raise NotImplementedError
+
+    def catch_up(self, user_id, entry, cached_version, version):
+        """Return entry brought from cached_version to version, or None
+
+        Subclasses override this when they can apply the changes in
+        between; returning None rebuilds the entry.
+        """
+        return None
+
+    def get_entry(self, user_id, version=None):
+        """Return the up to date index data of a user
+
+        ``version`` may be passed when the caller already read the
+        user's current_version().
+        """
+        if version is None:
+            version = self.current_version(user_id)
+        with self._lock:
+            cached = self._entries.get(user_id)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(user_id)
+                return cached[1]
+
+        entry = None
+        if cached is not None and cached[0] < version:
+            entry = self.catch_up(user_id, cached[1], cached[0], version)
+        if entry is None:
+            entry = self.build_entry(user_id)
+        with self._lock:
+            current = self._entries.get(user_id)
+            # Don't replace what a concurrent request read later
+            if current is None or current[0] <= version:
+                self._entries[user_id] = (version, entry)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return entry
+
+
+class RecipeFilterIndex(UserIndex):
+    """Per-user inverted index of tag/ingredient id -> recipe ids
+
+    Entries follow the links version, which other writes leave alone, and
+    catch up with recent link changes without reading every link again.
+    """
+
+    def recipe_ids(self, user_id, tag_ids=None, ingredient_ids=None,
+                   match=MATCH_ANY, version=None, limit=None):
+        """Return ids of the user's recipes matching the given filters
+
+        Tag and ingredient filters are always combined with AND; ``match``
+        decides whether ids within each filter are combined with OR
+        (``any``) or AND (``all``). ``version`` is the user's links
+        version, when the caller already read it. With ``limit``, None is
+        returned instead when the match is known to be larger.
+        """
+        if match not in MATCH_MODES:
+            raise ValueError(f'Unknown match mode: {match}')
+
+        tags, ingredients = self.get_entry(user_id, version)
+        filters = [
+            (postings, set(ids))
+            for postings, ids in ((tags, tag_ids),
+                                  (ingredients, ingredient_ids))
+            if ids
+        ]
+        if limit is not None and len(filters) == 1:
+            postings, ids = filters[0]
+            if match == MATCH_ANY or len(ids) == 1:
+                # Matches at least the recipes of its largest posting
+                largest = max(len(postings.get(i, ())) for i in ids)
+                if largest > limit:
+                    return None
+
+        result = None
+        for postings, ids in filters:
+            matched = self._combine(postings, ids, match)
+            result = matched if result is None else result & matched
+            if not result:
+                break
+
+        return result if result is not None else set()
+
+    def current_version(self, user_id):
+        return get_versions(user_id)[1]
+
+    def build_entry(self, user_id):
+        return (
+            self._postings(Recipe.tags.through, 'tag_id', user_id),
+            self._postings(
+                Recipe.ingredients.through, 'ingredient_id', user_id
+            ),
+        )
+
+    def catch_up(self, user_id, entry, cached_version, version):
+        missed = version - cached_version
+        if missed > link_changes_kept():
+            return None
+        records = list(
+            RecipeLinkChange.objects
+            .filter(
+                user_id=user_id,
+                version__gt=cached_version,
+                version__lte=version
+            )
+            .order_by('version')
+            .values_list('changes', flat=True)
+        )
+        if len(records) != missed:
+            # Bulk writes bump the version without recording changes
+            return None
+
+        # Entries are shared with concurrent readers: copy, don't modify
+        postings = tuple(dict(field_postings) for field_postings in entry)
+        for record in records:
+            for field, op, key, ids in json.loads(record):
+                if op == FORGET:
+                    for field_postings in postings:
+                        _unlink_everywhere(field_postings, ids)
+                else:
+                    _apply(postings[FIELDS.index(field)], op, key, ids)
+        return postings
+
+    def _combine(self, postings, ids, match):
+        sets = sorted(
+            (postings.get(i, frozenset()) for i in set(ids)),
+            key=len
+        )
+        if match == MATCH_ALL:
+            return set(sets[0]).intersection(*sets[1:])
+        return set().union(*sets)
+
+    def _postings(self, through, column, user_id):
+        postings = defaultdict(set)
+        rows = through.objects \
+            .filter(recipe__user_id=user_id) \
+            .values_list(column, 'recipe_id') \
+            .iterator()
+        for key, recipe_id in rows:
+            postings[key].add(recipe_id)
+        return {key: frozenset(ids) for key, ids in postings.items()}
+
+
+def max_listed_ids():
+    """Largest match the index hands to the database as a list of ids"""
+    return getattr(settings, 'RECIPE_INDEX_MAX_IDS', 1000)
+
+
+def filter_by_links(queryset, tag_ids=None, ingredient_ids=None,
+                    match=MATCH_ANY):
+    """Filter recipes on their links in SQL, like recipe_ids() does
+
+    Used for matches too large to pass as ids: with the (user, -id)
+    index the database stops as soon as a page is filled.
+    """
+    conditions = {}
+    for field, column, ids in (('tags', 'tag_id', tag_ids),
+                               ('ingredients', 'ingredient_id',
+                                ingredient_ids)):
+        if not ids:
+            continue
+        links = getattr(Recipe, field).through.objects \
+            .filter(recipe_id=OuterRef('pk'))
+        if match == MATCH_ALL:
+            groups = [[i] for i in sorted(set(ids))]
+        else:
+            groups = [sorted(set(ids))]
+        for number, group in enumerate(groups):
+            conditions[f'_{field}_{number}'] = Exists(
+                links.filter(**{f'{column}__in': group})
+            )
+    return queryset \
+        .annotate(**conditions) \
+        .filter(**dict.fromkeys(conditions, True))
+
+
+def _apply(postings, op, key, ids):
+    if op == DROP:
+        postings.pop(key, None)
+        return
+    current = postings.get(key, frozenset())
+    if op == LINK:
+        postings[key] = current.union(ids)
+    elif op == UNLINK:
+        remaining = current.difference(ids)
+        if remaining:
+            postings[key] = remaining
+        else:
+            postings.pop(key, None)
+
+
+def _unlink_everywhere(postings, ids):
+    ids = frozenset(ids)
+    for key, recipe_ids in list(postings.items()):
+        if not recipe_ids.isdisjoint(ids):
+            _apply(postings, UNLINK, key, ids)
+
+
+filter_index = RecipeFilterIndex()
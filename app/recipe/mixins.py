@@ -0,0 +1,81 @@
+import hashlib
+
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import cached_property
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipe.cache import response_cache
+from recipe.versions import get_versions
+
+
+class CollectionVersionMixin:
+    """Read the requesting user's collection versions once per request"""
+
+    @cached_property
+    def collection_versions(self):
+        return get_versions(self.request.user.id)
+
+    @property
+    def collection_version(self):
+        return self.collection_versions[0]
+
+    @property
+    def links_version(self):
+        return self.collection_versions[1]
+
+
+class ConditionalGetMixin(CollectionVersionMixin):
+    """Answer list/retrieve with 304 while the user's collection is unchanged
+
+    The ETag combines the requesting user's collection version with the
+    full path and Accept header, so it is checked with a single primary
+    key lookup, before the queryset or serializer ever run.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+    def get_etag(self, request):
+        """Return the ETag of the response to request"""
+        user_id = request.user.id
+        key = '\n'.join((
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+        ))
+        digest = hashlib.md5(key.encode()).hexdigest()[:16]
+        return f'"{user_id}-{self.collection_version}-{digest}"'
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        # The ETag, like the body, differs by user and negotiated format
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+
+class CachedListMixin(CollectionVersionMixin):
+    """Serve list responses from the versioned per-user response cache"""
+
+    def list(self, request, *args, **kwargs):
+        key = response_cache.make_key(request.user.id, request)
+        data = response_cache.get(key, self.collection_version)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response_cache.set(key, self.collection_version, response.data)
+        return response
@@ -0,0 +1,181 @@
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, \
+    SearchVector
+from django.db import connections
+from django.db.models import Case, When, Value, FloatField, IntegerField
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.index import UserIndex
+
+SEARCH_CONFIG = 'english'
+
+TITLE_WEIGHT = 1.0
+RELATION_WEIGHT = 0.4
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens with a naive plural strip"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if len(token) > 3 and token.endswith('s') \
+                and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class RecipeSearchIndex(UserIndex):
+    """Per-user token index of recipe titles, tag and ingredient names
+
+    Used where full text search is not available in the database. Every
+    token maps to {recipe id: weight}, title tokens weighing more than
+    tokens of tag and ingredient names.
+    """
+
+    def search(self, user_id, terms, candidates=None, version=None):
+        """Return ids of recipes matching every term, best match first"""
+        tokens = set(tokenize(terms))
+        if not tokens:
+            return []
+
+        postings = self.get_entry(user_id, version)
+        scores = None
+        for token in sorted(tokens, key=lambda t: len(postings.get(t, ()))):
+            matches = postings.get(token)
+            if not matches:
+                return []
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {
+                    recipe_id: score + matches[recipe_id]
+                    for recipe_id, score in scores.items()
+                    if recipe_id in matches
+                }
+
+        if candidates is not None:
+            scores = {
+                recipe_id: score for recipe_id, score in scores.items()
+                if recipe_id in candidates
+            }
+        return sorted(scores, key=lambda pk: (-scores[pk], -pk))
+
+    def build_entry(self, user_id):
+        postings = defaultdict(dict)
+        tokens_of = {}
+
+        def add(recipe_id, text, weight):
+            # Tag and ingredient names repeat across many recipes
+            tokens = tokens_of.get(text)
+            if tokens is None:
+                tokens = tokens_of[text] = tokenize(text)
+            for token in tokens:
+                current = postings[token].get(recipe_id, 0)
+                postings[token][recipe_id] = max(current, weight)
+
+        recipes = Recipe.objects \
+            .filter(user_id=user_id) \
+            .values_list('id', 'title') \
+            .iterator()
+        for recipe_id, title in recipes:
+            add(recipe_id, title, TITLE_WEIGHT)
+
+        for through, name in ((Recipe.tags.through, 'tag__name'),
+                              (Recipe.ingredients.through,
+                               'ingredient__name')):
+            rows = through.objects \
+                .filter(recipe__user_id=user_id) \
+                .values_list('recipe_id', name) \
+                .iterator()
+            for recipe_id, text in rows:
+                add(recipe_id, text, RELATION_WEIGHT)
+
+        return dict(postings)
+
+
+search_index = RecipeSearchIndex()
+
+
+def search_limit():
+    return getattr(settings, 'RECIPE_SEARCH_LIMIT', 100)
+
+
+def search_recipes(queryset, user_id, terms, candidates=None,
+                   version=None):
+    """Return queryset narrowed to recipes matching terms, ranked
+
+    On PostgreSQL the match runs on full text search expressions backed
+    by GIN indexes; other databases use the in-process token index.
+    ``candidates`` is an optional set of recipe ids the queryset is
+    already restricted to and ``version`` the user's collection version,
+    when the caller already read it.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        return _search_postgres(queryset, user_id, terms)
+    return _search_token_index(
+        queryset, user_id, terms, candidates, version
+    )
+
+
+def _search_postgres(queryset, user_id, terms):
+    # Each branch of the union is answered from its own GIN index, which an
+    # OR of the three conditions would rule out, and only the recipes found
+    # are ranked. The relation subqueries are uncorrelated, so the rank
+    # reads them once as hashed sets rather than probing them per row.
+    query = SearchQuery(terms, config=SEARCH_CONFIG)
+    title_ids = _matching(Recipe, user_id, 'title', query).values('id')
+    tag_recipe_ids = Recipe.tags.through.objects \
+        .filter(tag__in=_matching(Tag, user_id, 'name', query).values('id')) \
+        .values('recipe_id')
+    ingredient_recipe_ids = Recipe.ingredients.through.objects \
+        .filter(ingredient__in=_matching(
+            Ingredient, user_id, 'name', query
+        ).values('id')) \
+        .values('recipe_id')
+
+    return queryset \
+        .filter(id__in=title_ids.union(
+            tag_recipe_ids, ingredient_recipe_ids
+        )) \
+        .annotate(document=SearchVector('title', config=SEARCH_CONFIG)) \
+        .annotate(
+            rank=_bonus(TITLE_WEIGHT, document=query) +
+            _bonus(RELATION_WEIGHT, id__in=tag_recipe_ids) +
+            _bonus(RELATION_WEIGHT, id__in=ingredient_recipe_ids) +
+            SearchRank(SearchVector('title', config=SEARCH_CONFIG), query)
+        ) \
+        .order_by('-rank', '-id')[:search_limit()]
+
+
+def _matching(model, user_id, field, query):
+    """Return the user's rows of model whose field matches query"""
+    return model.objects \
+        .filter(user_id=user_id) \
+        .annotate(document=SearchVector(field, config=SEARCH_CONFIG)) \
+        .filter(document=query)
+
+
+def _bonus(weight, **condition):
+    """Return weight for rows matching condition, 0 for the others"""
+    return Case(
+        When(then=Value(weight), **condition),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def _search_token_index(queryset, user_id, terms, candidates, version):
+    ranked = search_index.search(user_id, terms, candidates, version)
+    ranked = ranked[:search_limit()]
+    return queryset \
+        .filter(id__in=ranked) \
+        .order_by(Case(
+            *[When(id=pk, then=Value(pos)) for pos, pk in enumerate(ranked)],
+            default=Value(len(ranked)),
+            output_field=IntegerField(),
+        ))
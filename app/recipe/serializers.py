@@ -1,33 +1,131 @@
+import warnings
+
+from PIL import Image
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from core.models import Tag, Ingredient, Recipe, RecipeImageVariant, \
+    normalize_name
+from core.storage import image_storage
+from recipe.bulk import bulk_create_recipes
+
 
-from core.models import Tag, Ingredient, Recipe
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    """Base serializer for recipe attributes with a per-user unique name"""
+
+    def validate_name(self, value):
+        """Reject names the user already has, ignoring case and spacing"""
+        request = self.context.get('request')
+        if request is None:
+            return value
+
+        duplicates = self.Meta.model.objects.filter(
+            user=request.user,
+            normalized_name=normalize_name(value)
+        )
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError(self.duplicate_name_message())
+        return value
+
+    def save(self, **kwargs):
+        """Save, rejecting a name taken since validate_name like it does"""
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'name': [self.duplicate_name_message()]}
+            )
+
+    def duplicate_name_message(self):
+        return f'{self.Meta.model.__name__} with this name already exists.'
+
+
+class RecipeAttrNamesSerializer(serializers.Serializer):
+    """Names to get or create in bulk"""
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        allow_empty=False,
+        max_length=getattr(settings, 'RECIPE_BULK_MAX_ITEMS', 5000)
+    )
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(RecipeAttrSerializer):
     """Serializer for Tag objects"""
 
     class Meta:
         model = Tag
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(RecipeAttrSerializer):
     """Serializer for Ingredient objects"""
 
     class Meta:
         model = Ingredient
-        fields = ('id', 'name')
-        read_only_fields = ('id',)
+        fields = ('id', 'name', 'recipe_count')
+        read_only_fields = ('id', 'recipe_count')
+
+
+class UserManyRelatedField(serializers.ManyRelatedField):
+    """Validate a whole list of primary keys with a single IN query"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        child = self.child_relation
+        queryset = child.get_queryset()
+        pk_field = queryset.model._meta.pk
+        pks = []
+        for item in data:
+            try:
+                pks.append(pk_field.to_python(item))
+            except DjangoValidationError:
+                child.fail('incorrect_type', data_type=type(item).__name__)
+
+        objects = queryset.in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key relation limited to objects of the requesting user"""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return UserManyRelatedField(**list_kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None:
+            return queryset.none()
+        return queryset.filter(user=request.user)
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for Recipe objects"""
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
     )
-    ingredients = serializers.PrimaryKeyRelatedField(
+    ingredients = UserPrimaryKeyRelatedField(
         many=True,
         queryset=Ingredient.objects.all()
     )
@@ -40,23 +138,322 @@ class RecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class RecipeBulkListSerializer(serializers.ListSerializer):
+    """Validates and creates a batch of recipes at once"""
+
+    def to_internal_value(self, data):
+        max_items = getattr(settings, 'RECIPE_BULK_MAX_ITEMS', 5000)
+        if isinstance(data, list) and len(data) > max_items:
+            raise serializers.ValidationError({
+                'non_field_errors': [
+                    f'Ensure this list has no more than {max_items} items.'
+                ]
+            })
+
+        items = super().to_internal_value(data)
+        user = self.context['request'].user
+        known = {
+            'tags': self._existing_ids(Tag, user, items, 'tags'),
+            'ingredients': self._existing_ids(
+                Ingredient, user, items, 'ingredients'
+            ),
+        }
+
+        errors = []
+        for item in items:
+            item_errors = {}
+            for field, existing in known.items():
+                missing = [pk for pk in item[field] if pk not in existing]
+                if missing:
+                    item_errors[field] = [
+                        f'Invalid pk "{pk}" - object does not exist.'
+                        for pk in missing
+                    ]
+            errors.append(item_errors)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def _existing_ids(self, model, user, items, field):
+        """Return which of the ids referenced by items belong to user"""
+        ids = {pk for item in items for pk in item[field]}
+        if not ids:
+            return set()
+        return set(
+            model.objects
+            .filter(user=user, id__in=ids)
+            .values_list('id', flat=True)
+        )
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            return bulk_create_recipes(
+                self.context['request'].user, validated_data
+            )
+
+
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """Serializer for one recipe of a bulk create request"""
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        default=list
+    )
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        default=list
+    )
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients'
+        )
+        list_serializer_class = RecipeBulkListSerializer
+
+
+class RecipeImportSerializer(RecipeBulkSerializer):
+    """Serializer for one row of an import file
+
+    Rows name their tags and ingredients instead of giving ids; blank
+    names are dropped later.
+    """
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=255, allow_blank=True),
+        default=list
+    )
+    ingredients = serializers.ListField(
+        child=serializers.CharField(max_length=255, allow_blank=True),
+        default=list
+    )
+
+    class Meta(RecipeBulkSerializer.Meta):
+        # Durations are never negative
+        extra_kwargs = {'time_minutes': {'min_value': 0}}
+
+
+def file_url(name, context):
+    """Return the URL of a stored file the way serializers.ImageField does"""
+    if not name:
+        return None
+    url = image_storage.url(name)
+    request = context.get('request')
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
 class RecipeDetailSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     ingredients = IngredientSerializer(many=True, read_only=True)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'title', 'time_minutes', 'price', 'tags', 'ingredients',
-            'image'
+            'image', 'image_variants'
         )
         read_only_fields = ('id',)
 
+    def get_image_variants(self, recipe):
+        """Return {variant name: URL} of the resized copies of the image"""
+        variants = sorted(
+            recipe.image_variants.all(), key=lambda variant: variant.name
+        )
+        return {
+            variant.name: file_url(variant.file.name, self.context)
+            for variant in variants
+        }
+
+
+class RecipeImageField(serializers.ImageField):
+    """Image field validating uploads from their header only
+
+    Django's ImageField hands the whole file to Pillow; here only the
+    format and dimensions are read, and uploads above
+    RECIPE_IMAGE_MAX_BYTES or RECIPE_IMAGE_MAX_PIXELS are rejected before
+    any pixel is decoded.
+    """
+    formats = ('JPEG', 'PNG', 'WEBP', 'GIF')
+    default_error_messages = {
+        'too_large': 'Ensure the image is no larger than {max_bytes} bytes.',
+        'too_many_pixels':
+            'Ensure the image has no more than {max_pixels} pixels.',
+    }
+
+    def to_internal_value(self, data):
+        file_object = serializers.FileField.to_internal_value(self, data)
+        max_bytes = getattr(settings, 'RECIPE_IMAGE_MAX_BYTES', 10485760)
+        max_pixels = getattr(settings, 'RECIPE_IMAGE_MAX_PIXELS', 40000000)
+        if file_object.size > max_bytes:
+            self.fail('too_large', max_bytes=max_bytes)
+
+        try:
+            with warnings.catch_warnings():
+                # Pixel counts are checked below, against our own limit
+                warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+                image = Image.open(file_object)
+        except Image.DecompressionBombError:
+            self.fail('too_many_pixels', max_pixels=max_pixels)
+        except Exception:
+            self.fail('invalid_image')
+
+        if image.format not in self.formats:
+            self.fail('invalid_image')
+        width, height = image.size
+        if width * height > max_pixels:
+            self.fail('too_many_pixels', max_pixels=max_pixels)
+
+        file_object.seek(0)
+        return file_object
+
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Handles uploading image to recipe model"""
+    image = RecipeImageField(allow_null=True, max_length=100)
 
     class Meta:
         model = Recipe
         fields = ('id', 'image',)
         read_only_field = ('id',)
+
+
+class RecipeRowSerializer:
+    """Read-only stand-in for RecipeSerializer working on values() rows
+
+    Skips the per-field machinery of ModelSerializer: recipes come in as
+    dicts of ``row_fields`` and their tag/ingredient ids are read with one
+    grouped query per relation. Output renders to exactly the same JSON as
+    RecipeSerializer for recipes whose relations are ordered by id.
+    """
+    row_fields = ('id', 'title', 'time_minutes', 'price', 'link')
+    price_field = serializers.DecimalField(
+        max_digits=Recipe._meta.get_field('price').max_digits,
+        decimal_places=Recipe._meta.get_field('price').decimal_places,
+    )
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        data = self.to_representation(rows)
+        if self.many:
+            return ReturnList(data, serializer=self)
+        return ReturnDict(data[0], serializer=self)
+
+    def to_representation(self, rows):
+        ids = [row['id'] for row in rows]
+        tags = self.relations(Recipe.tags.through, 'tag', ids)
+        ingredients = self.relations(
+            Recipe.ingredients.through, 'ingredient', ids
+        )
+        return [
+            self.row_representation(
+                row, tags.get(row['id'], []), ingredients.get(row['id'], [])
+            )
+            for row in rows
+        ]
+
+    def row_representation(self, row, tags, ingredients):
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'time_minutes': row['time_minutes'],
+            'price': self.price_field.to_representation(row['price']),
+            'link': row['link'],
+            'tags': tags,
+            'ingredients': ingredients,
+        }
+
+    def relations(self, through, name, recipe_ids):
+        """Return {recipe id: [related id, ...]} ordered by related id"""
+        related = {}
+        rows = through.objects \
+            .filter(recipe_id__in=recipe_ids) \
+            .order_by(f'{name}_id') \
+            .values_list('recipe_id', f'{name}_id')
+        for recipe_id, pk in rows:
+            related.setdefault(recipe_id, []).append(pk)
+        return related
+
+
+class RecipeDetailRowSerializer(RecipeRowSerializer):
+    """Read-only stand-in for RecipeDetailSerializer on values() rows"""
+    row_fields = ('id', 'title', 'time_minutes', 'price', 'image')
+
+    def to_representation(self, rows):
+        self.variants = self.image_variants([row['id'] for row in rows])
+        return super().to_representation(rows)
+
+    def row_representation(self, row, tags, ingredients):
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'time_minutes': row['time_minutes'],
+            'price': self.price_field.to_representation(row['price']),
+            'tags': tags,
+            'ingredients': ingredients,
+            'image': file_url(row['image'], self.context),
+            'image_variants': self.variants.get(row['id'], {}),
+        }
+
+    def relations(self, through, name, recipe_ids):
+        """Return {recipe id: [{'id': ..., 'name': ...}, ...]} by id"""
+        related = {}
+        rows = through.objects \
+            .filter(recipe_id__in=recipe_ids) \
+            .order_by(f'{name}_id') \
+            .values_list(
+                'recipe_id', f'{name}_id', f'{name}__name',
+                f'{name}__recipe_count'
+            )
+        for recipe_id, pk, related_name, recipe_count in rows:
+            related.setdefault(recipe_id, []).append(
+                {'id': pk, 'name': related_name, 'recipe_count': recipe_count}
+            )
+        return related
+
+    def image_variants(self, recipe_ids):
+        """Return {recipe id: {variant name: URL}} ordered by name"""
+        variants = {}
+        rows = RecipeImageVariant.objects \
+            .filter(recipe_id__in=recipe_ids) \
+            .values_list('recipe_id', 'name', 'file')
+        # Sorted in Python, like RecipeDetailSerializer, not by collation
+        for recipe_id, name, path in sorted(rows, key=lambda row: row[1]):
+            variants.setdefault(recipe_id, {})[name] = \
+                file_url(path, self.context)
+        return variants
+
+
+class RecipeAttrUsageSerializer(serializers.Serializer):
+    """A tag or ingredient with the number of recipes using it"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+
+
+class PriceStatsSerializer(serializers.Serializer):
+    avg = serializers.DecimalField(max_digits=5, decimal_places=2)
+    min = serializers.DecimalField(max_digits=5, decimal_places=2)
+    max = serializers.DecimalField(max_digits=5, decimal_places=2)
+
+
+class TimeStatsSerializer(serializers.Serializer):
+    avg = serializers.FloatField()
+    min = serializers.IntegerField()
+    max = serializers.IntegerField()
+
+
+class RecipeStatsSerializer(serializers.Serializer):
+    """Serializer for the statistics of a user's recipes"""
+    recipe_count = serializers.IntegerField()
+    price = PriceStatsSerializer()
+    time_minutes = TimeStatsSerializer()
+    top_tags = RecipeAttrUsageSerializer(many=True)
+    top_ingredients = RecipeAttrUsageSerializer(many=True)
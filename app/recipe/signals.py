@@ -0,0 +1,175 @@
+from collections import Counter
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, \
+    pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import stats
+from recipe.index import LINK, UNLINK, DROP, FORGET
+from recipe.versions import bump_version, bump_links
+
+# Recipe fields summed up in RecipeStats
+STATS_FIELDS = {'price', 'time_minutes'}
+
+THROUGH_RELATED = {
+    Recipe.tags.through: Tag,
+    Recipe.ingredients.through: Ingredient,
+}
+RELATED_FIELD = {
+    Tag: 'tags',
+    Ingredient: 'ingredients',
+}
+THROUGH_FIELD = {
+    through: RELATED_FIELD[related]
+    for through, related in THROUGH_RELATED.items()
+}
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """Bump the owner's version when recipe tags or ingredients change"""
+    field = THROUGH_FIELD[sender]
+    if action == 'post_clear':
+        if reverse:
+            changes = [(field, DROP, instance.pk, [])]
+        else:
+            # Read by count_relations before the links were cleared
+            changes = [
+                (field, UNLINK, key, [instance.pk])
+                for key in instance._stats_unlinked
+            ]
+    elif action in ('post_add', 'post_remove'):
+        op = LINK if action == 'post_add' else UNLINK
+        if reverse:
+            changes = [(field, op, instance.pk, sorted(pk_set))]
+        else:
+            changes = [(field, op, key, [instance.pk]) for key in pk_set]
+    else:
+        return
+    bump_links(instance.user_id, changes)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_collection_changed(sender, instance, **kwargs):
+    """Bump the owner's version when a row of the collection changes"""
+    # New rows have no links yet
+    bump_version(instance.user_id, links=False)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_collection_deleted(sender, instance, **kwargs):
+    """Bump the owner's versions, the delete took the row's links along"""
+    if sender is Recipe:
+        changes = [(None, FORGET, None, [instance.pk])]
+    else:
+        changes = [(RELATED_FIELD[sender], DROP, instance.pk, [])]
+    bump_links(instance.user_id, changes)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_values(sender, instance, update_fields, **kwargs):
+    """Read the stored price and time, to tell what a save changes
+
+    Only saves that can change them pay for the query; reads never do.
+    """
+    instance._stats_values = None
+    if instance._state.adding or (
+            update_fields is not None and
+            not STATS_FIELDS.intersection(update_fields)):
+        return
+    stored = Recipe.objects \
+        .filter(pk=instance.pk) \
+        .values_list('price', 'time_minutes') \
+        .first()
+    if stored is not None:
+        instance._stats_values = (stored[0], int(stored[1]))
+
+
+@receiver(post_save, sender=Recipe)
+def count_saved_recipe(sender, instance, created, update_fields, **kwargs):
+    """Add a new recipe to the stats, or replace its previous values"""
+    if created:
+        stats.recipes_changed(
+            instance.user_id, added=[stats.recipe_values(instance)]
+        )
+        return
+    previous = instance._stats_values
+    if previous is None:
+        return
+    values = stats.recipe_values(instance)
+    if previous != values:
+        stats.recipes_changed(
+            instance.user_id, added=[values], removed=[previous]
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_recipe_relations(sender, instance, **kwargs):
+    """Read the links the delete is about to cascade to
+
+    Along with the receivers below and the version bump, deleting a
+    recipe costs a few queries per recipe, also when a queryset or a
+    cascade deletes many; recipe.bulk.delete_collections() removes whole
+    collections in a fixed number of queries.
+    """
+    instance._stats_relations = {
+        related: _linked(through, instance, False, None)
+        for through, related in THROUGH_RELATED.items()
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    """Remove a deleted recipe and its links from the stats"""
+    stats.recipes_changed(
+        instance.user_id, removed=[stats.recipe_values(instance)]
+    )
+    for related, counts in instance._stats_relations.items():
+        stats.relations_changed(related, counts, -1)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    """Count recipes per tag and ingredient as links come and go
+
+    Removing ids that are not linked is allowed, so the links that will
+    really go are read before they are removed or cleared.
+    """
+    related = THROUGH_RELATED[sender]
+    if action == 'post_add':
+        if reverse:
+            counts = {instance.pk: len(pk_set)}
+        else:
+            counts = dict.fromkeys(pk_set, 1)
+        stats.relations_changed(related, counts)
+    elif action in ('pre_remove', 'pre_clear'):
+        instance._stats_unlinked = _linked(sender, instance, reverse, pk_set)
+    elif action in ('post_remove', 'post_clear'):
+        stats.relations_changed(related, instance._stats_unlinked, -1)
+
+
+def _linked(through, instance, reverse, pk_set):
+    """Return {related id: recipes} of the links of instance
+
+    Only links to ids in pk_set are considered when it is given.
+    """
+    field = THROUGH_RELATED[through]._meta.model_name
+    if reverse:
+        links = through.objects.filter(**{f'{field}_id': instance.pk})
+        if pk_set is not None:
+            links = links.filter(recipe_id__in=pk_set)
+        count = links.count()
+        return {instance.pk: count} if count else {}
+
+    links = through.objects.filter(recipe_id=instance.pk)
+    if pk_set is not None:
+        links = links.filter(**{f'{field}_id__in': pk_set})
+    return Counter(links.values_list(f'{field}_id', flat=True))
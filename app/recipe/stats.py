@@ -0,0 +1,203 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum
+
+from core.models import Recipe, Tag, Ingredient, RecipeStats
+
+
+def recipe_values(recipe):
+    """Return the (price, time_minutes) of recipe counted in the stats"""
+    return Decimal(str(recipe.price)), int(recipe.time_minutes)
+
+
+def recipes_changed(user_id, added=(), removed=()):
+    """Apply recipes added and removed to the user's RecipeStats row
+
+    ``added`` and ``removed`` are (price, time_minutes) pairs, and the
+    recipe table must already reflect the change: removing the current
+    minimum or maximum is the one case that can't be done with arithmetic,
+    and the extremes are then read back from the recipes.
+    """
+    added = [tuple(values) for values in added]
+    removed = [tuple(values) for values in removed]
+    if not added and not removed:
+        return
+
+    with transaction.atomic():
+        stats = _locked_stats(user_id, create=bool(added))
+        if stats is None:
+            return
+
+        stale = False
+        for price, time_minutes in removed:
+            stats.recipe_count -= 1
+            stats.price_total -= price
+            stats.time_total -= time_minutes
+            stale = stale or \
+                price in (stats.price_min, stats.price_max) or \
+                time_minutes in (stats.time_min, stats.time_max)
+
+        if stale:
+            _assign(stats, _extremes(user_id))
+        else:
+            for price, time_minutes in added:
+                stats.price_min = _min(stats.price_min, price)
+                stats.price_max = _max(stats.price_max, price)
+                stats.time_min = _min(stats.time_min, time_minutes)
+                stats.time_max = _max(stats.time_max, time_minutes)
+        for price, time_minutes in added:
+            stats.recipe_count += 1
+            stats.price_total += price
+            stats.time_total += time_minutes
+        stats.save()
+
+
+def relations_changed(model, counts, sign=1):
+    """Add sign times counts[pk] to the recipe_count of model rows
+
+    ``counts`` maps Tag or Ingredient ids to a number of recipes; rows
+    are updated with one UPDATE per distinct number.
+    """
+    for count, pks in _by_count(counts).items():
+        model.objects \
+            .filter(pk__in=pks) \
+            .update(recipe_count=F('recipe_count') + sign * count)
+
+
+def user_stats(user_id, top=5):
+    """Return the statistics shown for a user's recipes"""
+    stats = RecipeStats.objects.filter(user_id=user_id).first() or \
+        RecipeStats(user_id=user_id)
+    count = stats.recipe_count
+
+    return {
+        'recipe_count': count,
+        'price': {
+            'avg': stats.price_total / count if count else None,
+            'min': stats.price_min,
+            'max': stats.price_max,
+        },
+        'time_minutes': {
+            'avg': stats.time_total / count if count else None,
+            'min': stats.time_min,
+            'max': stats.time_max,
+        },
+        'top_tags': _top(Tag, user_id, top),
+        'top_ingredients': _top(Ingredient, user_id, top),
+    }
+
+
+def rebuild_stats(user_id):
+    """Recompute a user's statistics from scratch
+
+    Returns whether the stored statistics differed from the recomputed
+    ones.
+    """
+    with transaction.atomic():
+        stats = _locked_stats(user_id, create=True)
+        fresh = Recipe.objects \
+            .filter(user_id=user_id) \
+            .aggregate(
+                recipe_count=Count('id'),
+                price_total=Sum('price'),
+                time_total=Sum('time_minutes'),
+            )
+        fresh['price_total'] = fresh['price_total'] or 0
+        fresh['time_total'] = fresh['time_total'] or 0
+        fresh.update(_extremes(user_id))
+
+        drifted = any(
+            getattr(stats, name) != value for name, value in fresh.items()
+        )
+        if drifted:
+            _assign(stats, fresh)
+            stats.save()
+
+        for model in (Tag, Ingredient):
+            counts = dict(
+                model.objects
+                .filter(user_id=user_id, recipe__isnull=False)
+                .order_by()
+                .values('id')
+                .annotate(count=Count('recipe'))
+                .values_list('id', 'count')
+            )
+            stored = dict(
+                model.objects
+                .filter(user_id=user_id)
+                .exclude(recipe_count=0)
+                .values_list('id', 'recipe_count')
+            )
+            if counts == stored:
+                continue
+            drifted = True
+            model.objects \
+                .filter(user_id=user_id) \
+                .exclude(recipe_count=0) \
+                .update(recipe_count=0)
+            for count, pks in _by_count(counts).items():
+                model.objects.filter(pk__in=pks).update(recipe_count=count)
+    return drifted
+
+
+def _locked_stats(user_id, create):
+    """Return the user's stats row locked for update
+
+    Returns None when the user has no row and create is false.
+    """
+    stats = RecipeStats.objects \
+        .select_for_update() \
+        .filter(user_id=user_id) \
+        .first()
+    if stats is not None or not create:
+        return stats
+
+    try:
+        with transaction.atomic():
+            return RecipeStats.objects.create(user_id=user_id)
+    except IntegrityError:
+        return RecipeStats.objects.select_for_update().get(user_id=user_id)
+
+
+def _assign(stats, values):
+    for name, value in values.items():
+        setattr(stats, name, value)
+
+
+def _extremes(user_id):
+    return Recipe.objects \
+        .filter(user_id=user_id) \
+        .aggregate(
+            price_min=Min('price'),
+            price_max=Max('price'),
+            time_min=Min('time_minutes'),
+            time_max=Max('time_minutes'),
+        )
+
+
+def _top(model, user_id, top):
+    return list(
+        model.objects
+        .filter(user_id=user_id, recipe_count__gt=0)
+        .order_by('-recipe_count', 'id')
+        .values('id', 'name', 'recipe_count')[:top]
+    )
+
+
+def _by_count(counts):
+    """Group the ids of {id: count} by count, leaving out zeros"""
+    by_count = {}
+    for pk, count in Counter(counts).items():
+        if count:
+            by_count.setdefault(count, []).append(pk)
+    return by_count
+
+
+def _min(current, value):
+    return value if current is None else min(current, value)
+
+
+def _max(current, value):
+    return value if current is None else max(current, value)
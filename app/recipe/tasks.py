@@ -0,0 +1,9 @@
+from jobs.queue import task
+from recipe.images import generate_variants
+
+
+@task('recipe.generate_image_variants')
+def generate_image_variants(recipe_id, image_name):
+    """Render and record the variants of a recipe image"""
+    variants = generate_variants(recipe_id, image_name)
+    return {'variants': [variant.name for variant in variants]}
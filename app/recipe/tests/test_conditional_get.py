@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+User = get_user_model()
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def recipe_detail(id):
+    return reverse('recipe:recipe-detail', args=[id])
+
+
+def sample_recipe(user, **payload):
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(**payload)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalGetTests(TestCase):
+    """Test ETag / If-None-Match handling of the recipe API"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('user@hosseindev.ir', 'pass')
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_list_returns_not_modified(self):
+        """Test repeating a GET with its ETag returns an empty 304"""
+        sample_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', res)
+        self.assertEqual(res['Vary'], 'Accept, Authorization')
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_writes_change_etag(self):
+        """Test recipe, tag and relation writes produce a new ETag"""
+        recipe = sample_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        new_etag = self.client.get(RECIPES_URL)['ETag']
+        self.assertNotEqual(etag, new_etag)
+
+        recipe.tags.add(tag)
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=new_etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['tags'], [tag.id])
+
+        etag = res['ETag']
+        self.client.patch(recipe_detail(recipe.id), {'title': 'New title'})
+        res = self.client.get(recipe_detail(recipe.id),
+                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_etag_depends_on_query_and_user(self):
+        """Test different filters and users never share an ETag"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        res = self.client.get(
+            TAGS_URL, {'assigned_only': 1}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        other = User.objects.create_user('other@hosseindev.ir', 'pass')
+        self.client.force_authenticate(other)
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    def test_missing_recipe_has_no_etag(self):
+        """Test error responses are not tagged"""
+        res = self.client.get(recipe_detail(999))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('ETag', res)
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.export import iter_recipes
+
+User = get_user_model()
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def sample_recipe(user, **payload):
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(**payload)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeExportTests(TestCase):
+    """Test streaming exports of a user's recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('user@hosseindev.ir', 'pass')
+        self.client.force_authenticate(self.user)
+        self.recipe = sample_recipe(user=self.user, title='Tofu curry')
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Tofu'),
+            Ingredient.objects.create(user=self.user, name='Rice'),
+        )
+        sample_recipe(user=self.user, title='Toast', link='http://x.io')
+        other = User.objects.create_user('other@hosseindev.ir', 'pass')
+        sample_recipe(user=other, title='Not mine')
+
+    def test_export_ndjson(self):
+        """Test the default export streams one JSON recipe per line"""
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        recipes = [json.loads(line) for line in lines]
+
+        self.assertEqual(len(recipes), 2)
+        self.assertEqual(recipes[0], {
+            'id': self.recipe.id,
+            'title': 'Tofu curry',
+            'time_minutes': 10,
+            'price': '5.00',
+            'link': '',
+            'tags': ['Vegan'],
+            'ingredients': ['Tofu', 'Rice'],
+        })
+        self.assertEqual(recipes[1]['link'], 'http://x.io')
+
+    def test_export_csv(self):
+        """Test exporting as CSV with joined tag and ingredient names"""
+        res = self.client.get(EXPORT_URL, {'export_format': 'csv'})
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['title'], 'Tofu curry')
+        self.assertEqual(rows[0]['ingredients'], 'Tofu|Rice')
+        self.assertEqual(rows[1]['tags'], '')
+
+    def test_export_invalid_format(self):
+        """Test an unknown export format is rejected"""
+        res = self.client.get(EXPORT_URL, {'export_format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_relations_loaded_once_per_chunk(self):
+        """Test export queries grow with chunks, not with recipes"""
+        for i in range(8):
+            sample_recipe(user=self.user, title=f'Recipe {i}')
+        recipes = Recipe.objects.filter(user=self.user)
+
+        # one recipe query, then tags + ingredients for each of 3 chunks
+        with self.assertNumQueries(1 + 2 * 3):
+            exported = list(iter_recipes(recipes, chunk_size=4))
+
+        self.assertEqual(len(exported), 10)
@@ -0,0 +1,138 @@
+import shutil
+import struct
+import tempfile
+import tracemalloc
+import zlib
+from unittest.mock import patch
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+User = get_user_model()
+
+# Far below the hundreds of MB a decoded large image would take
+PEAK_MEMORY_BUDGET = 10 * 1024 * 1024
+
+
+def image_upload_url(recipe_id):
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def write_png(fileobj, width, height, rows=None):
+    """Write a black grayscale PNG one row at a time
+
+    Only ``rows`` rows of pixel data are written when given, which makes
+    a truncated file whose header still claims the full size.
+    """
+    def chunk(kind, data):
+        fileobj.write(struct.pack('>I', len(data)) + kind + data)
+        fileobj.write(struct.pack('>I', zlib.crc32(kind + data)))
+
+    fileobj.write(b'\x89PNG\r\n\x1a\n')
+    chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0))
+    compressor = zlib.compressobj(9)
+    row = bytes(width + 1)
+    data = [compressor.compress(row) for _ in range(rows or height)]
+    data.append(compressor.flush())
+    chunk(b'IDAT', b''.join(data))
+    chunk(b'IEND', b'')
+    fileobj.seek(0)
+
+
+class RecipeImageValidationTests(TestCase):
+    """Test uploads are validated from the image header only"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user('user@hosseindev.ir', 'pass')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5
+        )
+
+    def upload(self, image_file):
+        return self.client.post(
+            image_upload_url(self.recipe.id), {'image': image_file},
+            format='multipart'
+        )
+
+    def measure_upload(self, image_file):
+        """Upload image_file, returning (response, peak traced bytes)"""
+        tracemalloc.start()
+        try:
+            with patch.object(Image.Image, 'load',
+                              side_effect=AssertionError('decoded')):
+                res = self.upload(image_file)
+            return res, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_huge_image_rejected_without_decoding(self):
+        """Test a 20000x20000 image is refused from its header"""
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            write_png(ntf, 20000, 20000, rows=10)
+
+            res, peak = self.measure_upload(ntf)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', str(res.data['image']))
+        self.assertLess(peak, PEAK_MEMORY_BUDGET)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_large_image_accepted_with_bounded_memory(self):
+        """Test a 6000x6000 image is accepted without being loaded"""
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            write_png(ntf, 6000, 6000)
+
+            res, peak = self.measure_upload(ntf)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertLess(peak, PEAK_MEMORY_BUDGET)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith('.png'))
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=100)
+    def test_max_bytes(self):
+        """Test files above the byte limit are rejected"""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (50, 50), 'red').save(ntf, format='JPEG')
+            ntf.seek(0)
+
+            res = self.upload(ntf)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('bytes', str(res.data['image']))
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=99)
+    def test_max_pixels(self):
+        """Test images above the pixel limit are rejected"""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='JPEG')
+            ntf.seek(0)
+
+            res = self.upload(ntf)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unsupported_format_rejected(self):
+        """Test images in formats we don't serve are rejected"""
+        with tempfile.NamedTemporaryFile(suffix='.bmp') as ntf:
+            Image.new('RGB', (10, 10)).save(ntf, format='BMP')
+            ntf.seek(0)
+
+            res = self.upload(ntf)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
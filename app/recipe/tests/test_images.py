@@ -0,0 +1,205 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, RecipeImageVariant, Job
+from jobs.queue import claim, run_job
+from recipe.images import process_image, generate_variants
+
+User = get_user_model()
+
+
+def image_upload_url(recipe_id):
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def recipe_detail(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+@override_settings(RECIPE_IMAGE_PROCESSING='sync')
+class RecipeImageVariantTests(TestCase):
+    """Test generating resized variants of uploaded recipe images"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(
+            MEDIA_ROOT=media_root, IMAGE_STORAGE_DELETE_GRACE=0
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user('user@hosseindev.ir', 'pass')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=10, price=5
+        )
+
+    def upload(self, size=(1200, 900), mode='RGB', exif=None):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            image = Image.new(mode, size)
+            options = {'exif': exif.tobytes()} if exif is not None else {}
+            image.save(ntf, format='JPEG', **options)
+            ntf.seek(0)
+            return self.client.post(
+                image_upload_url(self.recipe.id), {'image': ntf},
+                format='multipart'
+            )
+
+    def variant_sizes(self):
+        return {
+            variant.name: (variant.width, variant.height)
+            for variant in RecipeImageVariant.objects.filter(
+                recipe=self.recipe
+            )
+        }
+
+    def test_upload_generates_variants(self):
+        """Test uploading an image stores resized copies"""
+        res = self.upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.variant_sizes(), {
+            'thumbnail': (200, 150),
+            'medium': (800, 600),
+            'original': (1200, 900),
+        })
+        for variant in RecipeImageVariant.objects.all():
+            self.assertTrue(os.path.exists(variant.file.path))
+            with Image.open(variant.file.path) as image:
+                self.assertEqual(image.format, 'JPEG')
+
+    @override_settings(RECIPE_IMAGE_WEBP=True)
+    def test_webp_variants(self):
+        """Test WebP copies are added when enabled"""
+        self.upload()
+
+        variant = RecipeImageVariant.objects.get(name='thumbnail_webp')
+        self.assertTrue(variant.file.name.endswith('.webp'))
+        self.assertEqual(len(self.variant_sizes()), 6)
+
+    def test_rotated_image_transposed(self):
+        """Test the EXIF orientation is applied to every variant"""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        self.upload(exif=exif)
+
+        self.assertEqual(self.variant_sizes(), {
+            'thumbnail': (150, 200),
+            'medium': (600, 800),
+            'original': (900, 1200),
+        })
+
+    def test_grayscale_image_converted(self):
+        """Test images in other modes are stored as RGB"""
+        self.upload(mode='L')
+
+        for variant in RecipeImageVariant.objects.all():
+            with Image.open(variant.file.path) as image:
+                self.assertEqual(image.mode, 'RGB')
+
+    def test_small_image_not_upscaled(self):
+        """Test images smaller than a variant keep their size"""
+        self.upload(size=(100, 50))
+
+        self.assertEqual(self.variant_sizes()['thumbnail'], (100, 50))
+
+    def test_reupload_replaces_variants(self):
+        """Test a new upload replaces the variants and their files"""
+        self.upload()
+        old_paths = [
+            variant.file.path for variant in RecipeImageVariant.objects.all()
+        ]
+
+        self.upload(size=(400, 400))
+
+        self.assertEqual(self.variant_sizes()['medium'], (400, 400))
+        self.assertEqual(RecipeImageVariant.objects.count(), 3)
+        for path in old_paths:
+            self.assertFalse(os.path.exists(path))
+
+    def test_identical_uploads_share_files(self):
+        """Test the same photo on two recipes is stored once"""
+        self.upload()
+        first = self.recipe
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=10, price=5
+        )
+
+        self.upload()
+
+        first.refresh_from_db()
+        self.recipe.refresh_from_db()
+        self.assertEqual(first.image.name, self.recipe.image.name)
+        self.assertEqual(RecipeImageVariant.objects.count(), 6)
+        self.assertEqual(
+            RecipeImageVariant.objects.values('file').distinct().count(), 3
+        )
+
+    def test_reupload_releases_previous_image(self):
+        """Test the replaced image is deleted once unreferenced"""
+        self.upload()
+        self.recipe.refresh_from_db()
+        previous = self.recipe.image.path
+
+        self.upload(size=(300, 300))
+
+        self.assertFalse(os.path.exists(previous))
+
+    def test_variants_in_detail(self):
+        """Test the recipe detail links to every variant"""
+        self.upload()
+
+        res = self.client.get(recipe_detail(self.recipe.id))
+
+        variants = res.data['image_variants']
+        self.assertEqual(
+            list(variants), ['medium', 'original', 'thumbnail']
+        )
+        self.assertTrue(variants['thumbnail'].startswith('http://testserver'))
+
+    def test_stale_image_ignored(self):
+        """Test variants of a replaced image are not recorded"""
+        self.upload()
+        source = self.recipe.image_variants.get(name='original').file.name
+
+        variants = generate_variants(self.recipe.id, source)
+
+        self.assertEqual(variants, [])
+        self.assertEqual(RecipeImageVariant.objects.count(), 3)
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='thread')
+    def test_thread_mode_submits_after_commit(self):
+        """Test thread mode hands the work to the pool on commit"""
+        self.recipe.image = 'uploads/recipe/curry.jpg'
+        with patch('recipe.images.transaction.on_commit') as on_commit, \
+                patch('recipe.images.executor') as executor:
+            process_image(self.recipe)
+            executor.return_value.submit.assert_not_called()
+            on_commit.call_args[0][0]()
+
+        _, recipe_id, image_name = executor.return_value.submit.call_args[0]
+        self.assertEqual(recipe_id, self.recipe.id)
+        self.assertEqual(image_name, 'uploads/recipe/curry.jpg')
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='queue')
+    def test_queue_mode_stores_job(self):
+        """Test queue mode leaves the work to the job worker"""
+        res = self.upload()
+
+        job = Job.objects.get(id=res.data['job'])
+        self.assertEqual(job.user, self.user)
+        self.assertFalse(RecipeImageVariant.objects.exists())
+
+        self.assertEqual(run_job(*claim(1)[0]), Job.DONE)
+        self.assertEqual(RecipeImageVariant.objects.count(), 3)
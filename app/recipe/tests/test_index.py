@@ -0,0 +1,175 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.index import RecipeFilterIndex
+from recipe.versions import get_version, bump_version
+
+User = get_user_model()
+
+
+def sample_recipe(user, title='Sample recipe'):
+    return Recipe.objects.create(
+        user=user,
+        title=title,
+        time_minutes=10,
+        price=5.00
+    )
+
+
+class RecipeFilterIndexTests(TestCase):
+    """Test the per-user inverted index used to filter recipes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('user@hosseindev.ir', 'pass')
+        self.index = RecipeFilterIndex(max_users=2)
+        self.tag_1 = Tag.objects.create(user=self.user, name='Vegan')
+        self.tag_2 = Tag.objects.create(user=self.user, name='Dessert')
+        self.ingredient = Ingredient.objects.create(
+            user=self.user, name='Sugar'
+        )
+        self.recipe_1 = sample_recipe(self.user, 'Cake')
+        self.recipe_2 = sample_recipe(self.user, 'Curry')
+        self.recipe_1.tags.add(self.tag_1, self.tag_2)
+        self.recipe_1.ingredients.add(self.ingredient)
+        self.recipe_2.tags.add(self.tag_1)
+
+    def test_match_any_and_all(self):
+        """Test OR and AND combinations of tag ids"""
+        tag_ids = [self.tag_1.id, self.tag_2.id]
+
+        self.assertEqual(
+            self.index.recipe_ids(self.user.id, tag_ids=tag_ids),
+            {self.recipe_1.id, self.recipe_2.id}
+        )
+        self.assertEqual(
+            self.index.recipe_ids(self.user.id, tag_ids=tag_ids,
+                                  match='all'),
+            {self.recipe_1.id}
+        )
+
+    def test_unknown_ids_match_nothing(self):
+        """Test ids without recipes produce an empty result"""
+        self.assertEqual(
+            self.index.recipe_ids(self.user.id, tag_ids=[999]),
+            set()
+        )
+        self.assertEqual(
+            self.index.recipe_ids(
+                self.user.id,
+                tag_ids=[self.tag_1.id, 999],
+                match='all'
+            ),
+            set()
+        )
+
+    def test_entry_rebuilt_after_write(self):
+        """Test M2M writes and deletes bump the version and the index"""
+        version = get_version(self.user.id)
+        self.index.recipe_ids(self.user.id, tag_ids=[self.tag_2.id])
+
+        self.recipe_2.tags.add(self.tag_2)
+        self.assertNotEqual(get_version(self.user.id), version)
+        self.assertEqual(
+            self.index.recipe_ids(self.user.id, tag_ids=[self.tag_2.id]),
+            {self.recipe_1.id, self.recipe_2.id}
+        )
+
+        self.recipe_1.delete()
+        self.assertEqual(
+            self.index.recipe_ids(self.user.id, tag_ids=[self.tag_2.id]),
+            {self.recipe_2.id}
+        )
+
+    def test_limit_exceeded(self):
+        """Test None is returned for matches known to exceed the limit"""
+        self.assertIsNone(
+            self.index.recipe_ids(self.user.id, tag_ids=[self.tag_1.id],
+                                  limit=1)
+        )
+        self.assertEqual(
+            self.index.recipe_ids(self.user.id, tag_ids=[self.tag_2.id],
+                                  limit=1),
+            {self.recipe_1.id}
+        )
+
+    def test_entry_caught_up_after_link_writes(self):
+        """Test link writes are replayed on the entry, not rebuilt"""
+        tag_ids = [self.tag_1.id, self.tag_2.id]
+        self.index.recipe_ids(self.user.id, tag_ids=tag_ids)
+        recipe_3 = sample_recipe(self.user, 'Soup')
+        tag_3 = Tag.objects.create(user=self.user, name='Warm')
+
+        with patch.object(self.index, 'build_entry') as build_entry:
+            recipe_3.tags.add(self.tag_2)
+            self.tag_1.recipe_set.add(recipe_3)
+            self.assertEqual(
+                self.index.recipe_ids(self.user.id, tag_ids=tag_ids),
+                {self.recipe_1.id, self.recipe_2.id, recipe_3.id}
+            )
+
+            self.recipe_1.tags.remove(self.tag_1)
+            self.tag_2.recipe_set.clear()
+            tag_3.recipe_set.add(self.recipe_2)
+            self.assertEqual(
+                self.index.recipe_ids(self.user.id, tag_ids=tag_ids),
+                {self.recipe_2.id, recipe_3.id}
+            )
+
+            self.recipe_2.tags.clear()
+            recipe_3.delete()
+            self.ingredient.delete()
+            self.assertEqual(
+                self.index.recipe_ids(
+                    self.user.id, tag_ids=[self.tag_1.id, tag_3.id]
+                ),
+                set()
+            )
+            self.assertEqual(
+                self.index.recipe_ids(
+                    self.user.id, ingredient_ids=[self.ingredient.id]
+                ),
+                set()
+            )
+
+        build_entry.assert_not_called()
+
+    def test_entry_kept_on_other_writes(self):
+        """Test writes leaving links alone don't invalidate the entry"""
+        self.index.recipe_ids(self.user.id, tag_ids=[self.tag_1.id])
+
+        self.tag_1.name = 'Plant based'
+        self.tag_1.save()
+        self.recipe_1.title = 'Carrot cake'
+        self.recipe_1.save()
+
+        with self.assertNumQueries(1):
+            self.index.recipe_ids(self.user.id, tag_ids=[self.tag_1.id])
+
+    def test_entry_rebuilt_after_unrecorded_change(self):
+        """Test bumps without recorded changes, like bulk writes, rebuild"""
+        self.index.recipe_ids(self.user.id, tag_ids=[self.tag_1.id])
+        Recipe.tags.through.objects.create(
+            recipe=self.recipe_2, tag=self.tag_2
+        )
+        bump_version(self.user.id)
+
+        self.assertEqual(
+            self.index.recipe_ids(self.user.id, tag_ids=[self.tag_2.id]),
+            {self.recipe_1.id, self.recipe_2.id}
+        )
+
+    def test_least_recently_used_users_evicted(self):
+        """Test the index only keeps max_users entries"""
+        for i in range(3):
+            user = User.objects.create_user(f'user{i}@hosseindev.ir', 'pass')
+            self.index.recipe_ids(user.id, tag_ids=[1])
+
+        self.assertEqual(len(self.index._entries), 2)
+
+    def test_invalid_match_mode(self):
+        """Test an unknown match mode raises ValueError"""
+        with self.assertRaises(ValueError):
+            self.index.recipe_ids(self.user.id, tag_ids=[1], match='some')
@@ -9,6 +9,7 @@ from recipe.serializers import IngredientSerializer
 
 User = get_user_model()
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+INGREDIENTS_BULK_URL = reverse('recipe:ingredient-bulk-get-or-create')
 
 
 class PublicIngredientsAPITest(TestCase):
@@ -161,3 +162,33 @@ class PrivateIngredientsAPITest(TestCase):
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_bulk_get_or_create_ingredients(self):
+        """Test bulk ingredient names are deduplicated and created once"""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+
+        res = self.client.post(
+            INGREDIENTS_BULK_URL,
+            {'names': ['salt', 'Pepper', 'pepper']},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0], {'id': salt.id, 'name': 'Salt'})
+        self.assertEqual(res.data[1], res.data[2])
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_ingredient_recipe_count(self):
+        """Test ingredients show how many recipes use them"""
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Fries', time_minutes=5, price=1
+        )
+        recipe.ingredients.add(ingredient)
+
+        res = self.client.get(INGREDIENTS_URL, {'ordering': 'popular'})
+        self.assertEqual(res.data[0]['recipe_count'], 1)
+
+        recipe.delete()
+        res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
+        self.assertEqual(res.data, [])
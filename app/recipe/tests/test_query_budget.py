@@ -0,0 +1,139 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import response_cache
+
+User = get_user_model()
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def recipe_detail(id):
+    return reverse('recipe:recipe-detail', args=[id])
+
+
+def create_recipes(user, count, tags_per_recipe=2, ingredients_per_recipe=2):
+    """Create recipes each linked to their own tags and ingredients"""
+    recipes = []
+    for i in range(count):
+        recipe = Recipe.objects.create(
+            user=user,
+            title=f'Recipe {i}',
+            time_minutes=10,
+            price=5.00,
+        )
+        for j in range(tags_per_recipe):
+            recipe.tags.add(
+                Tag.objects.create(user=user, name=f'Tag {i}-{j}')
+            )
+        for j in range(ingredients_per_recipe):
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=user, name=f'Ing {i}-{j}')
+            )
+        recipes.append(recipe)
+
+    return recipes
+
+
+class QueryBudgetTests(TestCase):
+    """Pin the number of queries each endpoint is allowed to run"""
+
+    # version + recipes + tags prefetch + ingredients prefetch
+    RECIPE_LIST_BUDGET = 4
+    # the filter index reuses the version, once it is warm
+    FILTERED_RECIPE_LIST_BUDGET = 4
+    # version + recipe + tags + ingredients + image variants
+    RECIPE_DETAIL_BUDGET = 5
+    ATTR_LIST_BUDGET = 2
+    # only the collection version is read
+    NOT_MODIFIED_BUDGET = 1
+    CACHED_LIST_BUDGET = 1
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            'user@hosseindev.ir',
+            'testpass',
+        )
+        self.client.force_authenticate(self.user)
+        response_cache.reset()
+
+    def test_recipe_list_budget_independent_of_size(self):
+        """Test listing recipes runs a constant number of queries"""
+        for count in (1, 5, 20):
+            for model in (Recipe, Tag, Ingredient):
+                model.objects.all().delete()
+            create_recipes(self.user, count)
+
+            with self.assertNumQueries(self.RECIPE_LIST_BUDGET):
+                res = self.client.get(RECIPES_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(res.data), count)
+
+    def test_filtered_recipe_list_budget(self):
+        """Test filtering recipes does not add per-recipe queries"""
+        recipes = create_recipes(self.user, 10)
+        tag_ids = ','.join(
+            str(tag.id) for tag in Tag.objects.filter(name__endswith='-0')
+        )
+
+        self.client.get(RECIPES_URL, {'tags': tag_ids})
+        response_cache.reset()
+        with self.assertNumQueries(self.FILTERED_RECIPE_LIST_BUDGET):
+            res = self.client.get(RECIPES_URL, {'tags': tag_ids})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), len(recipes))
+
+    def test_recipe_detail_budget(self):
+        """Test retrieving a recipe loads its relations in fixed queries"""
+        recipe = create_recipes(
+            self.user, 1, tags_per_recipe=10, ingredients_per_recipe=10
+        )[0]
+
+        with self.assertNumQueries(self.RECIPE_DETAIL_BUDGET):
+            res = self.client.get(recipe_detail(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 10)
+        self.assertEqual(len(res.data['ingredients']), 10)
+
+    def test_tag_and_ingredient_list_budget(self):
+        """Test listing tags and ingredients is a single query"""
+        create_recipes(self.user, 10)
+
+        for url in (TAGS_URL, INGREDIENTS_URL):
+            with self.assertNumQueries(self.ATTR_LIST_BUDGET):
+                res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            with self.assertNumQueries(self.ATTR_LIST_BUDGET):
+                res = self.client.get(url, {'assigned_only': 1})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_cached_list_budget(self):
+        """Test a cached list response only reads the version"""
+        create_recipes(self.user, 5)
+
+        for url in (RECIPES_URL, TAGS_URL, INGREDIENTS_URL):
+            self.client.get(url)
+            with self.assertNumQueries(self.CACHED_LIST_BUDGET):
+                res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_not_modified_budget(self):
+        """Test a conditional GET hit skips the queryset entirely"""
+        recipe = create_recipes(self.user, 5)[0]
+
+        for url in (RECIPES_URL, recipe_detail(recipe.id), TAGS_URL):
+            etag = self.client.get(url)['ETag']
+            with self.assertNumQueries(self.NOT_MODIFIED_BUDGET):
+                res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -1,17 +1,22 @@
 import tempfile
 import os
+from unittest import skipUnless
+
 from PIL import Image
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIClient
+from rest_framework.test import APIClient, APIRequestFactory
 
 from core.models import Recipe, Tag, Ingredient
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 User = get_user_model()
 RECIPES_URL = reverse('recipe:recipe-list')
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk-create')
 
 
 def image_upload_url(recipe_id):
@@ -178,6 +183,47 @@ class PrivateRecipeAPITest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertFalse(exists)
 
+    def test_create_recipe_with_other_users_tag(self):
+        """Test that tags of another user are rejected"""
+        other = User.objects.create_user('other@hosseindev.ir', 'testpass')
+        tag = sample_tag(user=other, name='Vegan')
+        payload = {
+            'title': 'Avocado lime cheesecake',
+            'tags': [tag.id],
+            'time_minutes': 60,
+            'price': 20.00
+        }
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_related_ids_validated_in_one_query_each(self):
+        """Test validating many tags and ingredients takes two queries"""
+        tags = [sample_tag(user=self.user, name=f'Tag {i}') for i in range(50)]
+        ingredients = [
+            sample_ingredient(user=self.user, name=f'Ingredient {i}')
+            for i in range(50)
+        ]
+        request = APIRequestFactory().post(RECIPES_URL)
+        request.user = self.user
+        serializer = RecipeSerializer(
+            data={
+                'title': 'Everything soup',
+                'time_minutes': 30,
+                'price': 9.00,
+                'tags': [tag.id for tag in tags],
+                'ingredients': [item.id for item in ingredients],
+            },
+            context={'request': request}
+        )
+
+        with self.assertNumQueries(2):
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data['tags'], tags)
+
     def test_partial_update_recipe(self):
         """Test updating a recipe with PATCH"""
         recipe = sample_recipe(user=self.user)
@@ -272,6 +318,326 @@ class PrivateRecipeAPITest(TestCase):
         self.assertIn(serializer_recipe_2.data, res.data)
         self.assertNotIn(serializer_recipe_3.data, res.data)
 
+    def test_filter_recipes_matching_multiple_tags_is_unique(self):
+        """Test a recipe matching several tags is only returned once"""
+        tag_1 = sample_tag(user=self.user, name='Vegan')
+        tag_2 = sample_tag(user=self.user, name='Dessert')
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(tag_1, tag_2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag_1.id},{tag_2.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    def test_filter_recipes_matching_all_tags(self):
+        """Test match=all only returns recipes having every tag"""
+        tag_1 = sample_tag(user=self.user, name='Vegan')
+        tag_2 = sample_tag(user=self.user, name='Dessert')
+        recipe_1 = sample_recipe(user=self.user, title='Vegan cake')
+        recipe_2 = sample_recipe(user=self.user, title='Vegan curry')
+        recipe_1.tags.add(tag_1, tag_2)
+        recipe_2.tags.add(tag_1)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'tags': f'{tag_1.id},{tag_2.id}', 'match': 'all'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [recipe_1.id])
+
+    def test_filter_recipes_by_tags_and_ingredients(self):
+        """Test tag and ingredient filters must both match"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        ingredient = sample_ingredient(user=self.user, name='Tofu')
+        recipe_1 = sample_recipe(user=self.user, title='Tofu stir fry')
+        recipe_2 = sample_recipe(user=self.user, title='Salad')
+        recipe_1.tags.add(tag)
+        recipe_1.ingredients.add(ingredient)
+        recipe_2.tags.add(tag)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'tags': f'{tag.id}', 'ingredients': f'{ingredient.id}'}
+        )
+
+        self.assertEqual([item['id'] for item in res.data], [recipe_1.id])
+
+    @override_settings(RECIPE_INDEX_MAX_IDS=1)
+    def test_filter_recipes_large_match_in_sql(self):
+        """Test matches too large to list as ids are filtered in SQL"""
+        tag_1 = sample_tag(user=self.user, name='Vegan')
+        tag_2 = sample_tag(user=self.user, name='Dessert')
+        ingredient = sample_ingredient(user=self.user, name='Sugar')
+        recipe_1 = sample_recipe(user=self.user, title='Vegan cake')
+        recipe_2 = sample_recipe(user=self.user, title='Vegan pie')
+        recipe_3 = sample_recipe(user=self.user, title='Curry')
+        recipe_1.tags.add(tag_1, tag_2)
+        recipe_2.tags.add(tag_1, tag_2)
+        recipe_3.tags.add(tag_1)
+        recipe_1.ingredients.add(ingredient)
+        recipe_3.ingredients.add(ingredient)
+        tags = f'{tag_1.id},{tag_2.id}'
+
+        res = self.client.get(RECIPES_URL, {'tags': tags})
+        self.assertEqual(
+            [item['id'] for item in res.data],
+            [recipe_3.id, recipe_2.id, recipe_1.id]
+        )
+
+        res = self.client.get(RECIPES_URL, {'tags': tags, 'match': 'all'})
+        self.assertEqual(
+            [item['id'] for item in res.data], [recipe_2.id, recipe_1.id]
+        )
+
+        res = self.client.get(
+            RECIPES_URL, {'tags': tags, 'ingredients': f'{ingredient.id}'}
+        )
+        self.assertEqual(
+            [item['id'] for item in res.data], [recipe_3.id, recipe_1.id]
+        )
+
+    def test_filter_recipes_reflects_tag_changes(self):
+        """Test the filter sees tags added or removed after a lookup"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        recipe = sample_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag.id}'})
+        self.assertEqual(len(res.data), 0)
+
+        self.client.patch(recipe_detail(recipe.id), {'tags': [tag.id]})
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag.id}'})
+        self.assertEqual(len(res.data), 1)
+
+        recipe.tags.remove(tag)
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag.id}'})
+        self.assertEqual(len(res.data), 0)
+
+    def test_filter_recipes_invalid_match(self):
+        """Test an unknown match mode is rejected"""
+        tag = sample_tag(user=self.user)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'tags': f'{tag.id}', 'match': 'some'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes_by_title(self):
+        """Test searching recipes returns the ones with matching titles"""
+        recipe_1 = sample_recipe(user=self.user, title='Chocolate cake')
+        sample_recipe(user=self.user, title='Fish and chips')
+
+        res = self.client.get(RECIPES_URL, {'search': 'chocolate'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [recipe_1.id])
+
+    def test_search_recipes_matches_tags_and_ingredients(self):
+        """Test search also matches tag and ingredient names"""
+        recipe_1 = sample_recipe(user=self.user, title='Weeknight dinner')
+        recipe_2 = sample_recipe(user=self.user, title='Sunday lunch')
+        sample_recipe(user=self.user, title='Fish and chips')
+        recipe_1.tags.add(sample_tag(user=self.user, name='Vegan'))
+        recipe_2.ingredients.add(
+            sample_ingredient(user=self.user, name='Vegan cheese')
+        )
+
+        res = self.client.get(RECIPES_URL, {'search': 'vegan'})
+
+        self.assertEqual(
+            {item['id'] for item in res.data},
+            {recipe_1.id, recipe_2.id}
+        )
+
+    def test_search_ranks_title_matches_first(self):
+        """Test a title match ranks above a tag match"""
+        tagged = sample_recipe(user=self.user, title='Weeknight dinner')
+        tagged.tags.add(sample_tag(user=self.user, name='Curry'))
+        titled = sample_recipe(user=self.user, title='Curry')
+
+        res = self.client.get(RECIPES_URL, {'search': 'curry'})
+
+        self.assertEqual(
+            [item['id'] for item in res.data],
+            [titled.id, tagged.id]
+        )
+
+    def test_search_reflects_title_changes(self):
+        """Test search sees recipes renamed after a lookup"""
+        recipe = sample_recipe(user=self.user, title='Pancakes')
+
+        res = self.client.get(RECIPES_URL, {'search': 'waffles'})
+        self.assertEqual(len(res.data), 0)
+
+        self.client.patch(recipe_detail(recipe.id), {'title': 'Waffles'})
+        res = self.client.get(RECIPES_URL, {'search': 'waffles'})
+        self.assertEqual(len(res.data), 1)
+
+    def test_search_limited_to_user_and_filters(self):
+        """Test search is scoped to the user and combines with filters"""
+        other = User.objects.create_user('other@hosseindev.ir', 'testpass')
+        sample_recipe(user=other, title='Lemon tart')
+        tag = sample_tag(user=self.user, name='Dessert')
+        recipe_1 = sample_recipe(user=self.user, title='Lemon tart')
+        sample_recipe(user=self.user, title='Lemon chicken')
+        recipe_1.tags.add(tag)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'search': 'lemon', 'tags': f'{tag.id}'}
+        )
+
+        self.assertEqual([item['id'] for item in res.data], [recipe_1.id])
+
+    def test_search_rejects_pagination(self):
+        """Test search combined with page_size or cursor is a 400"""
+        sample_recipe(user=self.user, title='Lemon tart')
+
+        for params in ({'page_size': 1}, {'cursor': 'abc'}):
+            with self.subTest(params=params):
+                res = self.client.get(
+                    RECIPES_URL, {'search': 'lemon', **params}
+                )
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn('search', res.data)
+
+    def test_paginate_recipes_with_cursor(self):
+        """Test walking the recipe list page by page with a cursor"""
+        recipes = [
+            sample_recipe(user=self.user, title=f'Recipe {i}')
+            for i in range(5)
+        ]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertIsNone(res.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [recipes[4].id, recipes[3].id]
+        )
+
+        seen = [item['id'] for item in res.data['results']]
+        next_url = res.data['next']
+        while next_url:
+            res = self.client.get(next_url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen.extend(item['id'] for item in res.data['results'])
+            next_url = res.data['next']
+
+        self.assertEqual(seen, [recipe.id for recipe in reversed(recipes)])
+
+    def test_paginated_recipes_skip_count_query(self):
+        """Test a recipe page is fetched without counting all rows"""
+        for i in range(3):
+            sample_recipe(user=self.user, title=f'Recipe {i}')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(len(res.data['results']), 2)
+        for query in queries:
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_invalid_cursor_returns_404(self):
+        """Test that a tampered cursor is rejected"""
+        res = self.client.get(RECIPES_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_create_recipes(self):
+        """Test creating several recipes with relations in one request"""
+        tag = sample_tag(user=self.user, name='Vegan')
+        ingredient = sample_ingredient(user=self.user, name='Tofu')
+        payload = [
+            {'title': 'Tofu curry', 'time_minutes': 30, 'price': '7.50',
+             'tags': [tag.id], 'ingredients': [ingredient.id]},
+            {'title': 'Plain rice', 'time_minutes': 15, 'price': '1.00'},
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [item['title'] for item in res.data],
+            ['Tofu curry', 'Plain rice']
+        )
+        curry = Recipe.objects.get(id=res.data[0]['id'])
+        self.assertEqual(list(curry.tags.all()), [tag])
+        self.assertEqual(list(curry.ingredients.all()), [ingredient])
+        self.assertEqual(res.data[1]['tags'], [])
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag.id}'})
+        self.assertEqual([item['id'] for item in res.data], [curry.id])
+
+    def test_bulk_create_reports_errors_per_item(self):
+        """Test one invalid item rejects the whole batch"""
+        other = User.objects.create_user('other@hosseindev.ir', 'testpass')
+        other_tag = sample_tag(user=other, name='Not mine')
+        payload = [
+            {'title': 'Valid', 'time_minutes': 10, 'price': '1.00'},
+            {'title': 'Foreign tag', 'time_minutes': 10, 'price': '1.00',
+             'tags': [other_tag.id]},
+            {'title': 'No time', 'price': '1.00'},
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('time_minutes', res.data[2])
+        self.assertFalse(Recipe.objects.exists())
+
+        res = self.client.post(RECIPES_BULK_URL, payload[:2], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('tags', res.data[1])
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(RECIPE_BULK_MAX_ITEMS=2)
+    def test_bulk_create_limits_batch_size(self):
+        """Test batches larger than the configured limit are rejected"""
+        payload = [
+            {'title': f'Recipe {i}', 'time_minutes': 10, 'price': '1.00'}
+            for i in range(3)
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    @skipUnless(
+        connection.features.can_return_ids_from_bulk_insert,
+        'Needs ids returned from bulk inserts'
+    )
+    def test_bulk_create_query_count_independent_of_size(self):
+        """Test a bulk create runs a fixed number of queries"""
+        tag = sample_tag(user=self.user, name='Vegan')
+
+        def payload(count):
+            return [
+                {'title': f'Recipe {i}', 'time_minutes': 10,
+                 'price': '1.00', 'tags': [tag.id]}
+                for i in range(count)
+            ]
+
+        # The user's first write also creates their stats and version rows
+        self.client.post(RECIPES_BULK_URL, payload(1), format='json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(RECIPES_BULK_URL, payload(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(RECIPES_BULK_URL, payload(50), format='json')
+
+        self.assertEqual(len(small), len(large))
+
 
 class RecipeImageUploadTest(TestCase):
     def setUp(self):
@@ -0,0 +1,136 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.cache import LocalLRUBackend, ResponseCache, response_cache
+
+User = get_user_model()
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def sample_recipe(user, **payload):
+    defaults = {
+        'title': 'Sample Recipe',
+        'time_minutes': 10,
+        'price': 5.00
+    }
+    defaults.update(**payload)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class LocalLRUBackendTests(TestCase):
+    """Test the in-process LRU backend"""
+
+    def test_least_recently_used_evicted(self):
+        """Test the oldest untouched entry is evicted first"""
+        backend = LocalLRUBackend(max_entries=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+
+        self.assertEqual(backend.get('a'), 1)
+        self.assertIsNone(backend.get('b'))
+        self.assertEqual(backend.get('c'), 3)
+
+    def test_evicted_past_max_size(self):
+        """Test entries are evicted once their total size is exceeded"""
+        backend = LocalLRUBackend(max_entries=10, max_size=100)
+        backend.set('a', 1, size=60)
+        backend.set('a', 2, size=60)
+        self.assertEqual(backend.size, 60)
+        backend.set('b', 3, size=60)
+
+        self.assertIsNone(backend.get('a'))
+        self.assertEqual(backend.get('b'), 3)
+        self.assertEqual(backend.size, 60)
+
+
+class ResponseCacheBackendTests(TestCase):
+    """Test how the response cache uses its backend"""
+
+    def test_new_version_replaces_entry(self):
+        """Test a newer version overwrites the entry of an older one"""
+        backend = LocalLRUBackend()
+        cache = ResponseCache(backend)
+        cache.set('key', 1, ['old'])
+        cache.set('key', 2, ['new'])
+
+        self.assertIsNone(cache.get('key', 1))
+        self.assertEqual(cache.get('key', 2), ['new'])
+        self.assertEqual(len(backend._data), 1)
+
+    def test_oversized_response_skipped(self):
+        """Test responses over the entry size limit are not cached"""
+        cache = ResponseCache(LocalLRUBackend(), max_entry_size=1000)
+        cache.set('small', 1, ['x' * 10])
+        cache.set('large', 1, ['x' * 1000])
+
+        self.assertEqual(cache.get('small', 1), ['x' * 10])
+        self.assertIsNone(cache.get('large', 1))
+
+
+class ResponseCacheTests(TestCase):
+    """Test list responses are cached per user and collection version"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('user@hosseindev.ir', 'pass')
+        self.client.force_authenticate(self.user)
+        response_cache.reset()
+
+    def test_repeated_list_is_a_hit(self):
+        """Test the second identical list request is served from cache"""
+        sample_recipe(user=self.user)
+
+        first = self.client.get(RECIPES_URL)
+        second = self.client.get(RECIPES_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(response_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_query_params_are_normalized(self):
+        """Test parameter order does not split cache entries"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        sample_recipe(user=self.user).tags.add(tag)
+
+        self.client.get(f'{RECIPES_URL}?tags={tag.id}&match=all')
+        self.client.get(f'{RECIPES_URL}?match=all&tags={tag.id}')
+
+        self.assertEqual(response_cache.stats()['hits'], 1)
+
+    def test_writes_invalidate_cached_lists(self):
+        """Test creating and relating objects is seen by the next list"""
+        recipe = sample_recipe(user=self.user)
+        self.client.get(TAGS_URL)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.post(TAGS_URL, {'name': 'Vegan'})
+        tag_id = res.data['id']
+        res = self.client.get(TAGS_URL)
+        self.assertEqual([tag['id'] for tag in res.data], [tag_id])
+
+        recipe.tags.add(tag_id)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['tags'], [tag_id])
+
+        self.client.delete(reverse('recipe:tag-detail', args=[tag_id]))
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data, [])
+
+    def test_cache_is_per_user(self):
+        """Test users never see each other's cached lists"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+
+        other = User.objects.create_user('other@hosseindev.ir', 'pass')
+        self.client.force_authenticate(other)
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data, [])
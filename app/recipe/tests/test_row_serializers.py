@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.models import Recipe, Tag, Ingredient, RecipeImageVariant
+from recipe.cache import response_cache
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, \
+    RecipeRowSerializer, RecipeDetailRowSerializer
+from recipe.views import prefetch_relations
+
+User = get_user_model()
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def recipe_detail(id):
+    return reverse('recipe:recipe-detail', args=[id])
+
+
+class RecipeRowSerializerTests(TestCase):
+    """Test the values() based recipe serializers"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('user@hosseindev.ir', 'pass')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Tofu curry', time_minutes=25,
+            price=7.5, link='http://hosseindev.ir/curry',
+            image='uploads/recipe/curry.jpg'
+        )
+        # Created out of id order on purpose
+        rice = Ingredient.objects.create(user=self.user, name='Rice')
+        tofu = Ingredient.objects.create(user=self.user, name='Tofu')
+        self.recipe.ingredients.add(tofu, rice)
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        for name in ('thumbnail', 'medium'):
+            RecipeImageVariant.objects.create(
+                recipe=self.recipe, name=name, width=10, height=10,
+                file=f'uploads/recipe/variants/{name}.jpg'
+            )
+        Recipe.objects.create(
+            user=self.user, title='Toast', time_minutes=2, price=1
+        )
+        self.recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        self.request = APIRequestFactory().get(RECIPES_URL)
+
+    def assertSameJSON(self, fast, slow):
+        render = JSONRenderer().render
+        self.assertEqual(render(fast.data), render(slow.data))
+
+    def test_list_matches_recipe_serializer(self):
+        """Test list rows render to the same JSON as RecipeSerializer"""
+        self.assertSameJSON(
+            RecipeRowSerializer(
+                self.recipes.values(*RecipeRowSerializer.row_fields),
+                many=True
+            ),
+            RecipeSerializer(prefetch_relations(self.recipes), many=True)
+        )
+
+    def test_detail_matches_recipe_detail_serializer(self):
+        """Test detail rows render the same JSON, image URL included"""
+        context = {'request': self.request}
+        row = self.recipes.values(
+            *RecipeDetailRowSerializer.row_fields
+        ).get(id=self.recipe.id)
+
+        self.assertSameJSON(
+            RecipeDetailRowSerializer(row, context=context),
+            RecipeDetailSerializer(
+                prefetch_relations(self.recipes).get(id=self.recipe.id),
+                context=context
+            )
+        )
+
+    def test_api_responses_unchanged(self):
+        """Test list and detail responses are identical on the fast path"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        urls = (
+            RECIPES_URL,
+            RECIPES_URL + '?page_size=1',
+            recipe_detail(self.recipe.id),
+        )
+
+        for url in urls:
+            response_cache.reset()
+            slow = client.get(url)
+            response_cache.reset()
+            with override_settings(RECIPE_FAST_SERIALIZATION=True):
+                fast = client.get(url)
+
+            self.assertEqual(fast.content, slow.content, url)
@@ -0,0 +1,240 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient, RecipeStats
+from recipe.bulk import delete_collections
+from recipe.stats import rebuild_stats
+
+User = get_user_model()
+
+STATS_URL = reverse('recipe:recipe-stats')
+RECIPES_URL = reverse('recipe:recipe-list')
+RECIPES_BULK_URL = reverse('recipe:recipe-bulk-create')
+
+
+def recipe_detail(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class RecipeStatsTests(TestCase):
+    """Test the recipe statistics endpoint and its summary tables"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('user@hosseindev.ir', 'pass')
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = Tag.objects.create(user=self.user, name='Quick')
+        self.tofu = Ingredient.objects.create(user=self.user, name='Tofu')
+
+    def create_recipe(self, price, time_minutes, tags=(), ingredients=()):
+        recipe = Recipe.objects.create(
+            user=self.user, title='Recipe', price=price,
+            time_minutes=time_minutes
+        )
+        recipe.tags.add(*tags)
+        recipe.ingredients.add(*ingredients)
+        return recipe
+
+    def recipe_count(self, tag):
+        tag.refresh_from_db()
+        return tag.recipe_count
+
+    def assertInSync(self):
+        """Assert the maintained stats match a rebuild from scratch"""
+        self.assertFalse(rebuild_stats(self.user.id))
+
+    def test_empty_stats(self):
+        """Test the stats of a user without recipes"""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertIsNone(res.data['price']['avg'])
+        self.assertEqual(res.data['top_tags'], [])
+
+    def test_stats(self):
+        """Test counts, ranges and top tags and ingredients"""
+        self.create_recipe(2, 10, [self.vegan, self.quick], [self.tofu])
+        self.create_recipe(4, 30, [self.vegan])
+        self.create_recipe('9.50', 20)
+        other = User.objects.create_user('other@hosseindev.ir', 'pass')
+        Recipe.objects.create(
+            user=other, title='Other', price=100, time_minutes=500
+        )
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(
+            res.data['price'], {'avg': '5.17', 'min': '2.00', 'max': '9.50'}
+        )
+        self.assertEqual(
+            res.data['time_minutes'], {'avg': 20.0, 'min': 10, 'max': 30}
+        )
+        self.assertEqual(res.data['top_tags'], [
+            {'id': self.vegan.id, 'name': 'Vegan', 'recipe_count': 2},
+            {'id': self.quick.id, 'name': 'Quick', 'recipe_count': 1},
+        ])
+        self.assertEqual(res.data['top_ingredients'], [
+            {'id': self.tofu.id, 'name': 'Tofu', 'recipe_count': 1},
+        ])
+
+        res = self.client.get(STATS_URL, {'top': 1})
+        self.assertEqual(len(res.data['top_tags']), 1)
+        self.assertInSync()
+
+    def test_invalid_top(self):
+        """Test top must be a small positive number"""
+        for top in ('0', 'x', '51'):
+            res = self.client.get(STATS_URL, {'top': top})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_replaces_values(self):
+        """Test updating the recipe holding an extreme recomputes it"""
+        cheap = self.create_recipe(2, 10)
+        self.create_recipe(4, 30)
+
+        res = self.client.patch(
+            recipe_detail(cheap.id), {'price': '6.00', 'time_minutes': 40}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        stats = RecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.recipe_count, 2)
+        self.assertEqual(stats.price_min, Decimal('4.00'))
+        self.assertEqual(stats.price_max, Decimal('6.00'))
+        self.assertEqual(stats.time_max, 40)
+        self.assertInSync()
+
+    def test_relation_changes(self):
+        """Test tag counts follow add, remove, clear and set"""
+        first = self.create_recipe(2, 10, [self.vegan, self.quick])
+        second = self.create_recipe(4, 30, [self.vegan])
+
+        first.tags.remove(self.quick, self.vegan)
+        second.tags.remove(self.quick)
+        self.assertEqual(self.recipe_count(self.vegan), 1)
+        self.assertEqual(self.recipe_count(self.quick), 0)
+
+        self.quick.recipe_set.add(first, second)
+        second.tags.clear()
+        self.client.patch(
+            recipe_detail(first.id), {'tags': [self.vegan.id]}, format='json'
+        )
+
+        self.assertEqual(self.recipe_count(self.vegan), 1)
+        self.assertEqual(self.recipe_count(self.quick), 0)
+        self.assertInSync()
+
+    def test_delete_recipe(self):
+        """Test deleting recipes removes them and their links"""
+        kept = self.create_recipe(2, 10, [self.vegan])
+        deleted = self.create_recipe(8, 60, [self.vegan], [self.tofu])
+
+        deleted.delete()
+
+        stats = RecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.recipe_count, 1)
+        self.assertEqual(stats.price_max, Decimal('2.00'))
+        self.assertEqual(stats.time_max, 10)
+        self.assertEqual(self.recipe_count(self.vegan), 1)
+        self.assertInSync()
+
+        kept.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.recipe_count, 0)
+        self.assertIsNone(stats.price_min)
+        self.assertInSync()
+
+    def test_save_reads_stored_values_only_when_needed(self):
+        """Test only saves that may change price or time read them back"""
+        recipe = self.create_recipe(2, 10)
+        recipe = Recipe.objects.get(id=recipe.id)
+        recipe.title = 'Renamed'
+
+        # Nothing is kept when recipes are loaded
+        self.assertFalse(hasattr(recipe, '_stats_values'))
+        with self.assertNumQueries(2):
+            # UPDATE, version bump
+            recipe.save(update_fields=['title'])
+
+        recipe.price = 3
+        recipe.save(update_fields=['price'])
+        self.assertEqual(
+            RecipeStats.objects.get(user=self.user).price_max,
+            Decimal('3.00')
+        )
+        self.assertInSync()
+
+    def test_delete_collections(self):
+        """Test whole collections are deleted without per recipe queries"""
+        for i in range(5):
+            self.create_recipe(i + 1, 10, [self.vegan], [self.tofu])
+        other = User.objects.create_user('other@hosseindev.ir', 'pass')
+        kept = Recipe.objects.create(
+            user=other, title='Other', price=1, time_minutes=5
+        )
+
+        with self.assertNumQueries(13):
+            delete_collections([self.user.id])
+
+        self.assertEqual(list(Recipe.objects.all()), [kept])
+        self.assertFalse(Tag.objects.filter(user=self.user).exists())
+        self.assertFalse(RecipeStats.objects.filter(user=self.user).exists())
+        self.assertInSync()
+
+    def test_bulk_create(self):
+        """Test recipes created in bulk are counted"""
+        self.create_recipe(5, 10, [self.quick])
+        payload = [
+            {'title': 'Curry', 'time_minutes': 30, 'price': '7.50',
+             'tags': [self.vegan.id, self.quick.id],
+             'ingredients': [self.tofu.id]},
+            {'title': 'Rice', 'time_minutes': 15, 'price': '1.00',
+             'tags': [self.vegan.id]},
+        ]
+
+        res = self.client.post(RECIPES_BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        res = self.client.get(STATS_URL)
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(res.data['price']['min'], '1.00')
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count'])
+             for tag in res.data['top_tags']],
+            [('Vegan', 2), ('Quick', 2)]
+        )
+        self.assertInSync()
+
+    def test_rebuild_repairs_drift(self):
+        """Test rebuilding fixes stats changed behind the signals' back"""
+        self.create_recipe(2, 10, [self.vegan])
+        Recipe.objects.update(price=3)
+        Tag.objects.update(recipe_count=7)
+
+        self.assertTrue(rebuild_stats(self.user.id))
+
+        stats = RecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.price_total, Decimal('3.00'))
+        self.assertEqual(self.recipe_count(self.vegan), 1)
+        self.assertInSync()
+
+    def test_stats_query_count(self):
+        """Test the endpoint runs a constant number of queries"""
+        for i in range(20):
+            self.create_recipe(i + 1, i + 1, [self.vegan], [self.tofu])
+
+        # stats row + top tags + top ingredients
+        with self.assertNumQueries(3):
+            res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 20)
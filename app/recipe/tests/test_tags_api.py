@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from rest_framework import status
@@ -10,6 +12,7 @@ from recipe.serializers import TagSerializer
 User = get_user_model()
 
 TAGS_URL = reverse('recipe:tag-list')
+TAGS_BULK_URL = reverse('recipe:tag-bulk-get-or-create')
 
 
 def TAGS_RETRIEVE_URL(id=None):
@@ -119,6 +122,7 @@ class PrivateTagsAPITests(TestCase):
         )
 
         recipe.tags.add(tag_1)
+        tag_1.refresh_from_db()
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
@@ -147,3 +151,161 @@ class PrivateTagsAPITests(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_paginate_tags_by_name(self):
+        """Test tags are paged in descending name order"""
+        for name in ('Breakfast', 'Dinner', 'Lunch'):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        names = [tag['name'] for tag in res.data['results']]
+        res = self.client.get(res.data['next'])
+        names.extend(tag['name'] for tag in res.data['results'])
+
+        self.assertEqual(names, ['Lunch', 'Dinner', 'Breakfast'])
+        self.assertIsNone(res.data['next'])
+
+    def test_create_duplicate_tag_name_fails(self):
+        """Test names are unique per user regardless of case and spacing"""
+        Tag.objects.create(user=self.user, name='Comfort Food')
+
+        res = self.client.post(TAGS_URL, {'name': ' comfort  FOOD'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_create_tag_name_taken_concurrently_fails(self):
+        """Test a name created after validation is still a 400"""
+        Tag.objects.create(user=self.user, name='Comfort Food')
+
+        with patch.object(TagSerializer, 'validate_name',
+                          side_effect=lambda value: value):
+            res = self.client.post(TAGS_URL, {'name': 'comfort food'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data['name'], ['Tag with this name already exists.']
+        )
+        self.assertEqual(Tag.objects.count(), 1)
+
+    def test_rename_tag_to_existing_name_fails(self):
+        """Test renaming a tag onto another tag's name is rejected"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        tag = Tag.objects.create(user=self.user, name='Dessert')
+
+        res = self.client.patch(TAGS_RETRIEVE_URL(tag.id), {'name': 'VEGAN'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.patch(TAGS_RETRIEVE_URL(tag.id), {'name': 'dessert'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_bulk_get_or_create_tags(self):
+        """Test bulk names resolve to ids in input order"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        other_user = User.objects.create_user('other@hosseindev.ir', 'pass')
+        Tag.objects.create(user=other_user, name='Dessert')
+
+        res = self.client.post(
+            TAGS_BULK_URL,
+            {'names': ['dessert', ' VEGAN', 'Dessert', 'Quick']},
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [tag['id'] for tag in res.data]
+        self.assertEqual(ids[1], vegan.id)
+        self.assertEqual(ids[0], ids[2])
+        self.assertEqual(res.data[1]['name'], 'Vegan')
+        self.assertEqual(
+            set(Tag.objects.filter(user=self.user)
+                .values_list('name', flat=True)),
+            {'Vegan', 'dessert', 'Quick'}
+        )
+
+        res = self.client.post(
+            TAGS_BULK_URL, {'names': ['QUICK']}, format='json'
+        )
+        self.assertEqual(res.data[0]['id'], ids[3])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_get_or_create_invalid_payload(self):
+        """Test an empty name list is rejected"""
+        res = self.client.post(TAGS_BULK_URL, {'names': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_tags_by_popularity(self):
+        """Test tags are listed and paged by their recipe count"""
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Rare', 'Common', 'Unused')
+        ]
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5, price=1
+            )
+            recipe.tags.add(*tags[:1 + (i > 0)])
+
+        res = self.client.get(TAGS_URL, {'ordering': 'popular'})
+
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in res.data],
+            [('Rare', 3), ('Common', 2), ('Unused', 0)]
+        )
+
+        res = self.client.get(
+            TAGS_URL, {'ordering': 'popular', 'page_size': 2}
+        )
+        res = self.client.get(res.data['next'])
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']], ['Unused']
+        )
+
+    def test_page_tied_popular_tags(self):
+        """Test paging by popularity through ties, both ways"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=5, price=1
+        )
+        tags = [
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(7)
+        ]
+        recipe.tags.add(*tags[:2])
+        expected = [tag.id for tag in tags[1::-1] + tags[:1:-1]]
+
+        pages = []
+        res = self.client.get(
+            TAGS_URL, {'ordering': 'popular', 'page_size': 2}
+        )
+        while True:
+            pages.append([tag['id'] for tag in res.data['results']])
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+        self.assertEqual([pk for page in pages for pk in page], expected)
+
+        res = self.client.get(res.data['previous'])
+        self.assertEqual(
+            [tag['id'] for tag in res.data['results']], pages[-2]
+        )
+
+    def test_invalid_ordering(self):
+        """Test unknown orderings are rejected"""
+        res = self.client.get(TAGS_URL, {'ordering': 'recipe_count'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rename_keeps_recipe_count(self):
+        """Test saving a stale tag instance doesn't reset its count"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=5, price=1
+        )
+        recipe.tags.add(tag)
+
+        tag.name = 'Plant based'
+        tag.save()
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+        self.assertEqual(tag.name, 'Plant based')
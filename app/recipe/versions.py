@@ -0,0 +1,80 @@
+import json
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from core.models import CollectionVersion, RecipeLinkChange
+
+
+def get_version(user_id):
+    """Return the current collection version of a user"""
+    return get_versions(user_id)[0]
+
+
+def get_versions(user_id):
+    """Return the current collection and links versions of a user"""
+    versions = CollectionVersion.objects \
+        .filter(user_id=user_id) \
+        .values_list('version', 'links_version') \
+        .first()
+    return versions or (0, 0)
+
+
+def bump_version(user_id, links=True):
+    """Mark everything derived from a user's recipes as stale
+
+    Pass ``links=False`` for writes that can't have changed which recipes
+    are linked to which tags and ingredients, so that indexes of those
+    links are kept.
+    """
+    fields = {'version': F('version') + 1}
+    if links:
+        fields['links_version'] = F('links_version') + 1
+    updated = CollectionVersion.objects \
+        .filter(user_id=user_id) \
+        .update(**fields)
+    if updated:
+        return
+
+    try:
+        with transaction.atomic():
+            # Start from a random value so a recycled user id can never
+            # line up with a version cached for its previous owner.
+            start = random.getrandbits(48) + 1
+            CollectionVersion.objects.create(
+                user_id=user_id, version=start, links_version=start
+            )
+    except IntegrityError:
+        CollectionVersion.objects \
+            .filter(user_id=user_id) \
+            .update(**fields)
+
+
+def bump_links(user_id, changes):
+    """Bump a user's versions and record the link changes behind it
+
+    ``changes`` are applied by RecipeFilterIndex.catch_up(). Records are
+    written in the transaction of the bump, so a committed links version
+    always comes with its changes.
+    """
+    with transaction.atomic():
+        bump_version(user_id)
+        # The bump locked the row, so this reads our own version
+        version = CollectionVersion.objects \
+            .filter(user_id=user_id) \
+            .values_list('links_version', flat=True) \
+            .get()
+        RecipeLinkChange.objects.create(
+            user_id=user_id, version=version, changes=json.dumps(changes)
+        )
+        kept = link_changes_kept()
+        if version % kept == 0:
+            RecipeLinkChange.objects \
+                .filter(user_id=user_id, version__lte=version - kept) \
+                .delete()
+
+
+def link_changes_kept():
+    return getattr(settings, 'RECIPE_LINK_CHANGES_KEPT', 100)
@@ -1,15 +1,45 @@
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from core.authentication import CachedTokenAuthentication
+from core.instrumentation import ServerTimingMixin
 from core.models import Tag, Ingredient, Recipe
+from core.pagination import KeysetPagination, NameKeysetPagination
+from core.storage import release
+from recipe.bulk import get_or_create_by_name
+from recipe.export import export_recipes, FORMATS
+from recipe.images import process_image
+from recipe.index import filter_index, filter_by_links, max_listed_ids, \
+    MATCH_ANY, MATCH_MODES
+from recipe.mixins import ConditionalGetMixin, CachedListMixin
+from recipe.search import search_recipes
 from recipe.serializers import TagSerializer, IngredientSerializer, \
-    RecipeSerializer, RecipeDetailSerializer, RecipeImageSerializer
+    RecipeSerializer, RecipeDetailSerializer, RecipeImageSerializer, \
+    RecipeBulkSerializer, RecipeAttrNamesSerializer, RecipeRowSerializer, \
+    RecipeDetailRowSerializer, RecipeStatsSerializer
+from recipe.stats import user_stats
+
+MAX_TOP = 50
+
+
+def prefetch_relations(queryset):
+    """Prefetch tags and ingredients in id order, like the row serializers"""
+    return queryset.prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch('ingredients', queryset=Ingredient.objects.order_by('id')),
+    )
 
 
 class BaseRecipeAttrViewSet(
+    ServerTimingMixin,
+    ConditionalGetMixin,
+    CachedListMixin,
     viewsets.GenericViewSet,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
@@ -18,23 +48,66 @@ class BaseRecipeAttrViewSet(
     mixins.RetrieveModelMixin,
 ):
     """Handles base class to for handling recipe attributes"""
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = NameKeysetPagination
 
     def perform_create(self, serializer):
         """Create a new obj"""
         serializer.save(user=self.request.user)
 
+    orderings = {
+        'name': ('-name',),
+        # Paged on both fields, ids break the many ties of recipe_count
+        'popular': ('-recipe_count', '-id'),
+    }
+
     def get_queryset(self):
         """Return objects for the current authenticated user only."""
         assigned_only = bool(
             int(self.request.query_params.get('assigned_only', 0))
         )
-        queryset = self.queryset
+        queryset = self.queryset.filter(user=self.request.user)
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-        return queryset.filter(user=self.request.user) \
-            .order_by('-name').distinct()
+            # recipe_count is kept up to date, unlike a join it needs no
+            # DISTINCT
+            queryset = queryset.filter(recipe_count__gt=0)
+        return queryset.order_by(*self.get_ordering())
+
+    def get_ordering(self):
+        """Return the order_by() fields picked with ?ordering="""
+        ordering = self.request.query_params.get('ordering', 'name')
+        if ordering not in self.orderings:
+            raise ValidationError({
+                'ordering': f'Must be one of: {", ".join(self.orderings)}.'
+            })
+        return self.orderings[ordering]
+
+    def get_serializer_class(self):
+        if self.action == 'bulk_get_or_create':
+            return RecipeAttrNamesSerializer
+        return self.serializer_class
+
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk_get_or_create(self, request):
+        """Return ids for a list of names, creating the missing ones"""
+        serializer = self.get_serializer(data=request.data)
+
+        if serializer.is_valid():
+            rows = get_or_create_by_name(
+                self.queryset.model,
+                request.user,
+                serializer.validated_data['names']
+            )
+            return Response(
+                [{'id': pk, 'name': name} for pk, name in rows],
+                status=status.HTTP_200_OK
+            )
+
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -50,6 +123,9 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
 
 
 class RecipeApiViewSet(
+    ServerTimingMixin,
+    ConditionalGetMixin,
+    CachedListMixin,
     viewsets.GenericViewSet,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -57,31 +133,96 @@ class RecipeApiViewSet(
     mixins.UpdateModelMixin
 ):
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     serializer_class = RecipeSerializer
+    pagination_class = KeysetPagination
 
     def _params_to_ints(self, qs):
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _fast_serialization(self):
+        return self.action in ('list', 'retrieve') and \
+            getattr(settings, 'RECIPE_FAST_SERIALIZATION', False)
+
+    def _search_terms(self):
+        if self.action != 'list':
+            return ''
+        return self.request.query_params.get('search', '').strip()
+
     def get_queryset(self):
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+        match = self.request.query_params.get('match', MATCH_ANY)
+        search = self._search_terms()
+        queryset = self.queryset.filter(user=self.request.user)
+        recipe_ids = None
+        if tags or ingredients:
+            if match not in MATCH_MODES:
+                raise ValidationError(
+                    {'match': f'Must be one of: {", ".join(MATCH_MODES)}.'}
+                )
+            tag_ids = self._params_to_ints(tags) if tags else None
+            ingredient_ids = self._params_to_ints(ingredients) \
+                if ingredients else None
+            recipe_ids = filter_index.recipe_ids(
+                self.request.user.id,
+                tag_ids=tag_ids,
+                ingredient_ids=ingredient_ids,
+                match=match,
+                version=self.links_version,
+                # Search needs every match as candidates
+                limit=None if search else max_listed_ids(),
+            )
+            if recipe_ids is not None and \
+                    len(recipe_ids) <= max_listed_ids():
+                queryset = queryset.filter(id__in=recipe_ids)
+            else:
+                # Too many ids to pass as query parameters
+                queryset = filter_by_links(
+                    queryset, tag_ids, ingredient_ids, match
+                )
+
+        if not self._fast_serialization():
+            queryset = prefetch_relations(queryset)
+        if search:
+            queryset = search_recipes(
+                queryset, self.request.user.id, search, recipe_ids,
+                self.collection_version
+            )
+        else:
+            queryset = queryset.order_by('-id')
 
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-        return queryset.filter(user=self.request.user).order_by('-id')
+        if self._fast_serialization():
+            # Row serializers load relations themselves, from values() rows
+            return queryset.values(*self.get_serializer_class().row_fields)
+        return queryset
+
+    def paginate_queryset(self, queryset):
+        # Ranked search results are capped instead of paged by -id
+        if self._search_terms():
+            params = self.request.query_params
+            if 'page_size' in params or 'cursor' in params:
+                raise ValidationError({
+                    'search': 'Search results are not paginated, drop '
+                              'page_size and cursor.'
+                })
+            return None
+        return super().paginate_queryset(queryset)
 
     def get_serializer_class(self):
+        if self._fast_serialization():
+            if self.action == 'retrieve':
+                return RecipeDetailRowSerializer
+            return RecipeRowSerializer
         if self.action == 'retrieve':
             return RecipeDetailSerializer
         elif self.action == 'upload_image':
             return RecipeImageSerializer
+        elif self.action == 'bulk_create':
+            return RecipeBulkSerializer
+        elif self.action == 'stats':
+            return RecipeStatsSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
@@ -91,6 +232,7 @@ class RecipeApiViewSet(
     def upload_image(self, request, pk=None):
         """Upload an image to a recipe"""
         recipe = self.get_object()
+        previous_image = recipe.image.name
 
         serializer = self.get_serializer(
             recipe,
@@ -98,9 +240,14 @@ class RecipeApiViewSet(
         )
 
         if serializer.is_valid():
-            serializer.save()
+            job = process_image(serializer.save())
+            if previous_image != recipe.image.name:
+                release([previous_image])
+            data = serializer.data
+            if job is not None:
+                data['job'] = job.id
             return Response(
-                serializer.data,
+                data,
                 status=status.HTTP_200_OK
             )
 
@@ -108,3 +255,54 @@ class RecipeApiViewSet(
             serializer.errors,
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk_create(self, request):
+        """Create a batch of recipes in a single transaction"""
+        serializer = self.get_serializer(data=request.data, many=True)
+
+        if serializer.is_valid():
+            recipes = serializer.save()
+            created = prefetch_relations(
+                Recipe.objects.filter(id__in=[recipe.id for recipe in recipes])
+            ).order_by('id')
+            return Response(
+                RecipeSerializer(created, many=True).data,
+                status=status.HTTP_201_CREATED
+            )
+
+        return Response(
+            serializer.errors,
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """Stream all of the user's recipes as NDJSON or CSV"""
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in FORMATS:
+            raise ValidationError({
+                'export_format': f'Must be one of: {", ".join(FORMATS)}.'
+            })
+
+        response = StreamingHttpResponse(
+            export_recipes(self.get_queryset(), export_format),
+            content_type=FORMATS[export_format]
+        )
+        response['Content-Disposition'] = \
+            f'attachment; filename="recipes.{export_format}"'
+        return response
+
+    @action(methods=['GET'], detail=False, url_path='stats')
+    def stats(self, request):
+        """Return summary statistics of the user's recipes"""
+        top = request.query_params.get('top', '5')
+        if not top.isdigit() or not 1 <= int(top) <= MAX_TOP:
+            raise ValidationError(
+                {'top': f'Must be a number from 1 to {MAX_TOP}.'}
+            )
+
+        serializer = self.get_serializer(
+            user_stats(request.user.id, int(top))
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
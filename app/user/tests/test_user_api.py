@@ -7,6 +7,7 @@ from rest_framework.test import APIClient
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
+USER_LIST_URL = reverse('user:user_list')
 
 User = get_user_model()
 
@@ -143,3 +144,17 @@ class PrivateUserAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
+
+    def test_list_users_paginated(self):
+        """Test listing users with a cursor page size"""
+        create_user(email='other@hosseindev.ir', password='testpass')
+
+        res = self.client.get(USER_LIST_URL, {'page_size': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(
+            res.data['results'][0]['email'],
+            'other@hosseindev.ir'
+        )
+        self.assertIsNotNone(res.data['next'])
@@ -1,25 +1,30 @@
 # Create your views here.
 from django.contrib.auth import get_user_model
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication
+from core.instrumentation import ServerTimingMixin
+from core.pagination import KeysetPagination
+
 from user.serializers import UserSerializer, \
     AuthTokenSerializer, UserListSerializer
 
 User = get_user_model()
 
 
-class UserAPIView(generics.CreateAPIView):
+class UserAPIView(ServerTimingMixin, generics.CreateAPIView):
     """Create a new user in the system"""
     serializer_class = UserSerializer
 
 
-class UserListAPIView(generics.ListAPIView):
+class UserListAPIView(ServerTimingMixin, generics.ListAPIView):
     serializer_class = UserListSerializer
     queryset = User.objects.all()
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
+    pagination_class = KeysetPagination
 
 
 class CreateTokenView(ObtainAuthToken):
@@ -27,11 +32,11 @@ class CreateTokenView(ObtainAuthToken):
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(ServerTimingMixin, generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
 
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):